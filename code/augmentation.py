@@ -0,0 +1,75 @@
+import math
+from typing import Optional
+
+import torch
+
+
+class BatchRandomRotation:
+    """
+    Rotates a whole batch of image tensors by random angles with one affine_grid/grid_sample call.
+
+    Every image gets its own angle drawn uniformly from [-degrees, degrees], the same distribution as
+    transforms.RandomRotation, and the uncovered corners are filled with zeros.
+    """
+
+    def __init__(self, degrees: float, seed: Optional[int] = None, chunk_size: Optional[int] = None) -> None:
+        """
+        Initialize the BatchRandomRotation.
+
+        Args:
+            degrees (float): Maximal rotation angle in degrees.
+            seed (Optional[int]): Seed of the random generator, if None the generator is seeded randomly.
+            chunk_size (Optional[int]): If set, the batch is sampled in chunks of this size, on the CPU this keeps
+                the sampling grid in the cache. If None, the whole batch is sampled at once.
+
+        Returns:
+            None
+        """
+
+        self.degrees = degrees
+        self.chunk_size = chunk_size
+        self.generator = torch.Generator()
+
+        if seed is None:
+            self.generator.seed()
+        else:
+            self.generator.manual_seed(seed)
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Rotate the batch.
+
+        Args:
+            images (torch.Tensor): Batch of images of shape (N, C, H, W).
+
+        Returns:
+            torch.Tensor: Batch of rotated images with the same shape, dtype and device.
+        """
+
+        angles = (torch.rand(images.shape[0], generator=self.generator) * 2 - 1) * math.radians(self.degrees)
+        cos, sin = torch.cos(angles), torch.sin(angles)
+        zeros = torch.zeros_like(angles)
+
+        theta = torch.stack([torch.stack([cos, -sin, zeros], 1), torch.stack([sin, cos, zeros], 1)], 1)
+        theta = theta.to(device=images.device, dtype=images.dtype)
+
+        if self.chunk_size is None or images.shape[0] <= self.chunk_size:
+            return self.rotate(images, theta)
+
+        return torch.cat([self.rotate(images[i:i + self.chunk_size], theta[i:i + self.chunk_size]) for i in range(0, images.shape[0], self.chunk_size)])
+
+    @staticmethod
+    def rotate(images: torch.Tensor, theta: torch.Tensor) -> torch.Tensor:
+        """
+        Apply the affine matrices to the images.
+
+        Args:
+            images (torch.Tensor): Batch of images of shape (N, C, H, W).
+            theta (torch.Tensor): Affine matrices of shape (N, 2, 3).
+
+        Returns:
+            torch.Tensor: Batch of transformed images.
+        """
+
+        grid = torch.nn.functional.affine_grid(theta, list(images.shape), align_corners=False)
+        return torch.nn.functional.grid_sample(images, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
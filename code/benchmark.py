@@ -0,0 +1,859 @@
+import argparse
+import glob
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Subset
+from torchvision import datasets, transforms
+
+from augmentation import BatchRandomRotation
+from cnn import ARCHITECTURES
+from learn import Learn, PRECISIONS
+from learnObserver import LearnObserver
+from rasterizer import StrokeRasterizer
+from server import createServer, serverAddress, connect, requestPrediction
+
+
+def sampleStrokes(number_points: int = 120) -> List[List[Tuple[int, int]]]:
+    """
+    Build a deterministic, digit-like drawing in canvas coordinates.
+
+    Args:
+        number_points (int): Number of points in the curved part of the drawing.
+
+    Returns:
+        List[List[Tuple[int, int]]]: List of strokes, each stroke is a list of points.
+    """
+
+    top = [(150 + 2 * i, 100) for i in range(0, 100, 5)]
+    bar = [(150, 100 + 2 * i) for i in range(0, 75, 5)]
+    curve = [(int(240 + 110 * math.sin(math.pi * i / number_points)), int(250 + 120 * (1 - math.cos(math.pi * i / number_points)))) for i in range(number_points)]
+
+    return [top, bar, curve]
+
+
+def measure(function: Callable[[], Any], repeats: int, warmup: int = 3) -> List[float]:
+    """
+    Measure the wall time of a function.
+
+    Args:
+        function (Callable[[], Any]): Function to measure.
+        repeats (int): Number of measured calls.
+        warmup (int): Number of calls made before measuring.
+
+    Returns:
+        List[float]: Time of each measured call in milliseconds.
+    """
+
+    for _ in range(warmup):
+        function()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+
+    return times
+
+
+def printRow(name: str, times: List[float]) -> None:
+    """
+    Print a row with the median and mean time.
+
+    Args:
+        name (str): Name of the measured path.
+        times (List[float]): Measured times in milliseconds.
+
+    Returns:
+        None
+    """
+
+    times = sorted(times)
+    print(f"{name:<40} median {times[len(times) // 2]:8.2f} ms   mean {sum(times) / len(times):8.2f} ms")
+
+
+def benchmarkPredict(brain: str, repeats: int) -> None:
+    """
+    Compare the latency of one prediction from the canvas through PostScript/Ghostscript and through the StrokeRasterizer.
+
+    The PostScript path needs a display and the Ghostscript binary, it is skipped when one of them is missing.
+
+    Args:
+        brain (str): Path to the saved brain.
+        repeats (int): Number of measured predictions.
+
+    Returns:
+        None
+    """
+
+    learn = Learn()
+    learn.open(brain)
+
+    strokes = sampleStrokes()
+
+    def rasterizedPredict() -> None:
+        rasterizer = StrokeRasterizer(500, 500, 3)
+        for stroke in strokes:
+            rasterizer.beginStroke(*stroke[0])
+            for point in stroke[1:]:
+                rasterizer.addPoint(*point)
+        learn.predict(rasterizer.render(learn.input_size))
+
+    printRow("rasterizer -> predict", measure(rasterizedPredict, repeats))
+
+    if shutil.which("gs") is None and shutil.which("gswin64c") is None:
+        print("postscript -> ghostscript -> predict     skipped (Ghostscript not found)")
+        return
+
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        print("postscript -> ghostscript -> predict     skipped (no display)")
+        return
+
+    canvas = tk.Canvas(root, bg='white', width=500, height=500)
+    canvas.pack()
+    for stroke in strokes:
+        for (x0, y0), (x1, y1) in zip(stroke, stroke[1:]):
+            canvas.create_line(x0, y0, x1, y1, fill='black', width=3, smooth=tk.TRUE, capstyle=tk.ROUND, joinstyle=tk.ROUND)
+    root.update()
+
+    def postscriptPredict() -> None:
+        image = canvas.postscript(colormode='gray')
+        image = Image.open(io.BytesIO(bytes(image, 'utf-8'))).convert('L')
+        learn.predict(image)
+
+    printRow("postscript -> ghostscript -> predict", measure(postscriptPredict, repeats))
+    root.destroy()
+
+
+def benchmarkAugmentation(path: str, number_samples: int, batch_size: int, chunk_size: Optional[int]) -> None:
+    """
+    Compare the CPU time of the per-sample PIL rotation pipeline with the batched tensor rotation.
+
+    Args:
+        path (str): Path to the dataset.
+        number_samples (int): Number of images to augment.
+        batch_size (int): Size of the batches given to the batched rotation.
+        chunk_size (Optional[int]): Chunk size of the batched rotation.
+
+    Returns:
+        None
+    """
+
+    files = sorted(glob.glob(os.path.join(path, "*", "*")))[:number_samples]
+    images = [Image.open(file).copy() for file in files]
+
+    old_pipeline = transforms.Compose([transforms.RandomRotation(30), transforms.Grayscale(), transforms.Resize((256, 256)), transforms.ToTensor()])
+    start = time.process_time()
+    for image in images:
+        old_pipeline(image)
+    old_time = time.process_time() - start
+
+    new_pipeline = transforms.Compose([transforms.Grayscale(), transforms.Resize((256, 256)), transforms.ToTensor()])
+    start = time.process_time()
+    tensors = torch.stack([new_pipeline(image) for image in images])
+    decode_time = time.process_time() - start
+
+    rotation = BatchRandomRotation(30, seed=0, chunk_size=chunk_size)
+    start = time.process_time()
+    for i in range(0, len(tensors), batch_size):
+        rotation(tensors[i:i + batch_size])
+    rotation_time = time.process_time() - start
+
+    print(f"{'RandomRotation -> Grayscale -> Resize':<40} {1000 * old_time / len(images):8.3f} ms CPU / sample")
+    print(f"{'Grayscale -> Resize -> BatchRandomRotation':<40} {1000 * (decode_time + rotation_time) / len(images):8.3f} ms CPU / sample")
+    print(f"{'cached tensors -> BatchRandomRotation':<40} {1000 * rotation_time / len(images):8.3f} ms CPU / sample")
+
+
+def benchmarkServer(address: Optional[str], brain: str, concurrency: List[int], number_requests: int, max_batch_size: int, max_latency_ms: float) -> None:
+    """
+    Measure the latency and throughput of the inference server at several concurrency levels.
+
+    Args:
+        address (Optional[str]): Address of a running server, if None a server is started in this process.
+        brain (str): Path to the saved brain, used when the server is started in this process.
+        concurrency (List[int]): Numbers of concurrent clients.
+        number_requests (int): Number of requests sent by each client.
+        max_batch_size (int): Maximal batch size of the server started in this process.
+        max_latency_ms (float): Maximal batching latency of the server started in this process.
+
+    Returns:
+        None
+    """
+
+    server = None
+    if address is None:
+        server = createServer(brain, port=0, max_batch_size=max_batch_size, max_latency=max_latency_ms / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        address = serverAddress(server)
+
+    rasterizer = StrokeRasterizer(500, 500, 3)
+    for stroke in sampleStrokes():
+        rasterizer.beginStroke(*stroke[0])
+        for point in stroke[1:]:
+            rasterizer.addPoint(*point)
+    buffer = io.BytesIO()
+    rasterizer.render(256).save(buffer, format='PNG')
+    png = buffer.getvalue()
+
+    print(f"server: {address}")
+    for clients in concurrency:
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def client() -> None:
+            connection = connect(address)
+            times = []
+            for _ in range(number_requests):
+                start = time.perf_counter()
+                requestPrediction(connection, png)
+                times.append((time.perf_counter() - start) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(times)
+
+        if server is not None:
+            server.batcher.batch_sizes.clear()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - start
+
+        latencies.sort()
+        line = (f"concurrency {clients:>4}   p50 {latencies[len(latencies) // 2]:8.2f} ms   "
+                f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:8.2f} ms   "
+                f"{len(latencies) / wall_time:8.1f} requests/s")
+        if server is not None and server.batcher.batch_sizes:
+            line += f"   mean batch {sum(server.batcher.batch_sizes) / len(server.batcher.batch_sizes):5.1f}"
+        print(line, flush=True)
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmarkInputSize(path: str, input_sizes: List[int], epochs: int, repeats: int, cache: bool, seed: int) -> None:
+    """
+    Train a new brain for each input size and compare the accuracy with the training and prediction time.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        input_sizes (List[int]): Compared input sizes.
+        epochs (int): Number of epochs of each training.
+        repeats (int): Number of measured predictions.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (int): Seed of the random generators, the same for every size.
+
+    Returns:
+        None
+    """
+
+    size_output = len(datasets.folder.find_classes(path)[0])
+    rasterizer = StrokeRasterizer(500, 500, 3)
+    for stroke in sampleStrokes():
+        rasterizer.beginStroke(*stroke[0])
+        for point in stroke[1:]:
+            rasterizer.addPoint(*point)
+
+    print(f"{'input size':<12} {'parameters':>10} {'accuracy':>10} {'train':>14} {'predict':>12}")
+
+    for input_size in input_sizes:
+        torch.manual_seed(seed)
+        learn = Learn(size_output, input_size=input_size)
+        learn.augmentation.generator.manual_seed(seed)
+        train_data, test_data = learn.loadData(path, cache)
+
+        start = time.perf_counter()
+        learn.fit(train_data, test_data, epochs)
+        epoch_time = (time.perf_counter() - start) / epochs
+
+        image = rasterizer.render(input_size)
+        times = sorted(measure(lambda: learn.predict(image), repeats))
+
+        print(f"{f'{input_size}x{input_size}':<12} {sum(p.numel() for p in learn.cnn.parameters()):>10} "
+              f"{100 * learn.accuracy_history[-1]:9.2f}% {epoch_time:8.2f} s/epoch {times[len(times) // 2]:9.2f} ms", flush=True)
+
+
+def benchmarkPrecision(path: str, precisions: List[str], epochs: int, repeats: int, cache: bool, seed: int) -> None:
+    """
+    Train a new brain in each precision mode and compare the epoch time with the final validation loss.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        precisions (List[str]): Compared precision modes.
+        epochs (int): Number of epochs of each training.
+        repeats (int): Number of measured predictions.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (int): Seed of the random generators, the same for every mode.
+
+    Returns:
+        None
+    """
+
+    size_output = len(datasets.folder.find_classes(path)[0])
+    rasterizer = StrokeRasterizer(500, 500, 3)
+    for stroke in sampleStrokes():
+        rasterizer.beginStroke(*stroke[0])
+        for point in stroke[1:]:
+            rasterizer.addPoint(*point)
+
+    print(f"{'precision':<12} {'epoch':>12} {'samples/s':>10} {'test loss':>10} {'accuracy':>10} {'predict':>12}")
+
+    for precision in precisions:
+        torch.manual_seed(seed)
+        learn = Learn(size_output)
+        learn.setPrecision(precision)
+        learn.augmentation.generator.manual_seed(seed)
+        train_data, test_data = learn.loadData(path, cache)
+
+        start = time.perf_counter()
+        learn.fit(train_data, test_data, epochs)
+        epoch_time = (time.perf_counter() - start) / epochs
+
+        image = rasterizer.render(learn.input_size)
+        times = sorted(measure(lambda: learn.predict(image), repeats))
+
+        name = precision if precision != 'fp16' or learn.device == 'cuda' else 'fp16 (bf16)'
+        print(f"{name:<12} {epoch_time:8.2f} s {epochs * len(train_data.dataset) / (time.perf_counter() - start):10.1f} "
+              f"{learn.history[-1][1]:10.4f} {100 * learn.accuracy_history[-1]:9.2f}% {times[len(times) // 2]:9.2f} ms", flush=True)
+
+
+class TargetObserver(LearnObserver):
+    """
+    Records the first epoch and the time at which the test loss reaches a target.
+    """
+
+    def __init__(self, target_loss: float) -> None:
+        """
+        Initialize the TargetObserver.
+
+        Args:
+            target_loss (float): Target test loss.
+
+        Returns:
+            None
+        """
+
+        self.target_loss = target_loss
+        self.start = time.perf_counter()
+        self.epoch: Optional[int] = None
+        self.time: Optional[float] = None
+
+    def learnEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Record the epoch if the test loss reaches the target for the first time.
+
+        Args:
+            epoch (int): Number of the finished epoch.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        if self.epoch is None and stats['test_loss'] <= self.target_loss:
+            self.epoch = epoch
+            self.time = time.perf_counter() - self.start
+
+
+def benchmarkSchedule(path: str, schedules: List[str], target_loss: float, epochs: int, input_size: int, precision: str,
+                      cache: bool, seed: int) -> None:
+    """
+    Train a new brain with each learning rate schedule and compare the epochs and the time needed to reach a test loss.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        schedules (List[str]): Compared schedules as 'name:lr', e.g. 'one-cycle:1e-3'.
+        target_loss (float): Target test loss.
+        epochs (int): Number of epochs of each training, the length of the one-cycle and cosine schedules.
+        input_size (int): Width and height the images are resized to.
+        precision (str): Precision of the training.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (int): Seed of the random generators, the same for every schedule.
+
+    Returns:
+        None
+    """
+
+    size_output = len(datasets.folder.find_classes(path)[0])
+
+    print(f"{'schedule':<20} {'epochs to ' + str(target_loss):>16} {'time':>10} {'final test loss':>16} {'accuracy':>10}")
+
+    for schedule in schedules:
+        name, learning_rate = schedule.split(":")
+
+        torch.manual_seed(seed)
+        observer = TargetObserver(target_loss)
+        learn = Learn(size_output, observer, input_size)
+        learn.setPrecision(precision)
+        learn.setSchedule(name, float(learning_rate))
+        learn.augmentation.generator.manual_seed(seed)
+        train_data, test_data = learn.loadData(path, cache)
+
+        observer.start = time.perf_counter()
+        learn.fit(train_data, test_data, epochs)
+
+        reached = (f"{observer.epoch:>16} {observer.time:8.1f} s" if observer.epoch is not None
+                   else f"{'> ' + str(epochs):>16} {'-':>10}")
+        print(f"{schedule:<20} {reached} {learn.history[-1][1]:16.4f} {100 * learn.accuracy_history[-1]:9.2f}%", flush=True)
+
+
+class ThroughputObserver(LearnObserver):
+    """
+    Records the training throughput of every epoch.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the ThroughputObserver.
+
+        Returns:
+            None
+        """
+
+        self.samples_per_second: List[float] = []
+
+    def learnEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Record the throughput of the epoch.
+
+        Args:
+            epoch (int): Number of the finished epoch.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        self.samples_per_second.append(stats['samples_per_second'])
+
+
+def benchmarkDistributed(path: str, processes: List[int], epochs: int, input_size: int, precision: str, cache: bool, seed: int) -> None:
+    """
+    Train a new brain with each number of data-parallel processes and compare the training throughput.
+
+    The time includes starting the processes and the evaluation, the samples/s column only the training part of the
+    epochs. Every process has a batch of 64 images, so the steps of the runs are not the same.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        processes (List[int]): Compared numbers of processes, 1 trains in this process.
+        epochs (int): Number of epochs of each training.
+        input_size (int): Width and height the images are resized to.
+        precision (str): Precision of the training.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (int): Seed of the random generators, the same for every run.
+
+    Returns:
+        None
+    """
+
+    size_output = len(datasets.folder.find_classes(path)[0])
+    baseline = None
+
+    print(f"{'processes':>10} {'time':>10} {'samples/s':>10} {'speedup':>8} {'efficiency':>11} {'test loss':>10} {'accuracy':>10}")
+
+    for number_processes in processes:
+        torch.manual_seed(seed)
+        observer = ThroughputObserver()
+        learn = Learn(size_output, observer, input_size)
+        learn.setPrecision(precision)
+        learn.augmentation.generator.manual_seed(seed)
+        train_data, test_data = learn.loadData(path, cache)
+
+        start = time.perf_counter()
+        if number_processes > 1:
+            learn.fitDistributed(epochs, number_processes)
+        else:
+            learn.fit(train_data, test_data, epochs)
+        total_time = time.perf_counter() - start
+
+        throughput = sum(observer.samples_per_second) / len(observer.samples_per_second)
+        baseline = throughput if baseline is None else baseline
+        print(f"{number_processes:>10} {total_time:8.1f} s {throughput:10.1f} {throughput / baseline:7.2f}x "
+              f"{100 * throughput / baseline / number_processes:10.1f}% {learn.history[-1][1]:10.4f} "
+              f"{100 * learn.accuracy_history[-1]:9.2f}%", flush=True)
+
+
+def benchmarkArchitectures(path: str, architectures: List[str], epochs: int, input_size: int, schedule: str, lr: float,
+                           repeats: int, cache: bool, seed: int) -> None:
+    """
+    Train a new brain of each architecture and compare their size, cost and accuracy.
+
+    The FLOPs are counted for one image with torch.utils.flop_counter (a multiply-add counts as two), the latency is
+    the median time of one prediction of a canvas drawing on the CPU.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        architectures (List[str]): Compared architectures, see cnn.ARCHITECTURES.
+        epochs (int): Number of epochs of each training.
+        input_size (int): Width and height of the images.
+        schedule (str): Learning rate schedule of the trainings.
+        lr (float): Learning rate, the peak one of 'one-cycle' and 'cosine'.
+        repeats (int): Number of measured predictions.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (int): Seed of the random generators, the same for every architecture.
+
+    Returns:
+        None
+    """
+
+    from torch.utils.flop_counter import FlopCounterMode
+
+    size_output = len(datasets.folder.find_classes(path)[0])
+    image = rasterizeStrokes(sampleStrokes()).render(input_size)
+
+    print(f"{'architecture':<14} {'parameters':>10} {'MFLOPs':>9} {'latency':>10} {'train':>14} {'test loss':>10} {'accuracy':>10}")
+
+    for architecture in architectures:
+        torch.manual_seed(seed)
+        learn = Learn(size_output, input_size=input_size, architecture=architecture)
+        learn.setSchedule(schedule, lr)
+        learn.augmentation.generator.manual_seed(seed)
+        learn.device = 'cpu'
+        learn.cnn.to('cpu')
+        train_data, test_data = learn.loadData(path, cache)
+
+        start = time.perf_counter()
+        learn.fit(train_data, test_data, epochs)
+        epoch_time = (time.perf_counter() - start) / epochs
+
+        learn.cnn.eval()
+        with FlopCounterMode(display=False) as counter, torch.inference_mode():
+            learn.cnn(learn.transformImage(image).unsqueeze(0))
+
+        times = sorted(measure(lambda: learn.predict(image), repeats))
+
+        print(f"{architecture:<14} {sum(p.numel() for p in learn.cnn.parameters()):>10} {counter.get_total_flops() / 1e6:9.1f} "
+              f"{times[len(times) // 2]:7.2f} ms {epoch_time:8.2f} s/epoch {learn.history[-1][1]:10.4f} "
+              f"{100 * learn.accuracy_history[-1]:9.2f}%", flush=True)
+
+
+def rasterizeStrokes(strokes: List[List[Tuple[int, int]]]) -> StrokeRasterizer:
+    """
+    Draw strokes on a rasterizer of the size of the canvas, as the PaintFrame does.
+
+    Args:
+        strokes (List[List[Tuple[int, int]]]): List of strokes, each stroke is a list of points.
+
+    Returns:
+        StrokeRasterizer: Rasterizer with the drawing.
+    """
+
+    rasterizer = StrokeRasterizer(500, 500, 3)
+    for stroke in strokes:
+        rasterizer.beginStroke(*stroke[0])
+        for point in stroke[1:]:
+            rasterizer.addPoint(*point)
+
+    return rasterizer
+
+
+def result(value: float, unit: str, better: str) -> Dict[str, Any]:
+    """
+    Build a result of the benchmark suite.
+
+    Args:
+        value (float): Measured value.
+        unit (str): Unit of the value, e.g. 'ms' or 'samples/s'.
+        better (str): 'lower' or 'higher', the direction of an improvement.
+
+    Returns:
+        Dict[str, Any]: Result as saved in the JSON file.
+    """
+
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def median(values: List[float]) -> float:
+    """
+    Get the median of measured values.
+
+    Args:
+        values (List[float]): Measured values.
+
+    Returns:
+        float: Median.
+    """
+
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def benchmarkSuite(path: str, brain: str, out: str, repeats: int, number_samples: int, workers: List[int], epochs: int,
+                   seed: int) -> None:
+    """
+    Run the benchmark suite headless and save the results to a JSON file, to compare with the compare command.
+
+    Measures the latency of one prediction (the first one after opening the brain and the following ones), the
+    throughput of batched inference, of the DataLoader for several numbers of workers and of a training epoch, the
+    time to save and open a checkpoint, and the time to convert a drawing of the canvas to the input tensor.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        brain (str): Path to the saved brain.
+        out (str): Path of the JSON file.
+        repeats (int): Number of measured calls of the latency benchmarks.
+        number_samples (int): Number of images read by the data loading and batched inference benchmarks.
+        workers (List[int]): Numbers of DataLoader workers of the data loading benchmark.
+        epochs (int): Number of measured training epochs, 0 skips the training benchmark.
+        seed (int): Seed of the random generators.
+
+    Returns:
+        None
+    """
+
+    torch.manual_seed(seed)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def report(name: str, value: float, unit: str, better: str) -> None:
+        results[name] = result(value, unit, better)
+        print(f"{name:<32} {value:12.2f} {unit}", flush=True)
+
+    image = rasterizeStrokes(sampleStrokes()).render(256)
+
+    start = time.perf_counter()
+    learn = Learn()
+    learn.open(brain)
+    learn.predict(image.resize((learn.input_size, learn.input_size)))
+    report("predict_cold", (time.perf_counter() - start) * 1000, "ms", "lower")
+
+    image = image.resize((learn.input_size, learn.input_size))
+    report("predict_warm", median(measure(lambda: learn.predict(image), repeats)), "ms", "lower")
+
+    strokes = sampleStrokes()
+    report("canvas_to_tensor", median(measure(lambda: learn.transformImage(rasterizeStrokes(strokes).render(learn.input_size)), repeats)),
+           "ms", "lower")
+
+    dataset = learn.loadDataset(path)
+    subset = Subset(dataset, range(min(number_samples, len(dataset))))
+
+    for number_workers in workers:
+        start = time.perf_counter()
+        for _ in DataLoader(subset, batch_size=64, num_workers=number_workers):
+            pass
+        report(f"load_data_workers_{number_workers}", len(subset) / (time.perf_counter() - start), "samples/s", "higher")
+
+    batches = [images for images, _ in DataLoader(subset, batch_size=64)]
+    learn.predictBatch(batches[0])
+    start = time.perf_counter()
+    for images in batches:
+        learn.predictBatch(images)
+    report("predict_batch", len(subset) / (time.perf_counter() - start), "samples/s", "higher")
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "checkpoint.pth")
+        learn.run = {'start': 0, 'epochs': 0, 'patience': None, 'checkpoint': file_name, 'best_loss': None, 'best_epoch': 0}
+        report("checkpoint_save", median(measure(lambda: learn.save(file_name, True), repeats, 1)), "ms", "lower")
+
+        def openCheckpoint() -> None:
+            opened = Learn()
+            opened.open(file_name)
+            opened.detachFromFile()
+
+        report("checkpoint_open", median(measure(openCheckpoint, repeats, 1)), "ms", "lower")
+
+    if epochs > 0:
+        torch.manual_seed(seed)
+        trained = Learn(len(datasets.folder.find_classes(path)[0]), input_size=learn.input_size)
+        trained.augmentation.generator.manual_seed(seed)
+        train_data, test_data = trained.loadData(path)
+
+        start = time.perf_counter()
+        trained.fit(train_data, test_data, epochs)
+        report("epoch", (time.perf_counter() - start) / epochs, "s", "lower")
+
+    environment = {'python': platform.python_version(),
+                   'torch': torch.__version__,
+                   'platform': platform.platform(),
+                   'processor': platform.processor(),
+                   'cpus': os.cpu_count(),
+                   'threads': torch.get_num_threads(),
+                   'device': learn.device,
+                   'brain': brain,
+                   'data': path,
+                   'time': time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    with open(out, 'w') as file:
+        json.dump({'environment': environment, 'results': results}, file, indent=2)
+
+    print(f"saved: {out}")
+
+
+def compareResults(baseline: str, current: str, threshold: float) -> bool:
+    """
+    Compare the results of two runs of the benchmark suite and flag the regressions.
+
+    Args:
+        baseline (str): Path of the JSON file of the baseline.
+        current (str): Path of the JSON file of the compared run.
+        threshold (float): Relative change tolerated before a result is a regression, e.g. 0.1 for 10 %.
+
+    Returns:
+        bool: True if a result regressed by more than the threshold or is missing from the compared run.
+    """
+
+    with open(baseline) as file:
+        baseline_results = json.load(file)['results']
+    with open(current) as file:
+        current_results = json.load(file)['results']
+
+    regressed = False
+    print(f"{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>9}")
+
+    for name, before in baseline_results.items():
+        # The suite reports every result on every run, a missing one means a benchmark failed or was dropped.
+        if name not in current_results:
+            regressed = True
+            print(f"{name:<32} {before['value']:12.2f} {'missing':>12} {'':>9}  {before['unit']:<10} REGRESSION")
+            continue
+
+        after = current_results[name]
+        change = (after['value'] - before['value']) / before['value'] if before['value'] else 0.0
+        worse = change > threshold if before['better'] == 'lower' else change < -threshold
+        better = change < -threshold if before['better'] == 'lower' else change > threshold
+        regressed = regressed or worse
+
+        flag = "REGRESSION" if worse else "improved" if better else ""
+        print(f"{name:<32} {before['value']:12.2f} {after['value']:12.2f} {100 * change:+8.1f}%  {before['unit']:<10} {flag}")
+
+    for name in current_results.keys() - baseline_results.keys():
+        print(f"{name:<32} {'new':>12} {current_results[name]['value']:12.2f}")
+
+    return regressed
+
+
+def main() -> None:
+    """
+    Parse the command line and run the selected benchmark.
+
+    Returns:
+        None
+    """
+
+    parser = argparse.ArgumentParser(description="Brain benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    predict_parser = subparsers.add_parser("predict", help="latency of one prediction from the canvas")
+    predict_parser.add_argument("--brain", default="../trainingModel/model.pth")
+    predict_parser.add_argument("--repeats", type=int, default=50)
+
+    augmentation_parser = subparsers.add_parser("augmentation", help="CPU time of the random rotation")
+    augmentation_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    augmentation_parser.add_argument("--samples", type=int, default=512)
+    augmentation_parser.add_argument("--batch-size", type=int, default=64)
+    augmentation_parser.add_argument("--chunk-size", type=int, default=8)
+
+    server_parser = subparsers.add_parser("server", help="latency and throughput of the inference server")
+    server_parser.add_argument("--address", default=None, help="running server ('http://host:port' or 'unix:/path'), default: start one")
+    server_parser.add_argument("--brain", default="../trainingModel/model.pth")
+    server_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    server_parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    server_parser.add_argument("--max-batch-size", type=int, default=32)
+    server_parser.add_argument("--max-latency-ms", type=float, default=5.0)
+
+    input_size_parser = subparsers.add_parser("input-size", help="accuracy and speed of brains trained at different input sizes")
+    input_size_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    input_size_parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256])
+    input_size_parser.add_argument("--epochs", type=int, default=5)
+    input_size_parser.add_argument("--repeats", type=int, default=50)
+    input_size_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    input_size_parser.add_argument("--seed", type=int, default=0)
+
+    precision_parser = subparsers.add_parser("precision", help="epoch time and validation loss of the precision modes")
+    precision_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    precision_parser.add_argument("--precisions", nargs="+", choices=list(PRECISIONS), default=list(PRECISIONS))
+    precision_parser.add_argument("--epochs", type=int, default=5)
+    precision_parser.add_argument("--repeats", type=int, default=50)
+    precision_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    precision_parser.add_argument("--seed", type=int, default=0)
+
+    schedule_parser = subparsers.add_parser("schedule", help="epochs and time to reach a test loss with each learning rate schedule")
+    schedule_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    schedule_parser.add_argument("--schedules", nargs="+", default=["constant:1e-4", "constant:1e-3", "one-cycle:1e-3", "cosine:1e-3"], help="'name:lr' pairs")
+    schedule_parser.add_argument("--target-loss", type=float, default=0.9)
+    schedule_parser.add_argument("--epochs", type=int, default=8)
+    schedule_parser.add_argument("--input-size", type=int, default=256)
+    schedule_parser.add_argument("--precision", choices=list(PRECISIONS), default="fp32")
+    schedule_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    schedule_parser.add_argument("--seed", type=int, default=0)
+
+    distributed_parser = subparsers.add_parser("distributed", help="training throughput with data-parallel processes on the CPU")
+    distributed_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    distributed_parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    distributed_parser.add_argument("--epochs", type=int, default=2)
+    distributed_parser.add_argument("--input-size", type=int, default=256)
+    distributed_parser.add_argument("--precision", choices=list(PRECISIONS), default="fp32")
+    distributed_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    distributed_parser.add_argument("--seed", type=int, default=0)
+
+    architectures_parser = subparsers.add_parser("architectures", help="size, FLOPs, CPU latency and accuracy of the architectures")
+    architectures_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    architectures_parser.add_argument("--architectures", nargs="+", choices=list(ARCHITECTURES), default=list(ARCHITECTURES))
+    architectures_parser.add_argument("--epochs", type=int, default=10)
+    architectures_parser.add_argument("--input-size", type=int, default=64)
+    architectures_parser.add_argument("--schedule", default="one-cycle")
+    architectures_parser.add_argument("--lr", type=float, default=3e-3)
+    architectures_parser.add_argument("--repeats", type=int, default=50)
+    architectures_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    architectures_parser.add_argument("--seed", type=int, default=0)
+
+    suite_parser = subparsers.add_parser("suite", help="run the headless benchmark suite and save the results to JSON")
+    suite_parser.add_argument("--data", default="../dataset(digit 1-5)")
+    suite_parser.add_argument("--brain", default="../trainingModel/model.pth")
+    suite_parser.add_argument("--out", default="benchmark.json", help="path of the JSON file")
+    suite_parser.add_argument("--repeats", type=int, default=30)
+    suite_parser.add_argument("--samples", type=int, default=1024, help="images read by the data loading and batched inference benchmarks")
+    suite_parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    suite_parser.add_argument("--epochs", type=int, default=1, help="measured training epochs, 0 to skip")
+    suite_parser.add_argument("--seed", type=int, default=0)
+
+    compare_parser = subparsers.add_parser("compare", help="compare suite results with a baseline, exit with 1 on regressions")
+    compare_parser.add_argument("baseline", help="JSON file of the baseline")
+    compare_parser.add_argument("current", help="JSON file of the compared run")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="tolerated relative change (default: 0.1)")
+
+    args = parser.parse_args()
+
+    if args.command == "predict":
+        benchmarkPredict(args.brain, args.repeats)
+    elif args.command == "augmentation":
+        benchmarkAugmentation(args.data, args.samples, args.batch_size, args.chunk_size)
+    elif args.command == "server":
+        benchmarkServer(args.address, args.brain, args.concurrency, args.requests, args.max_batch_size, args.max_latency_ms)
+    elif args.command == "input-size":
+        benchmarkInputSize(args.data, args.sizes, args.epochs, args.repeats, args.cache, args.seed)
+    elif args.command == "precision":
+        benchmarkPrecision(args.data, args.precisions, args.epochs, args.repeats, args.cache, args.seed)
+    elif args.command == "schedule":
+        benchmarkSchedule(args.data, args.schedules, args.target_loss, args.epochs, args.input_size, args.precision, args.cache, args.seed)
+    elif args.command == "distributed":
+        benchmarkDistributed(args.data, args.processes, args.epochs, args.input_size, args.precision, args.cache, args.seed)
+    elif args.command == "architectures":
+        benchmarkArchitectures(args.data, args.architectures, args.epochs, args.input_size, args.schedule, args.lr, args.repeats, args.cache, args.seed)
+    elif args.command == "suite":
+        benchmarkSuite(args.data, args.brain, args.out, args.repeats, args.samples, args.workers, args.epochs, args.seed)
+    elif args.command == "compare":
+        sys.exit(1 if compareResults(args.baseline, args.current, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,874 @@
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+import torch
+from torch.utils.data import DataLoader
+from torchvision import datasets
+
+from cnn import ARCHITECTURES
+from learn import Learn, PRECISIONS, TIMING_PHASES
+from profiling import profilePaths
+from schedule import SCHEDULES
+from learnObserver import LearnObserver
+
+
+class ConsoleObserver(LearnObserver):
+    """
+    Prints the progress of the learning process to the console.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the ConsoleObserver.
+
+        Returns:
+            None
+        """
+
+        self.number_epoch: int = 0
+        self.start: float = time.perf_counter()
+
+    def learnLabels(self, labels: List[str]) -> None:
+        """
+        Print the labels of the training data.
+
+        Args:
+            labels (List[str]): Labels of the training data.
+
+        Returns:
+            None
+        """
+
+        print(f"labels: {', '.join(labels)}")
+
+    def learnStarted(self, number_epoch: int) -> None:
+        """
+        Remember the number of epochs and the start time.
+
+        Args:
+            number_epoch (int): Number of epochs to run.
+
+        Returns:
+            None
+        """
+
+        self.number_epoch = number_epoch
+        self.start = time.perf_counter()
+
+    def learnEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Print the statistics of an epoch.
+
+        Args:
+            epoch (int): Number of the finished epoch.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        print(f"epoch {epoch:>4}/{self.number_epoch}   "
+              f"train loss {stats['train_loss']:.4f}   "
+              f"test loss {stats['test_loss']:.4f}   "
+              f"test accuracy {100 * stats['test_accuracy']:6.2f} %   "
+              f"{stats['samples_per_second']:8.1f} samples/s   "
+              f"lr {stats['learning_rate']:.2e}   "
+              f"{stats['time']:7.2f} s", flush=True)
+
+        busy = sum(stats[f'{phase}_time'] for phase in TIMING_PHASES)
+        breakdown = "   ".join(f"{phase} {100 * stats[f'{phase}_time'] / max(busy, 1e-9):4.1f} %" for phase in TIMING_PHASES)
+        peak = f"   peak RSS {stats['peak_rss_mb']:.0f} MB" if stats['peak_rss_mb'] is not None else ""
+        print(f"           {breakdown}{peak}", flush=True)
+
+    def learnFailed(self, error: str) -> None:
+        """
+        Print the error that stopped the learning process.
+
+        Args:
+            error (str): Description of the error.
+
+        Returns:
+            None
+        """
+
+        print(f"failed: {error}", flush=True)
+
+    def learnFinished(self) -> None:
+        """
+        Print the wall time of the whole learning process.
+
+        Returns:
+            None
+        """
+
+        print(f"finished in {time.perf_counter() - self.start:.2f} s")
+
+
+def train(data: str, epochs: int, out: str, size_output: Optional[int], input_size: int, precision: Optional[str], brain: Optional[str],
+          cache: bool, seed: Optional[int], checkpoint: Optional[str], patience: Optional[int], schedule: Optional[str],
+          lr: Optional[float], warmup: Optional[float], processes: int, timing_log: Optional[str],
+          profile_steps: Optional[List[int]], architecture: str = 'CNN') -> None:
+    """
+    Train a brain on a dataset folder and save it.
+
+    Args:
+        data (str): Path to the dataset, one subfolder per label.
+        epochs (int): Number of epochs.
+        out (str): Path of the saved brain.
+        size_output (Optional[int]): Number of labels, if None the number of subfolders is used.
+        input_size (int): Width and height the images are resized to, a brain continued from keeps its own size.
+        precision (Optional[str]): 'fp32', 'bf16' or 'fp16', if None a new brain uses fp32 and a continued one keeps its own.
+        brain (Optional[str]): Path of a saved brain to continue learning from.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (Optional[int]): Seed of the random generators.
+        checkpoint (Optional[str]): If set, the run is saved to this file after every epoch and can be resumed.
+        patience (Optional[int]): If set, number of epochs without improvement of the test loss before stopping.
+        schedule (Optional[str]): 'constant', 'one-cycle' or 'cosine', if None the schedule of the brain.
+        lr (Optional[float]): Learning rate, the peak one of 'one-cycle' and 'cosine', if None the one of the brain.
+        warmup (Optional[float]): Fraction of the run spent warming up, if None the one of the brain.
+        processes (int): Number of data-parallel training processes, see Learn.fitDistributed.
+        timing_log (Optional[str]): If set, the statistics and timings of every epoch are appended to this JSONL file.
+        profile_steps (Optional[List[int]]): If set, the skipped, warmup and recorded training steps profiled with
+            torch.profiler, the profile is saved next to out.
+        architecture (str): Network of a new brain, see cnn.ARCHITECTURES, a brain continued from keeps its own.
+
+    Returns:
+        None
+    """
+
+    if seed is not None:
+        torch.manual_seed(seed)
+
+    if size_output is None:
+        size_output = len(datasets.folder.find_classes(data)[0])
+
+    observer = ConsoleObserver()
+    learn = Learn(size_output, observer, input_size, architecture)
+    if brain is not None:
+        learn.open(brain)
+
+    if precision is not None:
+        learn.setPrecision(precision)
+
+    learn.setSchedule(schedule if schedule is not None else learn.schedule['name'], lr, warmup)
+
+    if seed is not None:
+        learn.augmentation.generator.manual_seed(seed)
+
+    if profile_steps is not None:
+        learn.setProfiling(out, *profile_steps)
+
+    print(f"device: {learn.device}   architecture: {type(learn.cnn).__name__}   input size: {learn.input_size}x{learn.input_size}   precision: {learn.precision}   "
+          f"schedule: {learn.schedule['name']} (lr {learn.schedule['lr']:.2e})   processes: {processes}")
+
+    train_data, test_data = learn.loadData(data, cache)
+    observer.learnStarted(epochs)
+    if processes > 1:
+        learn.fitDistributed(epochs, processes, checkpoint, patience, timing_log)
+    else:
+        learn.fit(train_data, test_data, epochs, checkpoint, patience, timing_log)
+
+    finishRun(learn, out)
+
+    if profile_steps is not None:
+        print(f"profile: {', '.join(profilePaths(out, 'train'))}")
+
+
+def resume(checkpoint: str, out: str) -> None:
+    """
+    Resume a training run from its checkpoint and save the brain.
+
+    Args:
+        checkpoint (str): Path of the checkpoint written by 'train --checkpoint'.
+        out (str): Path of the saved brain.
+
+    Returns:
+        None
+    """
+
+    observer = ConsoleObserver()
+    learn = Learn(observer=observer)
+    learn.open(checkpoint)
+
+    done = len(learn.history) - learn.run['start']
+    print(f"device: {learn.device}   resuming at epoch {done}/{learn.run['epochs']}   data: {learn.run['path']}")
+
+    train_data, test_data = learn.loadData(learn.run['path'], learn.run['cache'])
+    observer.learnStarted(learn.run['epochs'])
+    learn.resume(train_data, test_data)
+
+    finishRun(learn, out)
+
+
+def extend(brain: str, data: str, epochs: int, out: str, old_samples: Optional[int], train_layers: List[str], lr: Optional[float],
+           cache: bool) -> None:
+    """
+    Add the labels of the folders of a dataset to a saved brain, learn them and save it.
+
+    Args:
+        brain (str): Path of the saved brain.
+        data (str): Path to the dataset, with a folder for every new label and optionally folders of old ones.
+        epochs (int): Number of epochs.
+        out (str): Path of the extended brain.
+        old_samples (Optional[int]): Number of images of each old label taken from the dataset, if None the mean
+            number of images of the new labels.
+        train_layers (List[str]): Layers of the network trained with the outputs of the new labels, e.g. ['fc2'] for a
+            CNN or ['blocks'] for a TinyCNN; a name the network does not have is an error.
+        lr (Optional[float]): Learning rate, if None the one of the brain.
+        cache (bool): If True, the decoded images are served from the cache.
+
+    Returns:
+        None
+    """
+
+    from datasetIndex import DatasetIndex
+
+    observer = ConsoleObserver()
+    learn = Learn(observer=observer)
+    learn.open(brain)
+    learn.checkLayers(tuple(train_layers))
+    learn.setSchedule(learn.schedule['name'], lr)
+
+    old_labels = list(learn.labels)
+    first_new = learn.extend(DatasetIndex(data).classes)
+    print(f"labels: {', '.join(old_labels)} + {', '.join(learn.labels[first_new:]) or 'none'}   outputs: {learn.size_output}   "
+          f"replay buffer: {len(learn.replay)} images")
+
+    train_data, test_data = learn.loadExtensionData(data, first_new, old_samples, cache)
+    if len(learn.replay) == 0 and all(target >= first_new for target in learn.train_data.targets):
+        print("the dataset has no images of the old labels and the brain no replay buffer, it will forget them")
+    observer.learnLabels(learn.labels)
+    observer.learnStarted(epochs)
+    learn.fitExtension(train_data, test_data, epochs, first_new, tuple(train_layers) + ('fc3',))
+
+    learn.save(out, replay=len(learn.replay) > 0)
+    print(f"saved: {out}")
+
+
+def distill(teacher: str, data: str, epochs: int, out: str, architecture: str, input_size: Optional[int], width: Optional[int],
+            blocks: Optional[int], temperature: float, alpha: float, schedule: str, lr: float, cache: bool, seed: Optional[int],
+            repeats: int) -> None:
+    """
+    Distill a saved brain into a smaller student brain, save it and print the accuracy gap and the speedup.
+
+    Args:
+        teacher (str): Path of the saved brain to distill.
+        data (str): Path to the dataset the teacher learned, the student is tested on the same test data.
+        epochs (int): Number of epochs.
+        out (str): Path of the saved student.
+        architecture (str): Network of the student, see cnn.ARCHITECTURES.
+        input_size (Optional[int]): Image size of the student, if None the one of the teacher.
+        width (Optional[int]): Width of a TinyCNN or ResidualCNN student, if None the default one.
+        blocks (Optional[int]): Number of residual blocks of a ResidualCNN student, if None the default one.
+        temperature (float): Temperature of the soft targets.
+        alpha (float): Weight of the soft targets, 1 - alpha is the weight of the labels.
+        schedule (str): Learning rate schedule of the student.
+        lr (float): Learning rate, the peak one of 'one-cycle' and 'cosine'.
+        cache (bool): If True, the decoded images are served from the cache.
+        seed (Optional[int]): Seed of the random generators.
+        repeats (int): Number of single-image predictions measured for the latency.
+
+    Returns:
+        None
+    """
+
+    if seed is not None:
+        torch.manual_seed(seed)
+
+    teacher_learn = Learn()
+    teacher_learn.open(teacher)
+
+    hyperparameters = {name: value for name, value in (('width', width), ('blocks', blocks)) if value is not None}
+    observer = ConsoleObserver()
+    student = Learn(teacher_learn.size_output, observer, input_size or teacher_learn.input_size, architecture, hyperparameters)
+    student.setSchedule(schedule, lr)
+    if seed is not None:
+        student.augmentation.generator.manual_seed(seed)
+
+    print(f"teacher: {type(teacher_learn.cnn).__name__} {teacher_learn.input_size}x{teacher_learn.input_size}   "
+          f"student: {type(student.cnn).__name__} {student.input_size}x{student.input_size} {student.cnn.hyperparameters()}   "
+          f"temperature: {temperature}   alpha: {alpha}")
+
+    train_data, test_data = student.loadDistillationData(teacher_learn, data, cache)
+    observer.learnLabels(student.labels)
+    observer.learnStarted(epochs)
+    student.fitDistilled(teacher_learn, train_data, test_data, epochs, temperature, alpha)
+
+    student.save(out)
+    print(f"saved: {out}")
+
+    image = next(iter(test_data))[0][:1]
+
+    def latency(learn: Learn) -> float:
+        model = learn.cnn.cpu().eval()
+        inputs = learn.resizeInputs(image)
+        with torch.inference_mode():
+            for _ in range(5):
+                model(inputs)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model(inputs)
+                times.append((time.perf_counter() - start) * 1000)
+        return sorted(times)[len(times) // 2]
+
+    rows = [(name, learn.evaluate(test_data), latency(learn), sum(parameter.numel() for parameter in learn.cnn.parameters()))
+            for name, learn in (("teacher", teacher_learn), ("student", student))]
+
+    print(f"{'model':<8} {'loss':>8} {'accuracy':>10} {'latency':>12} {'parameters':>11}")
+    for name, (loss, accuracy), median, parameters in rows:
+        print(f"{name:<8} {loss:8.4f} {100 * accuracy:9.2f}% {median:9.2f} ms {parameters:>11}")
+
+    print(f"accuracy gap {100 * (rows[1][1][1] - rows[0][1][1]):+.2f} pp   "
+          f"speedup {rows[0][2] / rows[1][2]:.2f}x   {rows[0][3] / rows[1][3]:.1f}x fewer parameters")
+
+
+def finishRun(learn: Learn, out: str) -> None:
+    """
+    Save the brain at the end of a training run and print where the best brain is.
+
+    Args:
+        learn (Learn): Learn object after the run.
+        out (str): Path of the saved brain.
+
+    Returns:
+        None
+    """
+
+    from learn import bestPath
+
+    run = learn.run
+    if len(learn.history) < run['start'] + run['epochs']:
+        print(f"stopped early: no improvement of the test loss for {run['patience']} epochs")
+
+    learn.save(out)
+    print(f"saved: {out}")
+
+    if run['checkpoint'] is not None:
+        print(f"best test loss {run['best_loss']:.4f} at epoch {run['best_epoch'] - run['start']}: {bestPath(run['checkpoint'])}")
+
+
+def sweep(data: str, epochs: int, out: str, space: Optional[str], values: Dict[str, Optional[list]], trials: Optional[int], folds: int,
+          min_epochs: int, eta: int, processes: int, input_size: int, size_output: Optional[int], cache: bool, seed: int) -> None:
+    """
+    Search the hyperparameters of a new brain with a sweep in parallel processes, print the ranked trials and save the
+    best brain.
+
+    Args:
+        data (str): Path to the dataset, one subfolder per label.
+        epochs (int): Epochs of the trials that are never stopped.
+        out (str): Path of the best brain, the results are saved next to it (see sweep.resultsPath).
+        space (Optional[str]): Path of a JSON file with the search space, see sweep.randomTrials.
+        values (Dict[str, Optional[list]]): Values of the hyperparameters given on the command line, added to the space.
+        trials (Optional[int]): If set, number of trials sampled by a random search, otherwise every combination is
+            tried.
+        folds (int): Number of folds of the cross-validation, 1 for the 80/20 split of train.
+        min_epochs (int): Epochs of the first rung of the successive halving.
+        eta (int): Only 1/eta of the trials go on to the next rung, 1 trains every trial for all the epochs.
+        processes (int): Number of worker processes.
+        input_size (int): Width and height the images are resized to.
+        size_output (Optional[int]): Number of labels, if None the number of subfolders is used.
+        cache (bool): If True, the images are copied from the cache next to the dataset.
+        seed (int): Seed of the split, of the sampling and of the trials.
+
+    Returns:
+        None
+    """
+
+    import json
+
+    from sweep import DEFAULT_PARAMETERS, gridTrials, randomTrials, resultsPath, runSweep
+
+    search_space = {}
+    if space is not None:
+        with open(space) as file:
+            search_space = json.load(file)
+    search_space.update({name: value for name, value in values.items() if value is not None})
+
+    parameters = randomTrials(search_space, trials, seed) if trials is not None else gridTrials(search_space)
+    varied = [name for name in DEFAULT_PARAMETERS if name in search_space]
+    print(f"{len(parameters)} trials of {', '.join(varied) or 'the default hyperparameters'}   folds: {folds}   processes: {processes}")
+
+    start_time = time.perf_counter()
+
+    def report(result: Dict) -> None:
+        print(f"trial {result['trial']:>3}  fold {result['fold']}   epoch {result['epochs']:>3}/{epochs}   "
+              f"test loss {result['test_loss']:.4f}   test accuracy {100 * result['test_accuracy']:6.2f} %   "
+              f"{result['time']:7.1f} s", flush=True)
+
+    results = runSweep(data, parameters, epochs, out, folds, min_epochs, eta, processes, input_size, size_output, cache, seed, report)
+
+    print(f"\nfinished in {time.perf_counter() - start_time:.1f} s")
+    print(f"{'rank':>4} {'trial':>5} " + " ".join(f"{name:>12}" for name in varied) + f" {'epochs':>6} {'test loss':>16} {'accuracy':>9}")
+    for result in results:
+        print(f"{result['rank']:>4} {result['trial']:>5} " + " ".join(f"{result[name]:>12.4g}" if isinstance(result[name], float) else f"{result[name]:>12}" for name in varied) +
+              f" {result['epochs']:>6} {result['test_loss']:8.4f} ± {result['test_loss_std']:.4f} {100 * result['test_accuracy']:8.2f}%")
+
+    print(f"saved: {out}   results: {resultsPath(out)}")
+
+
+def findLr(data: str, brain: Optional[str], size_output: Optional[int], input_size: int, architecture: str, cache: bool, number_steps: int,
+           start_lr: float, end_lr: float) -> None:
+    """
+    Run the learning rate range test and print the loss for each learning rate.
+
+    Args:
+        data (str): Path to the dataset, one subfolder per label.
+        brain (Optional[str]): Path of a saved brain, if None a new brain is tested.
+        size_output (Optional[int]): Number of labels of a new brain, if None the number of subfolders is used.
+        input_size (int): Width and height the images of a new brain are resized to.
+        architecture (str): Network of a new brain, see cnn.ARCHITECTURES.
+        cache (bool): If True, the decoded images are served from the cache.
+        number_steps (int): Number of mini-batches of the sweep.
+        start_lr (float): First learning rate.
+        end_lr (float): Last learning rate.
+
+    Returns:
+        None
+    """
+
+    if size_output is None:
+        size_output = len(datasets.folder.find_classes(data)[0])
+
+    learn = Learn(size_output, input_size=input_size, architecture=architecture)
+    if brain is not None:
+        learn.open(brain)
+
+    learning_rates, losses, suggestion = learn.findLearningRate(data, cache, number_steps, start_lr, end_lr)
+
+    lowest, highest = min(losses, default=0.0), max(losses, default=0.0)
+    for learning_rate, loss in zip(learning_rates, losses):
+        bar = "#" * round(40 * (loss - lowest) / max(highest - lowest, 1e-12))
+        print(f"lr {learning_rate:9.2e}   loss {loss:8.4f}   {bar}")
+
+    if suggestion is None:
+        print("the loss did not diverge during the test: a new brain may still be on its initial plateau, "
+              "test a brain trained for a few epochs (--brain) or raise --end-lr")
+    else:
+        print(f"suggested lr {suggestion:.2e} (a tenth of where the loss diverges), e.g. "
+              f"'train --schedule one-cycle --lr {suggestion:.0e}'")
+
+
+def evaluate(brain: str, data: str, cache: bool, precision: Optional[str]) -> None:
+    """
+    Print the loss and the accuracy of a saved brain on a dataset folder.
+
+    Args:
+        brain (str): Path of the saved brain.
+        data (str): Path to the dataset, one subfolder per label.
+        cache (bool): If True, the decoded images are served from the cache.
+        precision (Optional[str]): 'fp32', 'bf16' or 'fp16', if None the precision saved with the brain.
+
+    Returns:
+        None
+    """
+
+    learn = Learn()
+    learn.open(brain)
+    if precision is not None:
+        learn.setPrecision(precision)
+
+    loader = DataLoader(learn.loadDataset(data, cache), batch_size=64, num_workers=4)
+
+    start = time.perf_counter()
+    loss, accuracy = learn.evaluate(loader)
+    wall_time = time.perf_counter() - start
+
+    print(f"loss {loss:.4f}   accuracy {100 * accuracy:.2f} %   "
+          f"{len(loader.dataset) / wall_time:8.1f} samples/s   {wall_time:.2f} s")
+
+
+def predict(brain: str, images: List[str], profile: Optional[int]) -> None:
+    """
+    Print the most probable label of each image.
+
+    Args:
+        brain (str): Path of the saved brain.
+        images (List[str]): Paths of the images.
+        profile (Optional[int]): If set, this number of predictions is profiled with torch.profiler (the images are
+            repeated if there are fewer), after one that is not recorded, and the profile is saved next to the brain.
+
+    Returns:
+        None
+    """
+
+    from PIL import Image as PILImage
+
+    learn = Learn()
+    learn.open(brain)
+
+    if profile is not None:
+        learn.setProfiling(brain, predictions=profile)
+
+    pictures = [PILImage.open(path).convert('L') for path in images]
+    for path, picture in zip(images, pictures):
+        probabilities = learn.predict(picture)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        label = learn.labels[best] if best < len(learn.labels) else str(best)
+        print(f"{path}: {label} ({100 * probabilities[best]:.1f} %)")
+
+    if profile is not None:
+        for index in range(len(pictures), profile + 1):
+            learn.predict(pictures[index % len(pictures)])
+        print(f"profile: {', '.join(profilePaths(brain, 'predict'))}")
+
+
+def fineTune(brain: str, label: str, images: List[str], out: Optional[str], steps: int) -> None:
+    """
+    Teach images of a label to a saved brain with a few steps each, replaying the training images it has seen.
+
+    Args:
+        brain (str): Path of the saved brain.
+        label (str): Label of the images, its name or its index.
+        images (List[str]): Paths of the images.
+        out (Optional[str]): Path of the fine-tuned brain, the brain itself if None. The replay buffer is saved with it.
+        steps (int): Number of optimizer steps for every image.
+
+    Returns:
+        None
+    """
+
+    from PIL import Image as PILImage
+
+    learn = Learn()
+    learn.open(brain)
+
+    target = learn.labels.index(label) if label in learn.labels else int(label)
+    if len(learn.replay) == 0:
+        print("the brain has no replay buffer, it may forget its other labels (train or resume it with --checkpoint to fill one)")
+
+    for path in images:
+        picture = PILImage.open(path).convert('L')
+        before = learn.predict(picture)[target]
+        start = time.perf_counter()
+        loss = learn.fineTune(picture, target, steps)
+        after = learn.predict(picture)[target]
+        print(f"{path}: {100 * before:.1f} % -> {100 * after:.1f} %   loss {loss:.4f}   {time.perf_counter() - start:.2f} s")
+
+    learn.save(out if out is not None else brain, replay=True)
+    print(f"saved: {out if out is not None else brain}")
+
+
+def score(brain: str, sources: List[str], out: str, top_k: int, batch_size: int, workers: int) -> None:
+    """
+    Score folders or lists of images with a saved brain, writing the most probable labels to a CSV or Parquet file.
+
+    Args:
+        brain (str): Path of the saved brain.
+        sources (List[str]): Directories, image files, or text files with one image path per line.
+        out (str): Path of the CSV file, or of the Parquet directory if it ends with '.parquet'. If it holds the rows of
+            an interrupted scoring of the same images, the scoring resumes after them.
+        top_k (int): Number of most probable labels of each row.
+        batch_size (int): Number of images of a batch.
+        workers (int): Number of processes loading the images.
+
+    Returns:
+        None
+    """
+
+    from scoring import listImages, scoreImages
+
+    learn = Learn()
+    learn.open(brain)
+
+    paths = listImages(sources)
+    start_time = time.perf_counter()
+    first: List[int] = []
+
+    def report(done: int, total: int) -> None:
+        if not first:
+            first.append(done)
+        rate = (done - first[0]) / max(time.perf_counter() - start_time, 1e-9)
+        print(f"\r{done} / {total} images   {rate:8.1f} images/s", end="", flush=True)
+
+    scored = scoreImages(learn, paths, out, top_k, batch_size, workers, report)
+    print(f"\n{scored} images scored in {time.perf_counter() - start_time:.1f} s, {len(paths) - scored} were already in {out}")
+
+
+def quantize(brain: str, data: str, number_samples: int, cache: bool, repeats: int) -> None:
+    """
+    Quantize a saved brain to int8, save it next to the brain and print the accuracy, latency and size of both models.
+
+    Args:
+        brain (str): Path of the saved brain.
+        data (str): Path to the dataset used for calibration and evaluation.
+        number_samples (int): Number of calibration images.
+        cache (bool): If True, the decoded images are served from the cache.
+        repeats (int): Number of single-image predictions measured for the latency.
+
+    Returns:
+        None
+    """
+
+    from quantize import quantizedPath
+
+    learn = Learn()
+    learn.open(brain)
+    learn.quantize(data, number_samples, cache)
+    torch.jit.save(learn.quantized, quantizedPath(brain))
+    print(f"saved: {quantizedPath(brain)}")
+
+    loader = DataLoader(learn.loadDataset(data, cache), batch_size=64, num_workers=4)
+    fp32 = learn.cnn.cpu().eval()
+    image = next(iter(loader))[0][:1]
+
+    def latency(model: torch.nn.Module) -> float:
+        with torch.inference_mode():
+            for _ in range(5):
+                model(image)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model(image)
+                times.append((time.perf_counter() - start) * 1000)
+        return sorted(times)[len(times) // 2]
+
+    fp32_bytes = sum(tensor.numel() * tensor.element_size() for tensor in fp32.state_dict().values())
+    rows = [("fp32", learn.evaluate(loader, fp32), latency(fp32), fp32_bytes),
+            ("int8", learn.evaluate(loader, learn.quantized), latency(learn.quantized), os.path.getsize(quantizedPath(brain)))]
+
+    print(f"{'model':<6} {'loss':>8} {'accuracy':>10} {'latency':>12} {'size':>10}")
+    for name, (loss, accuracy), median, size in rows:
+        print(f"{name:<6} {loss:8.4f} {100 * accuracy:9.2f}% {median:9.2f} ms {size / 2 ** 20:7.2f} MB")
+
+    print(f"accuracy delta {100 * (rows[1][1][1] - rows[0][1][1]):+.2f} pp   "
+          f"speedup {rows[0][2] / rows[1][2]:.2f}x   size {rows[0][3] / rows[1][3]:.2f}x smaller")
+
+
+def convert(source: str, target: str, legacy: bool) -> None:
+    """
+    Convert a saved brain between the weights-only and the legacy format.
+
+    Args:
+        source (str): Path of the brain to convert, in either format.
+        target (str): Path of the converted brain.
+        legacy (bool): If True, the brain is saved in the legacy format, otherwise in the weights-only format.
+
+    Returns:
+        None
+    """
+
+    from brainFile import openAnyBrainFile, saveBrainFile, saveLegacyBrainFile
+
+    header, tensors = openAnyBrainFile(source)
+
+    if legacy:
+        saveLegacyBrainFile(target, header, tensors)
+    else:
+        saveBrainFile(target, header, tensors)
+
+    print(f"saved: {target} ({'legacy' if legacy else 'weights-only'} format)")
+
+
+def serve(brain: str, host: str, port: int, unix_socket: Optional[str], max_batch_size: int, max_latency_ms: float) -> None:
+    """
+    Serve the predictions of a saved brain over HTTP.
+
+    Args:
+        brain (str): Path of the saved brain.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        unix_socket (Optional[str]): If set, the server listens on this Unix socket instead of TCP.
+        max_batch_size (int): Maximal number of images in a batch.
+        max_latency_ms (float): Maximal time in milliseconds a request waits for other requests.
+
+    Returns:
+        None
+    """
+
+    from server import createServer, serverAddress
+
+    server = createServer(brain, host, port, unix_socket, max_batch_size, max_latency_ms / 1000)
+    print(f"serving {brain} on {serverAddress(server)}", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main() -> None:
+    """
+    Parse the command line and run the selected command.
+
+    Returns:
+        None
+    """
+
+    parser = argparse.ArgumentParser(prog="brain", description="Train and evaluate brains without the graphical interface")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="train a brain on a dataset folder")
+    train_parser.add_argument("--data", required=True, help="folder with one subfolder per label")
+    train_parser.add_argument("--epochs", type=int, default=10)
+    train_parser.add_argument("--out", default="brain_model.pth", help="path of the saved brain")
+    train_parser.add_argument("--size-output", type=int, default=None, help="number of labels (default: number of subfolders)")
+    train_parser.add_argument("--input-size", type=int, default=256, help="width and height the images are resized to")
+    train_parser.add_argument("--architecture", choices=list(ARCHITECTURES), default="CNN", help="network of a new brain, see 'benchmark.py architectures'")
+    train_parser.add_argument("--precision", choices=list(PRECISIONS), default=None, help="autocast the forward pass (default: fp32, or the precision of --brain)")
+    train_parser.add_argument("--brain", default=None, help="saved brain to continue learning from")
+    train_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    train_parser.add_argument("--seed", type=int, default=None)
+    train_parser.add_argument("--checkpoint", default=None, help="save the run after every epoch to this file, and the best brain next to it")
+    train_parser.add_argument("--patience", type=int, default=None, help="stop after this number of epochs without improvement of the test loss")
+
+    train_parser.add_argument("--schedule", choices=SCHEDULES, default=None, help="learning rate schedule (default: constant, or the schedule of --brain)")
+    train_parser.add_argument("--lr", type=float, default=None, help="learning rate, the peak one of one-cycle and cosine (default: 1e-4)")
+    train_parser.add_argument("--warmup", type=float, default=None, help="fraction of the run spent warming up (default: 0.3)")
+    train_parser.add_argument("--timing-log", default=None, help="append the statistics and the step timings of every epoch to this JSONL file")
+    train_parser.add_argument("--profile-steps", type=int, nargs=3, default=None, metavar=("SKIP", "WARMUP", "ACTIVE"),
+                              help="profile a window of training steps with torch.profiler, saved next to --out")
+    train_parser.add_argument("--processes", type=int, default=1, help="data-parallel training processes on the CPU, each with a batch of 64 images")
+
+    find_lr_parser = subparsers.add_parser("find-lr", help="learning rate range test")
+    find_lr_parser.add_argument("--data", required=True, help="folder with one subfolder per label")
+    find_lr_parser.add_argument("--brain", default=None, help="saved brain to test (default: a new brain)")
+    find_lr_parser.add_argument("--size-output", type=int, default=None, help="number of labels of a new brain (default: number of subfolders)")
+    find_lr_parser.add_argument("--input-size", type=int, default=256, help="image size of a new brain")
+    find_lr_parser.add_argument("--architecture", choices=list(ARCHITECTURES), default="CNN", help="network of a new brain")
+    find_lr_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    find_lr_parser.add_argument("--steps", type=int, default=100, help="number of mini-batches of the sweep")
+    find_lr_parser.add_argument("--start-lr", type=float, default=1e-7)
+    find_lr_parser.add_argument("--end-lr", type=float, default=1.0)
+
+    sweep_parser = subparsers.add_parser("sweep", help="search hyperparameters in parallel processes, with k-fold cross-validation and successive halving")
+    sweep_parser.add_argument("--data", required=True, help="folder with one subfolder per label")
+    sweep_parser.add_argument("--epochs", type=int, default=9, help="epochs of the trials that are never stopped")
+    sweep_parser.add_argument("--out", default="brain_model.pth", help="path of the best brain, the ranked results are saved next to it")
+    sweep_parser.add_argument("--space", default=None, help="JSON file mapping hyperparameters to lists of values or to {\"min\", \"max\", \"log\"} ranges")
+    sweep_parser.add_argument("--lr", type=float, nargs="+", default=None)
+    sweep_parser.add_argument("--schedule", choices=SCHEDULES, nargs="+", default=None)
+    sweep_parser.add_argument("--warmup", type=float, nargs="+", default=None)
+    sweep_parser.add_argument("--batch-size", type=int, nargs="+", default=None)
+    sweep_parser.add_argument("--rotation", type=float, nargs="+", default=None, help="maximal rotation of the augmentation in degrees")
+    sweep_parser.add_argument("--architecture", choices=list(ARCHITECTURES), nargs="+", default=None)
+    sweep_parser.add_argument("--trials", type=int, default=None, help="sample this number of trials (random search) instead of trying every combination")
+    sweep_parser.add_argument("--folds", type=int, default=1, help="folds of the cross-validation (default: the 80/20 split of train)")
+    sweep_parser.add_argument("--min-epochs", type=int, default=1, help="epochs after which the trials are first compared")
+    sweep_parser.add_argument("--eta", type=int, default=3, help="only 1/eta of the trials go on at every comparison, 1 never stops a trial")
+    sweep_parser.add_argument("--processes", type=int, default=2, help="worker processes, each trains one fold of a trial at a time")
+    sweep_parser.add_argument("--input-size", type=int, default=256, help="width and height the images are resized to")
+    sweep_parser.add_argument("--size-output", type=int, default=None, help="number of labels (default: number of subfolders)")
+    sweep_parser.add_argument("--cache", action="store_true", help="copy the images from the cache next to the dataset instead of decoding them")
+    sweep_parser.add_argument("--seed", type=int, default=0)
+
+    resume_parser = subparsers.add_parser("resume", help="resume a training run from its checkpoint")
+    resume_parser.add_argument("checkpoint", help="checkpoint written by 'train --checkpoint', it keeps being updated")
+    resume_parser.add_argument("--out", default="brain_model.pth", help="path of the saved brain")
+
+    extend_parser = subparsers.add_parser("extend", help="add the labels of new dataset folders to a saved brain")
+    extend_parser.add_argument("--brain", required=True, help="path of the saved brain")
+    extend_parser.add_argument("--data", required=True, help="folder with a subfolder per new label, and optionally subfolders of old labels")
+    extend_parser.add_argument("--epochs", type=int, default=5)
+    extend_parser.add_argument("--out", default="brain_model.pth", help="path of the extended brain")
+    extend_parser.add_argument("--old-samples", type=int, default=None, help="images of each old label mixed in (default: as many as a new label has)")
+    extend_parser.add_argument("--train-layers", nargs="*", default=[],
+                               help="layers trained entirely besides the new outputs, e.g. fc1 fc2 for a CNN or blocks for a TinyCNN or ResidualCNN")
+    extend_parser.add_argument("--lr", type=float, default=None, help="learning rate (default: the one of the brain)")
+    extend_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+
+    distill_parser = subparsers.add_parser("distill", help="train a smaller student brain on the soft targets of a saved brain")
+    distill_parser.add_argument("--teacher", required=True, help="path of the saved brain to distill")
+    distill_parser.add_argument("--data", required=True, help="folder the teacher learned, with one subfolder per label")
+    distill_parser.add_argument("--epochs", type=int, default=10)
+    distill_parser.add_argument("--out", default="brain_model.pth", help="path of the saved student")
+    distill_parser.add_argument("--architecture", choices=list(ARCHITECTURES), default="TinyCNN", help="network of the student")
+    distill_parser.add_argument("--input-size", type=int, default=None, help="image size of the student (default: the one of the teacher)")
+    distill_parser.add_argument("--width", type=int, default=None, help="width of a TinyCNN or ResidualCNN student")
+    distill_parser.add_argument("--blocks", type=int, default=None, help="residual blocks of a ResidualCNN student")
+    distill_parser.add_argument("--temperature", type=float, default=4.0, help="temperature of the soft targets")
+    distill_parser.add_argument("--alpha", type=float, default=0.9, help="weight of the soft targets, the labels get 1 - alpha")
+    distill_parser.add_argument("--schedule", choices=SCHEDULES, default="one-cycle")
+    distill_parser.add_argument("--lr", type=float, default=3e-3, help="learning rate, the peak one of one-cycle and cosine")
+    distill_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    distill_parser.add_argument("--seed", type=int, default=None)
+    distill_parser.add_argument("--repeats", type=int, default=50, help="number of predictions measured for the latency")
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="compute the loss and accuracy of a saved brain")
+    evaluate_parser.add_argument("--brain", required=True, help="path of the saved brain")
+    evaluate_parser.add_argument("--data", required=True, help="folder with one subfolder per label")
+    evaluate_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    evaluate_parser.add_argument("--precision", choices=list(PRECISIONS), default=None, help="autocast the forward pass (default: the precision of the brain)")
+
+    predict_parser = subparsers.add_parser("predict", help="print the most probable label of images")
+    predict_parser.add_argument("--brain", required=True, help="path of the saved brain")
+    predict_parser.add_argument("images", nargs="+", help="image files")
+    predict_parser.add_argument("--profile", type=int, default=None, metavar="N",
+                                help="profile N predictions with torch.profiler, saved next to the brain")
+
+    fine_tune_parser = subparsers.add_parser("fine-tune", help="teach images of a label to a saved brain with a few steps")
+    fine_tune_parser.add_argument("--brain", required=True, help="path of the saved brain")
+    fine_tune_parser.add_argument("--label", required=True, help="label of the images, its name or its index")
+    fine_tune_parser.add_argument("--out", default=None, help="path of the fine-tuned brain (default: the brain)")
+    fine_tune_parser.add_argument("--steps", type=int, default=8, help="optimizer steps for every image")
+    fine_tune_parser.add_argument("images", nargs="+", help="image files")
+
+    score_parser = subparsers.add_parser("score", help="write the most probable labels of folders of images to a CSV or Parquet file")
+    score_parser.add_argument("--brain", required=True, help="path of the saved brain")
+    score_parser.add_argument("--out", required=True, help="CSV file, or Parquet directory if it ends with .parquet; an interrupted scoring resumes")
+    score_parser.add_argument("--top-k", type=int, default=3, help="number of most probable labels of each image")
+    score_parser.add_argument("--batch-size", type=int, default=256)
+    score_parser.add_argument("--workers", type=int, default=4, help="processes loading the images")
+    score_parser.add_argument("sources", nargs="+", help="folders (searched recursively), image files, or text files with one path per line")
+
+    quantize_parser = subparsers.add_parser("quantize", help="quantize a saved brain to int8 for CPU inference")
+    quantize_parser.add_argument("--brain", required=True, help="path of the saved brain, the int8 model is saved next to it")
+    quantize_parser.add_argument("--data", required=True, help="folder used for calibration and for the report")
+    quantize_parser.add_argument("--samples", type=int, default=640, help="number of calibration images")
+    quantize_parser.add_argument("--cache", action="store_true", help="decode the images once into a cache next to the dataset")
+    quantize_parser.add_argument("--repeats", type=int, default=50, help="number of predictions measured for the latency")
+
+    convert_parser = subparsers.add_parser("convert", help="convert a saved brain between the weights-only and the legacy format")
+    convert_parser.add_argument("source", help="brain to convert, in either format")
+    convert_parser.add_argument("target", help="path of the converted brain")
+    convert_parser.add_argument("--legacy", action="store_true", help="write the legacy pickled format instead of the weights-only one")
+
+    serve_parser = subparsers.add_parser("serve", help="serve the predictions of a saved brain over HTTP")
+    serve_parser.add_argument("--brain", required=True, help="path of the saved brain")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--unix-socket", default=None, help="listen on a Unix socket instead of TCP")
+    serve_parser.add_argument("--max-batch-size", type=int, default=32)
+    serve_parser.add_argument("--max-latency-ms", type=float, default=5.0, help="time a request may wait to be batched")
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train(args.data, args.epochs, args.out, args.size_output, args.input_size, args.precision, args.brain, args.cache, args.seed, args.checkpoint, args.patience,
+              args.schedule, args.lr, args.warmup, args.processes, args.timing_log, args.profile_steps, args.architecture)
+    elif args.command == "find-lr":
+        findLr(args.data, args.brain, args.size_output, args.input_size, args.architecture, args.cache, args.steps, args.start_lr, args.end_lr)
+    elif args.command == "sweep":
+        values = {'lr': args.lr, 'schedule': args.schedule, 'warmup': args.warmup, 'batch_size': args.batch_size,
+                  'rotation': args.rotation, 'architecture': args.architecture}
+        sweep(args.data, args.epochs, args.out, args.space, values, args.trials, args.folds, args.min_epochs, args.eta, args.processes,
+              args.input_size, args.size_output, args.cache, args.seed)
+    elif args.command == "resume":
+        resume(args.checkpoint, args.out)
+    elif args.command == "extend":
+        extend(args.brain, args.data, args.epochs, args.out, args.old_samples, args.train_layers, args.lr, args.cache)
+    elif args.command == "distill":
+        distill(args.teacher, args.data, args.epochs, args.out, args.architecture, args.input_size, args.width, args.blocks, args.temperature,
+                args.alpha, args.schedule, args.lr, args.cache, args.seed, args.repeats)
+    elif args.command == "evaluate":
+        evaluate(args.brain, args.data, args.cache, args.precision)
+    elif args.command == "predict":
+        predict(args.brain, args.images, args.profile)
+    elif args.command == "fine-tune":
+        fineTune(args.brain, args.label, args.images, args.out, args.steps)
+    elif args.command == "score":
+        score(args.brain, args.sources, args.out, args.top_k, args.batch_size, args.workers)
+    elif args.command == "quantize":
+        quantize(args.brain, args.data, args.samples, args.cache, args.repeats)
+    elif args.command == "convert":
+        convert(args.source, args.target, args.legacy)
+    elif args.command == "serve":
+        serve(args.brain, args.host, args.port, args.unix_socket, args.max_batch_size, args.max_latency_ms)
+
+
+if __name__ == '__main__':
+    main()
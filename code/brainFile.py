@@ -0,0 +1,212 @@
+import collections
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Tuple
+
+import torch
+
+from cnn import CNN
+
+FORMAT_NAME = "brain"
+FORMAT_VERSION = 1
+
+DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+
+# Classes allowed when unpickling a brain saved in the legacy format, nothing else can be executed.
+LEGACY_GLOBALS = [CNN, torch.nn.Conv2d, torch.nn.Dropout, torch.nn.MaxPool2d, torch.nn.Linear, collections.OrderedDict, set]
+
+
+def isBrainFile(file_name: str) -> bool:
+    """
+    Check if a file is saved in the weights-only brain format.
+
+    Args:
+        file_name (str): Path of the file.
+
+    Returns:
+        bool: True for the weights-only format, False otherwise (e.g. the legacy pickled format).
+    """
+
+    with open(file_name, 'rb') as file:
+        start = file.read(9)
+
+    if len(start) < 9:
+        return False
+
+    header_size = struct.unpack('<Q', start[:8])[0]
+    return start[8:9] == b'{' and header_size < os.path.getsize(file_name)
+
+
+def saveBrainFile(file_name: str, header: Dict[str, Any], tensors: Dict[str, torch.Tensor]) -> None:
+    """
+    Save a brain in the weights-only format.
+
+    The layout is the one of safetensors: the size of the JSON header as a little-endian 64-bit integer, the JSON
+    header with the dtype, shape and offsets of every tensor, then the raw tensor data. The brain information is kept
+    as a JSON string in the '__metadata__' entry. The file is written next to the target and renamed, so a brain
+    mapped from the same path stays valid.
+
+    Args:
+        file_name (str): Path of the file.
+        header (Dict[str, Any]): JSON serializable information about the brain (architecture, labels, history, ...).
+        tensors (Dict[str, torch.Tensor]): Named tensors.
+
+    Returns:
+        None
+    """
+
+    entries: Dict[str, Any] = {"__metadata__": {"format": FORMAT_NAME,
+                                                "version": str(FORMAT_VERSION),
+                                                "brain": json.dumps(header)}}
+    buffers = []
+    offset = 0
+
+    # Larger elements first, like safetensors, so every tensor stays aligned to its element size.
+    for name, tensor in sorted(tensors.items(), key=lambda item: -item[1].element_size()):
+        data = tensor.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes()
+        entries[name] = {"dtype": DTYPES[tensor.dtype], "shape": list(tensor.shape), "data_offsets": [offset, offset + len(data)]}
+        buffers.append(data)
+        offset += len(data)
+
+    encoded_header = json.dumps(entries).encode()
+    encoded_header += b' ' * (-len(encoded_header) % 8)
+
+    temporary_name = f"{file_name}.tmp"
+    with open(temporary_name, 'wb') as file:
+        file.write(struct.pack('<Q', len(encoded_header)))
+        file.write(encoded_header)
+        for data in buffers:
+            file.write(data)
+
+    os.replace(temporary_name, file_name)
+
+
+def loadBrainFile(file_name: str) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+    """
+    Open a brain saved in the weights-only format.
+
+    The tensors are views of a copy-on-write memory map of the file, their data is read from the disk only when it is
+    used for the first time and changing them does not change the file.
+
+    Args:
+        file_name (str): Path of the file.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, torch.Tensor]]: Brain information and named tensors.
+    """
+
+    with open(file_name, 'rb') as file:
+        header_size = struct.unpack('<Q', file.read(8))[0]
+        entries = json.loads(file.read(header_size))
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY) if os.path.getsize(file_name) > 8 + header_size else None
+
+    metadata = entries.pop("__metadata__", {})
+    if metadata.get("format") != FORMAT_NAME:
+        raise ValueError(f"{file_name} is not a brain file")
+    if int(metadata.get("version", 0)) > FORMAT_VERSION:
+        raise ValueError(f"{file_name} was saved by a newer version (format {metadata['version']})")
+
+    dtypes = {name: dtype for dtype, name in DTYPES.items()}
+    tensors = {}
+
+    for name, entry in entries.items():
+        begin, end = entry["data_offsets"]
+        dtype = dtypes[entry["dtype"]]
+
+        if begin == end:
+            tensors[name] = torch.empty(entry["shape"], dtype=dtype)
+            continue
+
+        tensor = torch.frombuffer(mapped, dtype=torch.uint8, count=end - begin, offset=8 + header_size + begin)
+        tensors[name] = tensor.view(dtype).view(entry["shape"])
+
+    return json.loads(metadata["brain"]), tensors
+
+
+def loadLegacyBrainFile(file_name: str) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+    """
+    Open a brain saved in the legacy format (pickled dictionary with the whole CNN module).
+
+    Only the classes of LEGACY_GLOBALS can be created while unpickling, so an untrusted file cannot run code.
+
+    Args:
+        file_name (str): Path of the file.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, torch.Tensor]]: Brain information and named tensors, as for loadBrainFile.
+    """
+
+    with torch.serialization.safe_globals(LEGACY_GLOBALS):
+        checkpoint = torch.load(file_name, map_location='cpu', weights_only=True)
+
+    # Older versions of the application only built CNNs for 256 x 256 images, their modules have no input_size.
+    input_size = getattr(checkpoint.get('model_architecture'), 'input_size', 256)
+
+    header = {"architecture": {"name": "CNN", "size_output": checkpoint['size_output'], "input_size": input_size},
+              "labels": checkpoint['labels'],
+              "learn_history": checkpoint['learn_history'],
+              "learn_accuracy": checkpoint.get('learn_accuracy', []),
+              "size_output": checkpoint['size_output']}
+    tensors = {f"model.{name}": tensor for name, tensor in checkpoint['model_state_dict'].items()}
+
+    return header, tensors
+
+
+def saveLegacyBrainFile(file_name: str, header: Dict[str, Any], tensors: Dict[str, torch.Tensor]) -> None:
+    """
+    Save a brain in the legacy format, readable by the older versions of the application.
+
+    Args:
+        file_name (str): Path of the file.
+        header (Dict[str, Any]): Brain information, as returned by loadBrainFile.
+        tensors (Dict[str, torch.Tensor]): Named tensors, as returned by loadBrainFile.
+
+    Returns:
+        None
+    """
+
+    if header['architecture'].get('name', 'CNN') != 'CNN':
+        raise ValueError(f"the legacy format only stores the CNN architecture, not {header['architecture']['name']}")
+
+    state_dict = collections.OrderedDict((name[len("model."):], tensor.clone()) for name, tensor in tensors.items() if name.startswith("model."))
+
+    cnn = CNN(header['size_output'], header['architecture'].get('input_size', 256))
+    cnn.load_state_dict(state_dict)
+
+    torch.save({
+        'model_state_dict': state_dict,
+        'labels': header['labels'],
+        'model_architecture': cnn,
+        'learn_history': header['learn_history'],
+        'size_output': header['size_output']
+    }, file_name)
+
+
+def openAnyBrainFile(file_name: str) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+    """
+    Open a brain saved in the weights-only or in the legacy format.
+
+    Args:
+        file_name (str): Path of the file.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, torch.Tensor]]: Brain information and named tensors.
+    """
+
+    if isBrainFile(file_name):
+        return loadBrainFile(file_name)
+
+    return loadLegacyBrainFile(file_name)
@@ -1,18 +1,24 @@
 import tkinter as tk
+from tkinter import messagebox
 from PIL.Image import Image
-from typing import Optional, List
+from typing import Optional, List, Dict
 
-from learn import Learn
+from learn import Learn, timingPath
+from learnObserver import LearnObserver
 from menuBar import MenuBar
 from createFrame import CreateFrame
 from learnFrame import LearnFrame
+from learningRateFrame import LearningRateFrame
 from paintFrame import PaintFrame
 from plotFrame import PlotFrame
+from predictWorker import PredictWorker
+from progressChannel import ProgressChannel
+from rasterizer import StrokeRasterizer
 from startFrame import StartFrame
 from statsFrame import StatsFrame
 
 
-class BrainManager(tk.Tk):
+class BrainManager(tk.Tk, LearnObserver):
     """
     The main application class for managing the brain learning process.
     """
@@ -35,6 +41,8 @@ class BrainManager(tk.Tk):
         self.learn: Optional[Learn] = None
 
         self.path_to_save_brain: Optional[str] = None
+        self.profiling: bool = False
+        self.learning: bool = False
         self.number_labels_on_board: int = 10
         self.labels_list: List[str] = []
 
@@ -45,6 +53,16 @@ class BrainManager(tk.Tk):
 
         self.menu = MenuBar(self)
 
+        # Renders the strokes of the predictions in the thread of the worker, it follows the rasterizer of the canvas.
+        self.prediction_rasterizer = StrokeRasterizer(500, 500, 3)
+        self.prediction_error: Optional[str] = None
+        self.predict_worker = PredictWorker(self.predictStrokes, debounce=0.05)
+        self.predict_worker.start()
+        self.after(20, self.pollPrediction)
+
+        self.progress = ProgressChannel()
+        self.after(50, self.pollProgress)
+
         self.frame_container_left = tk.Frame(self, bg="#cfcccc")
         self.frame_container_left.grid(row=0, column=0, padx=40, pady=30, sticky="nw")
 
@@ -54,6 +72,10 @@ class BrainManager(tk.Tk):
         self.left_frame = PaintFrame(self.frame_container_left, self)
         self.right_frame = StartFrame(self.frame_container_right, self)
 
+        # Ctrl+1 to Ctrl+9 mark the drawing as the label of that row of the stats frame.
+        for number in range(1, 10):
+            self.bind(f"<Control-Key-{number}>", lambda event, index=number - 1: self.markDrawing(index))
+
     def changeToStatsFrame(self) -> None:
         """
         Switch to the stats frame.
@@ -63,11 +85,12 @@ class BrainManager(tk.Tk):
         """
 
         self.right_frame.destroy()
-        self.right_frame = StatsFrame(self.frame_container_right, self.number_labels_on_board)
+        self.right_frame = StatsFrame(self.frame_container_right, self.number_labels_on_board, self.markDrawing)
 
         self.left_frame.setDisplayPaint(True)
         self.menu.view_menu.entryconfig("History", state=tk.NORMAL)
         self.menu.edit_menu.entryconfig("Learn brain", state=tk.NORMAL)
+        self.menu.edit_menu.entryconfig("Extend brain", state=tk.NORMAL)
         self.menu.file_menu.entryconfig("Save brain", state=tk.NORMAL)
         self.menu.file_menu.entryconfig("Save as... brain", state=tk.NORMAL)
 
@@ -106,7 +129,7 @@ class BrainManager(tk.Tk):
         self.new_window_1.grab_set()
 
         self.new_window_1.title("Create new brain")
-        self.new_window_1.geometry("500x270")
+        self.new_window_1.geometry("640x400")
         self.new_window_1.resizable(width=False, height=False)
         self.new_window_1.configure(bg="#cfcccc")
 
@@ -127,7 +150,7 @@ class BrainManager(tk.Tk):
         self.new_window_1.grab_set()
 
         self.new_window_1.title("Learn brain")
-        self.new_window_1.geometry("600x300")
+        self.new_window_1.geometry("600x420")
         self.new_window_1.resizable(width=False, height=False)
         self.new_window_1.configure(bg="#cfcccc")
 
@@ -164,19 +187,57 @@ class BrainManager(tk.Tk):
 
         self.plot_frame = PlotFrame(frame, self, number_epoch)
 
-    def newCNN(self, size_output: int) -> None:
+    def newCNN(self, size_output: int, input_size: int = 256, architecture: str = 'CNN') -> None:
         """
         Create a new CNN.
 
         Args:
             size_output (int): Number of labels in the output layer.
+            input_size (int): Width and height of the images the brain learns and predicts on.
+            architecture (str): Name of the network, see cnn.ARCHITECTURES.
 
         Returns:
             None
         """
 
         self.number_labels_on_board = size_output
-        self.learn = Learn(self)
+        self.learn = Learn(size_output, self, input_size, architecture)
+        self.title(f"Brain   ( program use: {self.learn.device} )")
+        self.applyProfiling()
+
+    def setProfiling(self, enabled: bool) -> None:
+        """
+        Turn the profiling of the training runs and of the predictions on or off.
+
+        Args:
+            enabled (bool): True to profile.
+
+        Returns:
+            None
+        """
+
+        self.profiling = enabled
+        self.applyProfiling()
+
+    def applyProfiling(self, file_name: Optional[str] = None) -> None:
+        """
+        Apply the profiling setting to the brain, the profiles are saved next to the brain file.
+
+        Args:
+            file_name (Optional[str]): Path the profiles are saved next to, if None the path of the saved brain or
+                'brain_model.pth'.
+
+        Returns:
+            None
+        """
+
+        if self.learn is None:
+            return
+
+        if self.profiling:
+            self.learn.setProfiling(file_name or self.path_to_save_brain or 'brain_model.pth')
+        else:
+            self.learn.setProfiling(None)
 
     def closeWindowCreate(self) -> None:
         """
@@ -212,6 +273,124 @@ class BrainManager(tk.Tk):
 
         return self.learn.predict(image)
 
+    def predictStrokes(self, rasterizer: StrokeRasterizer) -> List[float]:
+        """
+        Render the strokes of the canvas at the input size of the model and predict them, in the prediction worker.
+
+        Args:
+            rasterizer (StrokeRasterizer): Rasterizer of the canvas, only its new segments are copied.
+
+        Returns:
+            List[float]: List of prediction results.
+        """
+
+        self.prediction_rasterizer.follow(rasterizer)
+        return self.predict(self.prediction_rasterizer.render(self.inputSize()))
+
+    def requestPrediction(self) -> None:
+        """
+        Queue the drawing for a prediction in the background, the stats frame is updated when it is done.
+
+        The strokes are not copied here but when the worker starts the prediction, so a motion event costs the same
+        however long the drawing is.
+
+        Returns:
+            None
+        """
+
+        self.predict_worker.submit(self.left_frame.rasterizer)
+
+    def cancelPrediction(self) -> None:
+        """
+        Drop the queued and running predictions, e.g. after the canvas was cleared.
+
+        Returns:
+            None
+        """
+
+        self.predict_worker.clear()
+
+    def pollPrediction(self) -> None:
+        """
+        Show the latest prediction of the background worker, runs periodically in the Tk loop.
+
+        Returns:
+            None
+        """
+
+        stats_data = self.predict_worker.takeResult()
+        if stats_data is not None:
+            self.updateDataInStatsFrame(stats_data)
+            self.prediction_error = None
+
+        # The same error is shown once, not for every stroke.
+        error = self.predict_worker.takeError()
+        if error is not None and error != self.prediction_error:
+            self.prediction_error = error
+            messagebox.showerror("Prediction failed", error)
+
+        self.after(20, self.pollPrediction)
+
+    def pollProgress(self) -> None:
+        """
+        Run the progress events published by the learning threads and redraw the plot, runs periodically in the Tk loop.
+
+        Returns:
+            None
+        """
+
+        for callback, args in self.progress.drain():
+            try:
+                callback(*args)
+            except:
+                pass
+
+        if self.plot_frame is not None and self.plot_frame.number_each is not None:
+            try:
+                self.plot_frame.refresh()
+            except:
+                pass
+
+        self.after(50, self.pollProgress)
+
+    def markDrawing(self, index: int) -> None:
+        """
+        Learn the drawing of the canvas as a label, in the background. The prediction of the drawing is updated when
+        the brain has learned it.
+
+        Args:
+            index (int): Index of the label.
+
+        Returns:
+            None
+        """
+
+        if self.learn is None or self.learning or not self.left_frame.rasterizer.strokes or index >= self.learn.size_output:
+            return
+
+        self.learn.startFineTune(self.left_frame.rasterizer.render(self.inputSize()), index)
+
+    def fineTuned(self) -> None:
+        """
+        Predict the drawing again after it was learned.
+
+        Returns:
+            None
+        """
+
+        if self.left_frame.rasterizer.strokes:
+            self.requestPrediction()
+
+    def inputSize(self) -> int:
+        """
+        Get the size of the image expected by the model.
+
+        Returns:
+            int: Width and height of the model input in pixels.
+        """
+
+        return self.learn.input_size
+
     def addLabel(self, labels: List[str]) -> None:
         """
         Add labels to the list.
@@ -227,36 +406,250 @@ class BrainManager(tk.Tk):
             if label not in self.labels_list:
                 self.labels_list.append(label)
 
-    def runLearning(self, path: str, number_epoch: int) -> None:
+    def runLearning(self, path: str, number_epoch: int, cache: bool = False, checkpoint: Optional[str] = None,
+                    patience: Optional[int] = None, schedule: str = 'constant', learning_rate: Optional[float] = None,
+                    number_processes: int = 1) -> None:
         """
         Run the learning process.
 
         Args:
             path (str): Path to the dataset.
             number_epoch (int): Number of epochs to run.
+            cache (bool): If True, the decoded images are served from the cache.
+            checkpoint (Optional[str]): If set, the run is saved to this file after every epoch.
+            patience (Optional[int]): If set, number of epochs without improvement of the test loss before stopping.
+            schedule (str): Learning rate schedule, 'constant', 'one-cycle' or 'cosine'.
+            learning_rate (Optional[float]): Learning rate, the peak one of the schedule, if None it is unchanged.
+            number_processes (int): Number of data-parallel training processes on the CPU.
 
         Returns:
             None
         """
 
-        self.learn.startLearn(path, number_epoch)
+        if self.learning:
+            return
 
-    def updatePlot(self, current_epoch: int) -> None:
+        # The timings of a checkpointed run are logged next to the checkpoint.
+        timing_log = timingPath(checkpoint) if checkpoint is not None else None
+
+        self.applyProfiling(checkpoint)
+        self.learn.setSchedule(schedule, learning_rate)
+        self.learn.startLearn(path, number_epoch, cache, checkpoint, patience, number_processes, timing_log)
+
+    def extendBrain(self, path: str, number_epoch: int) -> None:
         """
-        Update the plot with the current epoch.
+        Add the labels of the folders of a dataset to the brain and learn them, the stats frame gets a row for each.
+
+        Args:
+            path (str): Path to the dataset, with a folder for every new label and optionally folders of old ones.
+            number_epoch (int): Number of epochs to run.
+
+        Returns:
+            None
+        """
+
+        if self.learning:
+            return
+
+        self.learn.startExtend(path, number_epoch)
+
+        self.labels_list = list(self.learn.labels)
+        self.number_labels_on_board = self.learn.size_output
+        self.clearPaint()
+        self.changeToStatsFrame()
+        self.updateStatsLabel()
+
+    def findLearningRate(self, path: str, cache: bool = False) -> None:
+        """
+        Start the learning rate range test, its result is shown in a new window.
+
+        The test trains the model of the brain and restores it at the end, so no other learning may run meanwhile.
+
+        Args:
+            path (str): Path to the dataset.
+            cache (bool): If True, the decoded images are served from the cache.
+
+        Returns:
+            None
+        """
+
+        if self.learning:
+            return
+
+        self.learning = True
+        self.learn.startFindLearningRate(path, cache)
+
+    def learnRateFound(self, learning_rates: List[float], losses: List[float], suggestion: Optional[float]) -> None:
+        """
+        Show the result of the learning rate range test, called from the thread of the test.
+
+        Args:
+            learning_rates (List[float]): Learning rates of the test, empty if it failed.
+            losses (List[float]): Smoothed training losses.
+            suggestion (Optional[float]): Suggested learning rate.
+
+        Returns:
+            None
+        """
+
+        self.learning = False
+        if learning_rates:
+            self.progress.publish(self.newWindowLearningRate, learning_rates, losses, suggestion)
+
+    def newWindowLearningRate(self, learning_rates: List[float], losses: List[float], suggestion: Optional[float]) -> None:
+        """
+        Open the window with the result of the learning rate range test and fill in the suggested learning rate.
+
+        Args:
+            learning_rates (List[float]): Learning rates of the test.
+            losses (List[float]): Smoothed training losses.
+            suggestion (Optional[float]): Suggested learning rate.
+
+        Returns:
+            None
+        """
+
+        new_window_3 = tk.Toplevel()
+        new_window_3.title("Learning rate")
+        new_window_3.geometry("500x470")
+        new_window_3.resizable(width=False, height=False)
+        new_window_3.configure(bg="#cfcccc")
+
+        frame = tk.Frame(new_window_3, bg="#cfcccc")
+        frame.pack()
+
+        LearningRateFrame(frame, learning_rates, losses, suggestion)
+
+        try:
+            self.learn_brain_frame.learningRateFound(suggestion)
+        except:
+            pass
+
+    def resumeLearning(self, file_name: str) -> None:
+        """
+        Open the checkpoint of a training run and resume the run.
+
+        Args:
+            file_name (str): Path of the checkpoint.
+
+        Returns:
+            None
+        """
+
+        self.open(file_name)
+
+        if self.learn.run:
+            self.clearPaint()
+            self.learn.startResume()
+
+    def learnLabels(self, labels: List[str]) -> None:
+        """
+        Add the labels of the training data to the list, in the Tk thread.
+
+        Args:
+            labels (List[str]): Labels of the training data.
+
+        Returns:
+            None
+        """
+
+        self.progress.publish(self.addLabel, labels)
+
+    def learnStarted(self, number_epoch: int) -> None:
+        """
+        Open the plot window when the learning starts, in the Tk thread.
+
+        Args:
+            number_epoch (int): Number of epochs to run.
+
+        Returns:
+            None
+        """
+
+        self.learning = True
+        self.progress.publish(self.newWindowPlot, number_epoch)
+        self.progress.publish(self.updateStatsLabel)
+
+    def learnEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Add the epoch to the plot in the Tk thread, it is drawn by the next refresh of the plot.
+
+        Args:
+            epoch (int): Number of the finished epoch.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        self.progress.publish(self.updatePlot, epoch, dict(stats))
+
+    def learnFailed(self, error: str) -> None:
+        """
+        Show the error that stopped the learning process, in the Tk thread.
+
+        Args:
+            error (str): Description of the error.
+
+        Returns:
+            None
+        """
+
+        self.progress.publish(messagebox.showerror, "Learning failed", error)
+
+    def learnFinished(self) -> None:
+        """
+        Draw the last epochs without waiting for the redraw interval.
+
+        Returns:
+            None
+        """
+
+        self.learning = False
+        self.progress.publish(self.refreshPlot)
+
+    def learnFineTuned(self, target: int, loss: float) -> None:
+        """
+        Update the prediction of the drawing after it was learned, in the Tk thread.
+
+        Args:
+            target (int): Index of the label of the drawing.
+            loss (float): Loss of the last step.
+
+        Returns:
+            None
+        """
+
+        self.progress.publish(self.fineTuned)
+
+    def updatePlot(self, current_epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Add an epoch to the plot.
 
         Args:
             current_epoch (int): Current epoch.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        self.plot_frame.addEpoch(current_epoch, stats)
+
+    def refreshPlot(self) -> None:
+        """
+        Draw the epochs added to the plot.
 
         Returns:
             None
         """
 
-        self.plot_frame.update(current_epoch)
+        if self.plot_frame is not None:
+            self.plot_frame.refresh(True)
 
     def save(self, file_name: str) -> None:
         """
-        Save the trained model.
+        Save the trained model, with the replay buffer of the drawings learned in the application.
 
         Args:
             file_name (Optional[str]): File name for saving.
@@ -265,7 +658,7 @@ class BrainManager(tk.Tk):
             None
         """
 
-        self.learn.save(file_name)
+        self.learn.save(file_name, replay=True)
 
     def open(self, file_name: str) -> None:
         """
@@ -278,8 +671,13 @@ class BrainManager(tk.Tk):
             None
         """
 
-        self.learn = Learn(self)
+        self.learn = Learn(self.number_labels_on_board, self)
         self.learn.open(file_name)
+        self.title(f"Brain   ( program use: {self.learn.device} )")
+        self.applyProfiling(file_name)
+
+        self.labels_list = self.learn.labels
+        self.number_labels_on_board = self.learn.size_output
 
         self.changeToStatsFrame()
         self.updateStatsLabel()
@@ -314,6 +712,16 @@ class BrainManager(tk.Tk):
 
         return len(self.learn.history)
 
+    def getTimingHistory(self) -> List[Dict[str, Optional[float]]]:
+        """
+        Get the timings of the epochs, older brains have none for their first epochs.
+
+        Returns:
+            List[Dict[str, Optional[float]]]: Timings of the last epochs of the training history, see learn.TIMING_KEYS.
+        """
+
+        return self.learn.timing_history
+
     def getHistory(self) -> List[List[float]]:
         """
         Get the training history.
@@ -1,17 +1,66 @@
+from typing import Any, Dict
+
 import torch
 
+# Smallest input size for which conv4 still has a 1x1 output.
+MIN_INPUT_SIZE = 42
+
+# Input sizes offered when creating a brain.
+INPUT_SIZES = [64, 128, 256]
+
 
-class CNN(torch.nn.Module):
+class Classifier(torch.nn.Module):
+    """
+    Base of the architectures of the brains: a network ending with the output layer fc3 and returning log
+    probabilities.
+    """
+
+    def hyperparameters(self) -> Dict[str, Any]:
+        """
+        Get the hyperparameters of the architecture besides the number of outputs and the input size, they are saved
+        with the brain and passed back to the constructor when it is opened.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments of the constructor.
+        """
+
+        return {}
+
+    def widenOutput(self, size_output: int) -> None:
+        """
+        Replace fc3 by a layer with more outputs, the existing outputs keep their weights.
+
+        Args:
+            size_output (int): New number of output classes, at least the current one.
+
+        Returns:
+            None
+        """
+
+        old = self.fc3
+        if size_output < old.out_features:
+            raise ValueError(f"the brain has {old.out_features} outputs, it cannot shrink to {size_output}")
+
+        fc3 = torch.nn.Linear(old.in_features, size_output, device=old.weight.device, dtype=old.weight.dtype)
+        with torch.no_grad():
+            fc3.weight[:old.out_features] = old.weight
+            fc3.bias[:old.out_features] = old.bias
+
+        self.fc3 = fc3
+
+
+class CNN(Classifier):
     """
     Convolutional Neural Network (CNN) for image classification.
     """
 
-    def __init__(self, size_output) -> None:
+    def __init__(self, size_output, input_size: int = 256) -> None:
         """
         Initialize the CNN model.
 
         Args:
             size_output (int): Number of output classes.
+            input_size (int): Width and height of the input images.
 
         Returns:
             None
@@ -19,7 +68,9 @@ class CNN(torch.nn.Module):
 
         super(CNN, self).__init__()
 
-        self.conv1 = torch.nn.Conv2d(in_channels=1, out_channels=16, kernel_size=7, stride=3)
+        self.input_size = input_size
+
+        self.conv1 = torch.nn.Conv2d(in_channels=1, out_channels=16, kernel_size=7, stride=CNN.firstStride(input_size))
         self.conv2 = torch.nn.Conv2d(in_channels=16, out_channels=32, kernel_size=5, stride=1)
         self.conv3 = torch.nn.Conv2d(in_channels=32, out_channels=64, kernel_size=3, stride=3, padding=1)
         self.conv4 = torch.nn.Conv2d(in_channels=64, out_channels=128, kernel_size=3, stride=1)
@@ -30,10 +81,50 @@ class CNN(torch.nn.Module):
         self.pool1 = torch.nn.MaxPool2d(2, 2)
         self.pool2 = torch.nn.MaxPool2d(2, 2)
 
-        self.fc1 = torch.nn.Linear(3200, 256)
+        self.fc1 = torch.nn.Linear(128 * CNN.featureSide(input_size, self.conv1.stride[0]) ** 2, 256)
         self.fc2 = torch.nn.Linear(256, 128)
         self.fc3 = torch.nn.Linear(128, size_output)
 
+    @staticmethod
+    def featureSide(input_size: int, stride: int) -> int:
+        """
+        Compute the width and height of the output of conv4.
+
+        Args:
+            input_size (int): Width and height of the input images.
+            stride (int): Stride of conv1.
+
+        Returns:
+            int: Width and height of the feature maps flattened into fc1, less than 1 if the input is too small.
+        """
+
+        side = (input_size - 7) // stride + 1
+        side = (side - 4) // 2
+        side = ((side - 1) // 3 + 1) // 2
+        return side - 2
+
+    @staticmethod
+    def firstStride(input_size: int) -> int:
+        """
+        Choose the stride of conv1, the largest one (at most 3) that keeps feature maps of at least 3x3 after conv4,
+        stride 1 for the small inputs.
+
+        Args:
+            input_size (int): Width and height of the input images.
+
+        Returns:
+            int: Stride of conv1.
+        """
+
+        for stride in (3, 2):
+            if CNN.featureSide(input_size, stride) >= 3:
+                return stride
+
+        if CNN.featureSide(input_size, 1) >= 1:
+            return 1
+
+        raise ValueError(f"input size {input_size} is too small, the minimum is {MIN_INPUT_SIZE}")
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
         Defines the forward pass of the CNN.
@@ -61,4 +152,256 @@ class CNN(torch.nn.Module):
 
         x = torch.nn.functional.log_softmax(x, 1)
 
-        return x
\ No newline at end of file
+        return x
+
+
+class SeparableBlock(torch.nn.Module):
+    """
+    Depthwise separable convolution: a 3x3 convolution of every channel alone, then a 1x1 convolution mixing them,
+    each with batch normalization and ReLU.
+    """
+
+    def __init__(self, in_channels: int, out_channels: int, stride: int) -> None:
+        """
+        Initialize the SeparableBlock.
+
+        Args:
+            in_channels (int): Number of input channels.
+            out_channels (int): Number of output channels.
+            stride (int): Stride of the depthwise convolution.
+
+        Returns:
+            None
+        """
+
+        super().__init__()
+
+        self.depthwise = torch.nn.Conv2d(in_channels, in_channels, kernel_size=3, stride=stride, padding=1, groups=in_channels, bias=False)
+        self.bn1 = torch.nn.BatchNorm2d(in_channels)
+        self.pointwise = torch.nn.Conv2d(in_channels, out_channels, kernel_size=1, bias=False)
+        self.bn2 = torch.nn.BatchNorm2d(out_channels)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Defines the forward pass of the block.
+
+        Args:
+            x (torch.Tensor): Input tensor.
+
+        Returns:
+            torch.Tensor: Output tensor.
+        """
+
+        x = torch.nn.functional.relu(self.bn1(self.depthwise(x)))
+        return torch.nn.functional.relu(self.bn2(self.pointwise(x)))
+
+
+class TinyCNN(Classifier):
+    """
+    Small network of depthwise separable convolutions (as in MobileNet) for slow devices, with global average
+    pooling instead of large fully connected layers.
+    """
+
+    def __init__(self, size_output: int, input_size: int = 256, width: int = 16) -> None:
+        """
+        Initialize the TinyCNN model.
+
+        Args:
+            size_output (int): Number of output classes.
+            input_size (int): Width and height of the input images.
+            width (int): Number of channels of the first convolution, doubled by three of the blocks.
+
+        Returns:
+            None
+        """
+
+        super().__init__()
+
+        self.input_size = input_size
+        self.width = width
+
+        # Large inputs are reduced by a strided first convolution, the blocks then work on at most 64x64.
+        stride = max(1, input_size // 128)
+        self.conv1 = torch.nn.Conv2d(1, width, kernel_size=3, stride=2 * stride, padding=1, bias=False)
+        self.bn1 = torch.nn.BatchNorm2d(width)
+
+        self.blocks = torch.nn.Sequential(SeparableBlock(width, 2 * width, 2),
+                                          SeparableBlock(2 * width, 4 * width, 2),
+                                          SeparableBlock(4 * width, 8 * width, 2),
+                                          SeparableBlock(8 * width, 8 * width, 1))
+
+        self.dropout = torch.nn.Dropout(0.2)
+        self.fc3 = torch.nn.Linear(8 * width, size_output)
+
+    def hyperparameters(self) -> Dict[str, Any]:
+        """
+        Get the width of the TinyCNN, saved with the brain.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments of the constructor besides size_output and input_size.
+        """
+
+        return {'width': self.width}
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Defines the forward pass of the TinyCNN.
+
+        Args:
+            x (torch.Tensor): Input tensor.
+
+        Returns:
+            torch.Tensor: Output tensor.
+        """
+
+        x = torch.nn.functional.relu(self.bn1(self.conv1(x)))
+        x = self.blocks(x)
+        x = torch.flatten(torch.nn.functional.adaptive_avg_pool2d(x, 1), 1)
+
+        x = self.dropout(x)
+        x = self.fc3(x)
+
+        return torch.nn.functional.log_softmax(x, 1)
+
+
+class ResidualBlock(torch.nn.Module):
+    """
+    Two 3x3 convolutions with batch normalization and a shortcut connection (as in ResNet).
+    """
+
+    def __init__(self, in_channels: int, out_channels: int, stride: int) -> None:
+        """
+        Initialize the ResidualBlock.
+
+        Args:
+            in_channels (int): Number of input channels.
+            out_channels (int): Number of output channels.
+            stride (int): Stride of the first convolution and of the shortcut.
+
+        Returns:
+            None
+        """
+
+        super().__init__()
+
+        self.conv1 = torch.nn.Conv2d(in_channels, out_channels, kernel_size=3, stride=stride, padding=1, bias=False)
+        self.bn1 = torch.nn.BatchNorm2d(out_channels)
+        self.conv2 = torch.nn.Conv2d(out_channels, out_channels, kernel_size=3, padding=1, bias=False)
+        self.bn2 = torch.nn.BatchNorm2d(out_channels)
+
+        self.shortcut = torch.nn.Sequential()
+        if stride != 1 or in_channels != out_channels:
+            self.shortcut = torch.nn.Sequential(torch.nn.Conv2d(in_channels, out_channels, kernel_size=1, stride=stride, bias=False),
+                                                torch.nn.BatchNorm2d(out_channels))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Defines the forward pass of the block.
+
+        Args:
+            x (torch.Tensor): Input tensor.
+
+        Returns:
+            torch.Tensor: Output tensor.
+        """
+
+        out = torch.nn.functional.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return torch.nn.functional.relu(out + self.shortcut(x))
+
+
+class ResidualCNN(Classifier):
+    """
+    Wider residual network for accuracy on a server: four stages of residual blocks whose width doubles while the
+    images are halved, and global average pooling.
+    """
+
+    def __init__(self, size_output: int, input_size: int = 256, width: int = 32, blocks: int = 2) -> None:
+        """
+        Initialize the ResidualCNN model.
+
+        Args:
+            size_output (int): Number of output classes.
+            input_size (int): Width and height of the input images.
+            width (int): Number of channels of the first stage.
+            blocks (int): Number of residual blocks of every stage.
+
+        Returns:
+            None
+        """
+
+        super().__init__()
+
+        self.input_size = input_size
+        self.width = width
+        self.number_blocks = blocks
+
+        stride = max(1, input_size // 128)
+        self.conv1 = torch.nn.Conv2d(1, width, kernel_size=5, stride=2 * stride, padding=2, bias=False)
+        self.bn1 = torch.nn.BatchNorm2d(width)
+
+        stages = []
+        channels = width
+        for stage in range(4):
+            out_channels = width * 2 ** stage
+            for block in range(blocks):
+                stages.append(ResidualBlock(channels, out_channels, 2 if stage > 0 and block == 0 else 1))
+                channels = out_channels
+        self.blocks = torch.nn.Sequential(*stages)
+
+        self.dropout = torch.nn.Dropout(0.25)
+        self.fc3 = torch.nn.Linear(channels, size_output)
+
+    def hyperparameters(self) -> Dict[str, Any]:
+        """
+        Get the width and the number of residual blocks of the ResidualCNN, saved with the brain.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments of the constructor besides size_output and input_size.
+        """
+
+        return {'width': self.width, 'blocks': self.number_blocks}
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Defines the forward pass of the ResidualCNN.
+
+        Args:
+            x (torch.Tensor): Input tensor.
+
+        Returns:
+            torch.Tensor: Output tensor.
+        """
+
+        x = torch.nn.functional.relu(self.bn1(self.conv1(x)))
+        x = self.blocks(x)
+        x = torch.flatten(torch.nn.functional.adaptive_avg_pool2d(x, 1), 1)
+
+        x = self.dropout(x)
+        x = self.fc3(x)
+
+        return torch.nn.functional.log_softmax(x, 1)
+
+
+# Architectures of the brains by the name saved in the brain files, from the smallest to the most accurate.
+ARCHITECTURES = {'TinyCNN': TinyCNN, 'CNN': CNN, 'ResidualCNN': ResidualCNN}
+
+
+def createModel(name: str, size_output: int, input_size: int = 256, **hyperparameters: Any) -> Classifier:
+    """
+    Create the network of a brain.
+
+    Args:
+        name (str): Name of the architecture, a key of ARCHITECTURES.
+        size_output (int): Number of output classes.
+        input_size (int): Width and height of the input images.
+        **hyperparameters (Any): Other arguments of the architecture, its defaults if not given.
+
+    Returns:
+        Classifier: The network.
+    """
+
+    if name not in ARCHITECTURES:
+        raise ValueError(f"unknown architecture {name}, expected one of {', '.join(ARCHITECTURES)}")
+
+    return ARCHITECTURES[name](size_output, input_size, **hyperparameters)
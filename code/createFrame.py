@@ -1,6 +1,8 @@
 import tkinter as tk
 from typing import Any
 
+from cnn import ARCHITECTURES, INPUT_SIZES
+
 
 class CreateFrame(tk.Frame):
     """
@@ -28,6 +30,12 @@ class CreateFrame(tk.Frame):
         self.frame_1 = tk.Frame(parent, bg="#cfcccc")
         self.frame_1.pack(padx=30, pady=30)
 
+        self.frame_3 = tk.Frame(parent, bg="#cfcccc")
+        self.frame_3.pack(padx=30)
+
+        self.frame_4 = tk.Frame(parent, bg="#cfcccc")
+        self.frame_4.pack(padx=30, pady=(20, 0))
+
         self.frame_2 = tk.Frame(parent, bg="#cfcccc")
         self.frame_2.pack(padx=30, pady=30)
 
@@ -38,6 +46,22 @@ class CreateFrame(tk.Frame):
         self.number_entry.pack(side='left', padx=10)
         self.number_entry.insert(0, 10)
 
+        self.input_size_label = tk.Label(self.frame_3, text="Image size (pixels, smaller learns faster):", background="#cfcccc", font=("Helvetica", 12))
+        self.input_size_label.pack(side='left', padx=10)
+
+        self.input_size_value = tk.IntVar(value=INPUT_SIZES[-1])
+        self.input_size_menu = tk.OptionMenu(self.frame_3, self.input_size_value, *INPUT_SIZES)
+        self.input_size_menu.configure(font=("Helvetica", 12), relief=tk.FLAT, highlightthickness=0)
+        self.input_size_menu.pack(side='left', padx=10)
+
+        self.architecture_label = tk.Label(self.frame_4, text="Architecture (TinyCNN is the fastest, ResidualCNN the most accurate):", background="#cfcccc", font=("Helvetica", 12))
+        self.architecture_label.pack(side='left', padx=10)
+
+        self.architecture_value = tk.StringVar(value='CNN')
+        self.architecture_menu = tk.OptionMenu(self.frame_4, self.architecture_value, *ARCHITECTURES)
+        self.architecture_menu.configure(font=("Helvetica", 12), relief=tk.FLAT, highlightthickness=0)
+        self.architecture_menu.pack(side='left', padx=10)
+
         self.ok_button = tk.Button(self.frame_2, text="Create", width=25, height=2, font=("Helvetica", 15), relief=tk.FLAT, borderwidth=5, background="#4ac5e0", highlightthickness=1, bd=0, command=self.createNewBrain)
         self.ok_button.pack(pady=30)
 
@@ -51,21 +75,27 @@ class CreateFrame(tk.Frame):
 
         self.frame_1.destroy()
         self.frame_2.destroy()
+        self.frame_3.destroy()
+        self.frame_4.destroy()
         self.number_entry.destroy()
         self.number_labels.destroy()
+        self.input_size_label.destroy()
+        self.input_size_menu.destroy()
+        self.architecture_label.destroy()
+        self.architecture_menu.destroy()
         self.ok_button.destroy()
         super().destroy()
 
     def createNewBrain(self) -> None:
         """
-        Creates a new brain with the specified size.
+        Creates a new brain with the specified size, image size and architecture.
 
         Returns:
             None
         """
 
         if self.number_entry.get() != "" and int(self.number_entry.get()) > 0:
-            self.brain_manager.newCNN(int(self.number_entry.get()))
+            self.brain_manager.newCNN(int(self.number_entry.get()), self.input_size_value.get(), self.architecture_value.get())
             self.brain_manager.clearPaint()
             self.brain_manager.closeWindowCreate()
 
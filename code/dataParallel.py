@@ -0,0 +1,160 @@
+import os
+import queue
+import socket
+import tempfile
+from typing import Any, Dict, Optional
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as multiprocessing
+from torch.nn.parallel import DistributedDataParallel
+
+from learn import Learn, TIMING_KEYS
+from learnObserver import LearnObserver
+
+
+class QueueObserver(LearnObserver):
+    """
+    Observer of the first worker process, it sends the epochs to the process that started the training.
+    """
+
+    def __init__(self, events: Any) -> None:
+        """
+        Initialize the QueueObserver.
+
+        Args:
+            events (Any): Queue shared with the process that started the training.
+        """
+
+        self.events = events
+
+    def learnEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Send the statistics of the epoch, they are already combined over the processes.
+
+        Args:
+            epoch (int): Number of the finished epoch.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        self.events.put((epoch, stats))
+
+
+def freePort() -> int:
+    """
+    Find a free TCP port on this host for the process group.
+
+    Returns:
+        int: Port number.
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connection:
+        connection.bind(('127.0.0.1', 0))
+        return connection.getsockname()[1]
+
+
+def runDistributed(learn: Learn, number_processes: int) -> None:
+    """
+    Run the training run described by learn.run in data-parallel worker processes on the CPU.
+
+    The brain is handed to the workers through a checkpoint in a temporary directory. Every worker trains a copy of
+    the CNN on its shard of the training data, and the gradients are all-reduced with gloo after every backward pass,
+    so the copies stay identical. The epochs of the first worker are added to the history and reported to the
+    observer, and its model, optimizer and history are loaded back at the end. If a worker fails, the error is
+    reported to the observer and raised again, and learnFinished is called in any case.
+
+    Args:
+        learn (Learn): Brain with the data loaded and learn.run set, see Learn.fitDistributed.
+        number_processes (int): Number of worker processes.
+
+    Returns:
+        None
+    """
+
+    checkpoint = learn.run['checkpoint']
+    context = multiprocessing.get_context('spawn')
+    events = context.Queue()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'brain.pth')
+            learn.save(file_name, True)
+
+            workers = multiprocessing.spawn(distributedWorker, args=(number_processes, file_name, checkpoint, freePort(), events),
+                                            nprocs=number_processes, join=False)
+
+            finished = False
+            while not finished:
+                finished = workers.join(timeout=0.1)
+                while True:
+                    try:
+                        epoch, stats = events.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    learn.history.append([stats['train_loss'], stats['test_loss']])
+                    learn.accuracy_history.append(stats['test_accuracy'])
+                    learn.timing_history.append({key: stats[key] for key in TIMING_KEYS})
+                    learn.observer.learnEpoch(epoch, stats)
+
+            learn.open(file_name)
+            learn.detachFromFile()
+    except Exception as error:
+        # The error of a worker carries its traceback, its last line names the error.
+        lines = str(error).strip().splitlines()
+        learn.observer.learnFailed(f"data-parallel training failed: {lines[-1] if lines else type(error).__name__}")
+        raise
+    finally:
+        learn.run['checkpoint'] = checkpoint
+        learn.observer.learnFinished()
+
+
+def distributedWorker(rank: int, world_size: int, file_name: str, checkpoint: Optional[str], port: int, events: Any) -> None:
+    """
+    Train in one worker process of runDistributed.
+
+    Args:
+        rank (int): Rank of the process, the first one reports the epochs and saves the checkpoints.
+        world_size (int): Number of worker processes.
+        file_name (str): Checkpoint of the brain to train, the first process saves the trained brain to it.
+        checkpoint (Optional[str]): Path of the checkpoint saved after every epoch, see Learn.fit.
+        port (int): Port of the process group on this host.
+        events (Any): Queue of the epochs, see QueueObserver.
+
+    Returns:
+        None
+    """
+
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+
+    # Every process gets its share of the cores, more threads than cores only slow the all-reduce down.
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+
+    try:
+        learn = Learn(observer=QueueObserver(events) if rank == 0 else None)
+        learn.device = 'cpu'
+        learn.open(file_name)
+        learn.run['checkpoint'] = checkpoint
+        learn.rank = rank
+
+        # Same generators as the saved run, then a different augmentation and dropout in every process.
+        if learn.random_state is not None:
+            learn.setRandomState(*learn.random_state)
+            learn.random_state = None
+        seed = int(torch.randint(2**31 - 1, ()).item()) + rank
+        torch.manual_seed(seed)
+        learn.augmentation.generator.manual_seed(seed)
+
+        train_data, test_data = learn.loadData(learn.run['path'], learn.run['cache'], rank, world_size, 4 // world_size)
+        learn.parallel = DistributedDataParallel(learn.cnn)
+        learn.runEpochs(train_data, test_data)
+
+        if rank == 0:
+            learn.save(file_name, True)
+    finally:
+        dist.destroy_process_group()
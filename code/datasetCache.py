@@ -0,0 +1,221 @@
+import json
+import os
+from typing import Optional, List, Tuple, Callable, Dict, Any
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset, DataLoader
+from torchvision import datasets
+
+
+class DecodeDataset(Dataset):
+    """
+    Dataset that decodes images to grayscale arrays of a fixed size, used to fill the cache.
+    """
+
+    def __init__(self, paths: List[str], size: int) -> None:
+        """
+        Initialize the DecodeDataset.
+
+        Args:
+            paths (List[str]): Paths of the images to decode.
+            size (int): Width and height of the decoded images.
+
+        Returns:
+            None
+        """
+
+        self.paths = paths
+        self.size = size
+
+    def __len__(self) -> int:
+        """
+        Get the number of images.
+
+        Returns:
+            int: Number of images.
+        """
+
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> torch.Tensor:
+        """
+        Decode one image.
+
+        Args:
+            index (int): Index of the image.
+
+        Returns:
+            torch.Tensor: Decoded image as a uint8 tensor of shape (size, size).
+        """
+
+        with Image.open(self.paths[index]) as image:
+            image = image.convert('L').resize((self.size, self.size), Image.BILINEAR)
+            return torch.from_numpy(np.asarray(image, dtype=np.uint8).copy())
+
+
+class CachedImageFolder(Dataset):
+    """
+    Serves the samples of an ImageFolder from a memory-mapped uint8 array that is decoded only once.
+
+    The cache is stored next to the dataset folder ('<folder>.cache<size>.npy' with a '.json' index) and each row is
+    keyed by the file path and its modification time, so only new or changed images are decoded again.
+    """
+
+    def __init__(self, image_folder: datasets.ImageFolder, size: int, transform: Optional[Callable] = None, num_workers: int = 4) -> None:
+        """
+        Initialize the CachedImageFolder, decoding the images missing from the cache.
+
+        Args:
+            image_folder (datasets.ImageFolder): Dataset with the samples to serve.
+            size (int): Width and height of the cached images.
+            transform (Optional[Callable]): Transform applied to the image tensor on every access.
+            num_workers (int): Number of processes used to decode the missing images.
+
+        Returns:
+            None
+        """
+
+        self.root = os.path.normpath(image_folder.root)
+        self.size = size
+        self.transform = transform
+
+        self.classes = image_folder.classes
+        self.class_to_idx = image_folder.class_to_idx
+        self.samples = image_folder.samples
+        self.targets = [target for _, target in self.samples]
+
+        self.cache_path = f"{self.root}.cache{size}.npy"
+        self.index_path = f"{self.root}.cache{size}.json"
+
+        self.rows = self.update(num_workers)
+        self.images: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        """
+        Get the number of samples.
+
+        Returns:
+            int: Number of samples.
+        """
+
+        return len(self.samples)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, int]:
+        """
+        Get a sample from the cache.
+
+        Args:
+            index (int): Index of the sample.
+
+        Returns:
+            Tuple[torch.Tensor, int]: Image tensor of shape (1, size, size) with values in [0, 1] and its target.
+        """
+
+        if self.images is None:
+            self.images = np.load(self.cache_path, mmap_mode='r')
+
+        image = torch.from_numpy(np.array(self.images[self.rows[index]])).unsqueeze(0).float().div_(255)
+
+        if self.transform is not None:
+            image = self.transform(image)
+
+        return image, self.targets[index]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Drop the memory map when the dataset is sent to a DataLoader worker, each worker maps the file again.
+
+        Returns:
+            Dict[str, Any]: State of the object.
+        """
+
+        state = self.__dict__.copy()
+        state['images'] = None
+        return state
+
+    def key(self, path: str) -> List[Any]:
+        """
+        Build the cache key of an image.
+
+        Args:
+            path (str): Path to the image.
+
+        Returns:
+            List[Any]: Path relative to the dataset folder and modification time in nanoseconds.
+        """
+
+        return [os.path.relpath(path, self.root), os.stat(path).st_mtime_ns]
+
+    def update(self, num_workers: int) -> List[int]:
+        """
+        Bring the cache up to date with the samples, decoding only the images that are not cached yet.
+
+        Args:
+            num_workers (int): Number of processes used to decode the missing images.
+
+        Returns:
+            List[int]: Row of the cache array for every sample.
+        """
+
+        cached_keys: List[List[Any]] = []
+        if os.path.isfile(self.index_path) and os.path.isfile(self.cache_path):
+            with open(self.index_path, 'r') as file:
+                index = json.load(file)
+            if index.get('size') == self.size:
+                cached_keys = index['keys']
+
+        # Every file is stat-ed: an image overwritten in place keeps the time of its directory, so the times of the
+        # dataset index would serve its old decode.
+        keys = [self.key(path) for path, _ in self.samples]
+        cached_rows = {tuple(key): row for row, key in enumerate(cached_keys)}
+        missing = [i for i, key in enumerate(keys) if tuple(key) not in cached_rows]
+
+        if not missing:
+            return [cached_rows[tuple(key)] for key in keys]
+
+        # Keep the still valid rows of other samples (e.g. classes cut from this brain) for later runs.
+        sample_names = {key[0] for key in keys}
+        kept_keys = [key for key in cached_keys if key[0] not in sample_names and self.isValid(key)]
+        kept_keys += [key for key in keys if tuple(key) in cached_rows]
+        new_keys = kept_keys + [keys[i] for i in missing]
+
+        temporary_path = f"{self.cache_path}.tmp"
+        images = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=np.uint8, shape=(len(new_keys), self.size, self.size))
+
+        if kept_keys:
+            old_images = np.load(self.cache_path, mmap_mode='r')
+            for row, key in enumerate(kept_keys):
+                images[row] = old_images[cached_rows[tuple(key)]]
+            del old_images
+
+        loader = DataLoader(DecodeDataset([self.samples[i][0] for i in missing], self.size), batch_size=64, num_workers=num_workers)
+        row = len(kept_keys)
+        for batch in loader:
+            images[row:row + len(batch)] = batch.numpy()
+            row += len(batch)
+
+        images.flush()
+        del images
+        os.replace(temporary_path, self.cache_path)
+
+        with open(self.index_path, 'w') as file:
+            json.dump({'size': self.size, 'keys': new_keys}, file)
+
+        new_rows = {tuple(key): row for row, key in enumerate(new_keys)}
+        return [new_rows[tuple(key)] for key in keys]
+
+    def isValid(self, key: List[Any]) -> bool:
+        """
+        Check if a cached image still exists and has not been modified.
+
+        Args:
+            key (List[Any]): Cache key of the image.
+
+        Returns:
+            bool: True if the cached row can be reused, False otherwise.
+        """
+
+        path = os.path.join(self.root, key[0])
+        return os.path.isfile(path) and os.stat(path).st_mtime_ns == key[1]
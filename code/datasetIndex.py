@@ -0,0 +1,275 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from torchvision import datasets
+from torchvision.datasets.folder import IMG_EXTENSIONS, has_file_allowed_extension
+
+
+class DatasetIndex:
+    """
+    Persisted manifest of a dataset folder: the classes and, for every directory, its files with their sizes and
+    modification times.
+
+    The manifest is stored next to the dataset folder ('<folder>.index.json', like the image cache). When it is
+    refreshed, every directory is stat-ed and only the directories whose modification time changed are listed again,
+    so a dataset with millions of files is read from the manifest after the first scan. Adding, removing or renaming a
+    file changes the time of its directory; an image overwritten in place does not, call refresh(full=True) (or touch
+    its directory) to see it.
+    """
+
+    VERSION = 1
+
+    # Directories modified less than this number of seconds before a scan are listed again by the next refresh, their
+    # time may not change if a file is added in the same tick of the clock.
+    SETTLE_TIME = 2.0
+
+    def __init__(self, root: str, persist: bool = True) -> None:
+        """
+        Initialize the DatasetIndex, loading the manifest and bringing it up to date with the folder.
+
+        Args:
+            root (str): Path to the dataset folder, one subfolder per label.
+            persist (bool): If True, the refreshed manifest is written next to the folder when it changed. A read-only
+                location is not an error, the index is then kept in memory only.
+
+        Returns:
+            None
+        """
+
+        self.root = os.path.normpath(root)
+        self.index_path = f"{self.root}.index.json"
+        self.persist = persist
+
+        # Relative path of each directory ('' for the root) -> {'mtime', 'directories', 'files': [[name, size, mtime]]}
+        self.directories: Dict[str, Dict[str, Any]] = {}
+        self.changed = False
+
+        self.load()
+        self.refresh()
+
+    def load(self) -> None:
+        """
+        Load the manifest written by a previous scan, if there is a valid one.
+
+        Returns:
+            None
+        """
+
+        try:
+            with open(self.index_path, 'r') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if manifest.get('version') == self.VERSION:
+            self.directories = manifest['directories']
+
+    def save(self) -> None:
+        """
+        Write the manifest, under a temporary name first so a reader never sees half of it.
+
+        Returns:
+            None
+        """
+
+        temporary_path = f"{self.index_path}.{os.getpid()}.tmp"
+
+        try:
+            with open(temporary_path, 'w') as file:
+                json.dump({'version': self.VERSION, 'directories': self.directories}, file)
+            os.replace(temporary_path, self.index_path)
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def refresh(self, full: bool = False) -> None:
+        """
+        Bring the manifest up to date with the folder, listing only the directories that changed since the last scan.
+
+        Args:
+            full (bool): If True, every directory is listed again and every file stat-ed.
+
+        Returns:
+            None
+        """
+
+        old_directories = {} if full else self.directories
+        self.directories = {}
+        self.changed = full
+        settled = time.time() - self.SETTLE_TIME
+
+        pending = ['']
+        while pending:
+            relative = pending.pop()
+            path = os.path.join(self.root, relative)
+
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self.changed = True
+                continue
+
+            entry = old_directories.get(relative)
+            if entry is None or entry['mtime'] != mtime:
+                entry = self.scan(path, mtime if mtime < settled * 1e9 else None)
+                self.changed = True
+
+            self.directories[relative] = entry
+            pending.extend(os.path.join(relative, name) for name in reversed(entry['directories']))
+
+        if len(self.directories) != len(old_directories):
+            self.changed = True
+
+        if self.changed and self.persist:
+            self.save()
+
+    def scan(self, path: str, mtime: Optional[int]) -> Dict[str, Any]:
+        """
+        List a directory.
+
+        Args:
+            path (str): Path to the directory.
+            mtime (Optional[int]): Modification time of the directory in nanoseconds, None if it changed too recently
+                to be trusted.
+
+        Returns:
+            Dict[str, Any]: Entry of the manifest: its time, sorted subdirectories and sorted files.
+        """
+
+        directories = []
+        files = []
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        directories.append(entry.name)
+                    else:
+                        stat = entry.stat()
+                        files.append([entry.name, stat.st_size, stat.st_mtime_ns])
+                except OSError:
+                    pass
+
+        return {'mtime': mtime, 'directories': sorted(directories), 'files': sorted(files)}
+
+    @property
+    def classes(self) -> List[str]:
+        """
+        Get the labels of the dataset, the sorted subfolders of the root.
+
+        Returns:
+            List[str]: Names of the classes.
+        """
+
+        return list(self.directories['']['directories']) if '' in self.directories else []
+
+    def isValid(self) -> bool:
+        """
+        Check if the folder is a dataset: it has subfolders and no files besides them.
+
+        Returns:
+            bool: True if the dataset is valid, False otherwise.
+        """
+
+        return '' in self.directories and bool(self.directories['']['directories']) and not self.directories['']['files']
+
+    def files(self, label: str, extensions: Tuple[str, ...] = IMG_EXTENSIONS) -> List[Tuple[str, int]]:
+        """
+        List the files of a class, with the subfolders of its folder, in the order of ImageFolder.
+
+        Args:
+            label (str): Name of the class.
+            extensions (Tuple[str, ...]): Allowed file extensions.
+
+        Returns:
+            List[Tuple[str, int]]: Path relative to the root and modification time in nanoseconds of every file.
+        """
+
+        found = []
+        pending = [label]
+
+        while pending:
+            relative = pending.pop()
+            entry = self.directories.get(relative)
+            if entry is None:
+                continue
+
+            found.extend((os.path.join(relative, name), mtime) for name, _, mtime in entry['files']
+                         if has_file_allowed_extension(name, extensions))
+            pending.extend(os.path.join(relative, name) for name in reversed(entry['directories']))
+
+        # Same order as ImageFolder: by directory, then by name.
+        return sorted(found, key=lambda item: (os.path.dirname(item[0]), os.path.basename(item[0])))
+
+
+class IndexedImageFolder(datasets.ImageFolder):
+    """
+    ImageFolder whose classes and samples come from a DatasetIndex instead of walking the folder.
+
+    Only the first number_classes classes are loaded, so truncating the labels of a brain costs nothing.
+    """
+
+    def __init__(self, root: str, transform: Optional[Callable] = None, number_classes: Optional[int] = None,
+                 index: Optional[DatasetIndex] = None) -> None:
+        """
+        Initialize the IndexedImageFolder.
+
+        Args:
+            root (str): Path to the dataset folder, one subfolder per label.
+            transform (Optional[Callable]): Transform applied to the images.
+            number_classes (Optional[int]): If set, only the first classes are loaded.
+            index (Optional[DatasetIndex]): Index of the folder, loaded and refreshed if not given.
+
+        Returns:
+            None
+        """
+
+        self.index = index if index is not None else DatasetIndex(root)
+        self.number_classes = number_classes
+        super().__init__(root, transform=transform)
+
+    def find_classes(self, directory: str) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Get the classes from the index.
+
+        Args:
+            directory (str): Path to the dataset folder.
+
+        Returns:
+            Tuple[List[str], Dict[str, int]]: Names of the classes and their targets.
+        """
+
+        classes = self.index.classes[:self.number_classes]
+        if not classes:
+            raise FileNotFoundError(f"Couldn't find any class folder in {directory}.")
+
+        return classes, {label: target for target, label in enumerate(classes)}
+
+    def make_dataset(self, directory: str, class_to_idx: Dict[str, int], extensions: Optional[Tuple[str, ...]] = None,
+                     is_valid_file: Optional[Callable[[str], bool]] = None, allow_empty: bool = False) -> List[Tuple[str, int]]:
+        """
+        Get the samples from the index.
+
+        Args:
+            directory (str): Path to the dataset folder.
+            class_to_idx (Dict[str, int]): Target of every class.
+            extensions (Optional[Tuple[str, ...]]): Allowed file extensions.
+            is_valid_file (Optional[Callable[[str], bool]]): Unused, the files are filtered by extension.
+            allow_empty (bool): If False, a class without images is an error, as in ImageFolder.
+
+        Returns:
+            List[Tuple[str, int]]: Path and target of every sample.
+        """
+
+        samples = []
+
+        for label, target in sorted(class_to_idx.items(), key=lambda item: item[1]):
+            files = self.index.files(label, extensions or IMG_EXTENSIONS)
+            if not files and not allow_empty:
+                raise FileNotFoundError(f"Found no valid file for the class {label}. Supported extensions are: {', '.join(extensions or IMG_EXTENSIONS)}")
+
+            samples.extend((os.path.join(directory, relative), target) for relative, _ in files)
+
+        return samples
@@ -1,12 +1,87 @@
+import json
+import os
+import random
 import threading
-from typing import Optional, List, Any
+import time
+from typing import Any, Dict, Optional, List, Tuple
 
 import torch
+import torch.distributed as dist
 from PIL.Image import Image
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import ConcatDataset, DataLoader, Dataset, DistributedSampler, Subset, random_split
 from torchvision import datasets, transforms
 
-from cnn import CNN
+from augmentation import BatchRandomRotation
+from brainFile import saveBrainFile, openAnyBrainFile, isBrainFile
+from cnn import createModel
+from datasetCache import CachedImageFolder
+from datasetIndex import DatasetIndex, IndexedImageFolder
+from learnObserver import LearnObserver
+from profiling import createProfiler
+from quantize import quantizeModel, quantizedPath
+from replayBuffer import ReplayBuffer
+from schedule import SCHEDULES, createScheduler, findLearningRate, suggestLearningRate
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def bestPath(file_name: str) -> str:
+    """
+    Get the path of the brain with the lowest test loss, saved next to a checkpoint.
+
+    Args:
+        file_name (str): Path of the checkpoint, e.g. 'run.pth'.
+
+    Returns:
+        str: Path of the best brain, e.g. 'run.best.pth'.
+    """
+
+    root, extension = os.path.splitext(file_name)
+    return f"{root}.best{extension}"
+
+
+def timingPath(file_name: str) -> str:
+    """
+    Get the path of the JSONL log of the epoch timings, written next to a checkpoint.
+
+    Args:
+        file_name (str): Path of the checkpoint, e.g. 'run.pth'.
+
+    Returns:
+        str: Path of the log, e.g. 'run.timing.jsonl'.
+    """
+
+    return f"{os.path.splitext(file_name)[0]}.timing.jsonl"
+
+
+def peakMemory() -> Optional[float]:
+    """
+    Get the peak resident memory of this process, the DataLoader workers are not included.
+
+    Returns:
+        Optional[float]: Peak RSS in MB, None on systems without the resource module (Windows).
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 2 ** 10
+
+
+# Phases of a training step timed by runEpochs, 'data' is the time spent waiting for the DataLoader.
+TIMING_PHASES = ['data', 'copy', 'augmentation', 'forward', 'backward', 'optimizer']
+
+# Statistics of an epoch kept in Learn.timing_history, the time of each phase is in seconds per epoch.
+TIMING_KEYS = [f'{phase}_time' for phase in TIMING_PHASES] + ['samples_per_second', 'peak_rss_mb']
+
+# Precision modes of the forward pass, 'fp32' or autocast to the given 16-bit type.
+PRECISIONS = {'fp32': torch.float32, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+# Number of training images kept in the replay buffer of the fine-tuning, see fineTune.
+REPLAY_CAPACITY = 256
 
 
 class Learn:
@@ -14,12 +89,18 @@ class Learn:
     The Learn class manages the training and prediction processes for the neural network model.
     """
 
-    def __init__(self, brain_manager: Any):
+    def __init__(self, size_output: int = 10, observer: Optional[LearnObserver] = None, input_size: int = 256,
+                 architecture: str = 'CNN', hyperparameters: Optional[Dict[str, Any]] = None):
         """
         Initialize the Learn object.
 
         Args:
-            brain_manager (BrainManager): Reference to the BrainManager instance.
+            size_output (int): Number of labels in the output layer.
+            observer (Optional[LearnObserver]): Receiver of the training events, e.g. the BrainManager instance.
+            input_size (int): Width and height the images are resized to, saved with the brain.
+            architecture (str): Name of the network, see cnn.ARCHITECTURES, saved with the brain.
+            hyperparameters (Optional[Dict[str, Any]]): Other arguments of the network, e.g. {'width': 8}, its defaults
+                if None.
 
         Returns:
             None
@@ -27,15 +108,152 @@ class Learn:
 
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-        self.brain_manager = brain_manager
-        self.brain_manager.title(f"Brain   ( program use: {self.device} )")
+        self.observer = observer if observer is not None else LearnObserver()
+
+        self.size_output = size_output
+        self.labels: List[str] = []
+        self.input_size: int = input_size
 
         self.train_data: Optional[datasets.ImageFolder] = None
-        self.cnn = CNN(brain_manager.number_labels_on_board).to(self.device)
-        self.optimer: torch.optim = torch.optim.Adam(self.cnn.parameters(), lr=0.0001)
+        self.cnn = createModel(architecture, size_output, input_size, **(hyperparameters or {})).to(self.device)
+
+        # Learning rate schedule of the training runs, see setSchedule.
+        self.schedule: Dict[str, Any] = {'name': 'constant', 'lr': 0.0001, 'warmup': 0.3}
+        self.optimer: torch.optim = torch.optim.Adam(self.cnn.parameters(), lr=self.schedule['lr'])
         self.criterion = torch.nn.CrossEntropyLoss()
+        self.augmentation = BatchRandomRotation(30, chunk_size=8 if self.device == 'cpu' else None)
+
+        # Precision of the forward pass, see setPrecision.
+        self.precision: str = 'fp32'
+        self.scaler = torch.amp.GradScaler('cuda', enabled=False)
+
+        # Int8 copy of the model for CPU inference, used by predictBatch when present.
+        self.quantized: Optional[torch.jit.ScriptModule] = None
+
+        # Data-parallel wrapper of the CNN and rank of the process, in the worker processes of fitDistributed.
+        self.parallel: Optional[torch.nn.parallel.DistributedDataParallel] = None
+        self.rank: int = 0
+
+        # Profiling of the training runs and of the predictions, see setProfiling.
+        self.profiling: Optional[Dict[str, Any]] = None
+        self.predict_profiler: Optional[torch.profiler.profile] = None
+        self.profiled_predictions: int = 0
+
+        # Teacher brain of a distillation run and the temperature and weight of its soft targets, see fitDistilled.
+        self.teacher: Optional["Learn"] = None
+        self.distillation: Dict[str, float] = {'temperature': 4.0, 'alpha': 0.9}
+
+        # Reservoir sample of the training images, replayed by fineTune and saved with the checkpoints.
+        self.replay = ReplayBuffer(REPLAY_CAPACITY, input_size)
+
+        # Path of the brain file whose memory map backs the weights, see open.
+        self.mapped_file: Optional[str] = None
+
+        # Held by the training thread for each step and by predict, which switches the model to eval mode.
+        self.lock = threading.Lock()
+
+        # Held by fineTune for all its steps, so two fine-tunes started together run one after the other.
+        self.fine_tune_lock = threading.Lock()
 
         self.history: List[List[float, float]] = []
+        self.accuracy_history: List[float] = []
+        self.timing_history: List[Dict[str, Optional[float]]] = []
+
+        # Seed of the train/test split, saved with the brain so continued learning keeps the same test data.
+        self.split_seed: int = int(torch.randint(2 ** 31 - 1, ()).item())
+        self.data_source: Dict[str, Any] = {}
+
+        # State of the training run, saved in the checkpoints, see fit and resume.
+        self.run: Dict[str, Any] = {}
+        self.random_state: Optional[Tuple[Dict[str, Any], Dict[str, torch.Tensor]]] = None
+
+    def setPrecision(self, precision: str) -> None:
+        """
+        Select the precision of training and prediction, it is saved with the brain.
+
+        The weights stay in fp32, only the forward pass is autocast. 'fp16' is used on CUDA with loss scaling, on the
+        CPU it falls back to 'bf16', which has the range of fp32 and needs no loss scaling.
+
+        Args:
+            precision (str): 'fp32', 'bf16' or 'fp16'.
+
+        Returns:
+            None
+        """
+
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown precision {precision}, expected one of {', '.join(PRECISIONS)}")
+
+        self.precision = precision
+        self.scaler = torch.amp.GradScaler('cuda', enabled=precision == 'fp16' and self.device == 'cuda')
+
+    def setSchedule(self, name: str, lr: Optional[float] = None, warmup: Optional[float] = None) -> None:
+        """
+        Select the learning rate schedule of the next training runs, it is saved with the brain.
+
+        Args:
+            name (str): 'constant', 'one-cycle' or 'cosine'.
+            lr (Optional[float]): Learning rate, the peak one for 'one-cycle' and 'cosine'. If None, it is unchanged.
+            warmup (Optional[float]): Fraction of the run spent warming up. If None, it is unchanged.
+
+        Returns:
+            None
+        """
+
+        if name not in SCHEDULES:
+            raise ValueError(f"unknown schedule {name}, expected one of {', '.join(SCHEDULES)}")
+
+        self.schedule = {'name': name,
+                         'lr': self.schedule['lr'] if lr is None else lr,
+                         'warmup': self.schedule['warmup'] if warmup is None else warmup}
+
+        for group in self.optimer.param_groups:
+            group['lr'] = self.schedule['lr']
+
+    def setProfiling(self, file_name: Optional[str], skip: int = 1, warmup: int = 1, active: int = 3,
+                     predictions: int = 20) -> None:
+        """
+        Turn the profiling with torch.profiler on or off, the profiles are saved next to the brain (see profiling).
+
+        While it is on, every training run profiles its steps skip + 1 to skip + warmup + active, and the next
+        predictions are profiled with the transform of the image.
+
+        Args:
+            file_name (Optional[str]): Path of the brain the profiles are saved next to, None turns the profiling off.
+            skip (int): Number of training steps before the profiler starts.
+            warmup (int): Number of profiled training steps that are not recorded.
+            active (int): Number of recorded training steps.
+            predictions (int): Number of recorded predictions, after one that is not recorded.
+
+        Returns:
+            None
+        """
+
+        self.profiling = None
+        if file_name is not None:
+            self.profiling = {'file_name': file_name, 'skip': skip, 'warmup': warmup, 'active': active, 'predictions': predictions}
+
+        self.predict_profiler = None
+        self.profiled_predictions = 0
+
+    def autocast(self, device: Optional[str] = None, enabled: bool = True) -> torch.autocast:
+        """
+        Get the autocast context of the selected precision.
+
+        Args:
+            device (Optional[str]): Device the forward pass runs on, the device of the CNN by default.
+            enabled (bool): If False, the context runs in fp32 whatever the precision, e.g. for the quantized model.
+
+        Returns:
+            torch.autocast: Context manager, disabled for 'fp32'.
+        """
+
+        device = self.device if device is None else device
+        dtype = PRECISIONS[self.precision]
+        if dtype == torch.float16 and device != 'cuda':
+            dtype = torch.bfloat16
+
+        return torch.autocast(device_type=device, dtype=dtype, enabled=enabled and self.precision != 'fp32')
 
     def predict(self, image: Image) -> List[float]:
         """
@@ -48,15 +266,116 @@ class Learn:
             List[float]: List of prediction probabilities.
         """
 
-        transform = transforms.Compose([transforms.Resize((256, 256)), transforms.ToTensor()])
-        image = transform(image)
-        image = torch.unsqueeze(image, 0)
+        if self.profiling is not None and self.profiled_predictions <= self.profiling['predictions']:
+            return self.profilePredict(image)
+
+        return self.predictBatch(torch.unsqueeze(self.transformImage(image), 0))[0].tolist()
+
+    def profilePredict(self, image: Image) -> List[float]:
+        """
+        Make a prediction recorded by the prediction profiler, see setProfiling.
+
+        Args:
+            image (PIL.Image.Image): Image to predict.
+
+        Returns:
+            List[float]: List of prediction probabilities.
+        """
+
+        if self.predict_profiler is None:
+            self.predict_profiler = createProfiler(self.profiling['file_name'], 'predict', 0, 1, self.profiling['predictions'])
+            self.predict_profiler.start()
+
+        with torch.profiler.record_function("transformImage"):
+            images = torch.unsqueeze(self.transformImage(image), 0)
+        with torch.profiler.record_function("predictBatch"):
+            prediction = self.predictBatch(images)[0].tolist()
+
+        self.predict_profiler.step()
+        self.profiled_predictions += 1
+
+        if self.profiled_predictions > self.profiling['predictions']:
+            self.predict_profiler.stop()
+            self.predict_profiler = None
+
+        return prediction
+
+    def transformImage(self, image: Image) -> torch.Tensor:
+        """
+        Convert an image to the tensor expected by the model.
+
+        Args:
+            image (PIL.Image.Image): Grayscale image.
+
+        Returns:
+            torch.Tensor: Tensor of shape (1, input_size, input_size) with values in [0, 1].
+        """
+
+        transform = transforms.Compose([transforms.Resize((self.input_size, self.input_size)), transforms.ToTensor()])
+        return transform(image)
+
+    def resizeInputs(self, inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Resize a batch of images to the input size of the model, e.g. the images of a distillation run, loaded at the
+        input size of the teacher.
+
+        Args:
+            inputs (torch.Tensor): Batch of shape (N, 1, H, W).
+
+        Returns:
+            torch.Tensor: Batch of shape (N, 1, input_size, input_size), inputs itself if it already has the size.
+        """
+
+        if inputs.shape[-2:] == (self.input_size, self.input_size):
+            return inputs
+
+        return torch.nn.functional.interpolate(inputs, size=(self.input_size, self.input_size), mode='bilinear', antialias=True)
+
+    def softTargets(self, inputs: torch.Tensor, temperature: float) -> torch.Tensor:
+        """
+        Compute the soft targets of a batch, when this brain is the teacher of a distillation run.
+
+        Args:
+            inputs (torch.Tensor): Batch of images, resized to the input size of this brain if needed.
+            temperature (float): Temperature dividing the log-probabilities, a higher one gives softer targets.
+
+        Returns:
+            torch.Tensor: Log-probabilities of shape (N, size_output), without gradient.
+        """
+
+        inputs = self.resizeInputs(inputs.to(self.device))
+
+        with self.lock:
+            self.cnn.eval().to(self.device)
+            with torch.no_grad(), self.autocast():
+                outputs = self.cnn(inputs).float()
 
-        self.cnn.eval().to(self.device)
-        with torch.no_grad():
-            return torch.exp(self.cnn(image))[0].tolist()
+        return torch.log_softmax(outputs / temperature, 1)
 
-    def fit(self, train_data: DataLoader, test_data: DataLoader, epochs: int) -> None:
+    def predictBatch(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Make predictions for a batch of image tensors.
+
+        Args:
+            images (torch.Tensor): Batch of shape (N, 1, input_size, input_size), e.g. stacked results of transformImage.
+
+        Returns:
+            torch.Tensor: Prediction probabilities of shape (N, size_output) on the CPU.
+        """
+
+        if self.quantized is not None:
+            with torch.inference_mode():
+                return torch.exp(self.quantized(images.cpu()))
+
+        images = images.to(self.device)
+
+        with self.lock:
+            self.cnn.eval().to(self.device)
+            with torch.inference_mode(), self.autocast():
+                return torch.exp(self.cnn(images).float()).cpu()
+
+    def fit(self, train_data: DataLoader, test_data: DataLoader, epochs: int, checkpoint: Optional[str] = None,
+            patience: Optional[int] = None, timing_log: Optional[str] = None, until: Optional[int] = None) -> None:
         """
         Train the model using the provided data.
 
@@ -64,115 +383,870 @@ class Learn:
             train_data (DataLoader): DataLoader object containing training data.
             test_data (DataLoader): DataLoader object containing testing/validation data.
             epochs (int): Number of training epochs.
+            checkpoint (Optional[str]): If set, the state of the run is saved to this file after every epoch, so it can
+                be resumed, and the brain with the lowest test loss is saved next to it (see bestPath).
+            patience (Optional[int]): If set, learning stops when the test loss has not improved for this number of
+                epochs.
+            timing_log (Optional[str]): If set, the statistics and the timings of every epoch are appended to this
+                JSONL file.
+            until (Optional[int]): If set, the run pauses after this number of its epochs, the learning rate schedule
+                still spans all of them. A checkpoint of the paused run continues with resume, after raising
+                run['until'].
+
+        Returns:
+            None
+        """
+
+        self.run = {'start': len(self.history),
+                    'epochs': epochs,
+                    'until': until,
+                    'patience': patience,
+                    'checkpoint': checkpoint,
+                    'timing_log': timing_log,
+                    'best_loss': None,
+                    'best_epoch': len(self.history),
+                    **self.data_source}
+
+        self.runEpochs(train_data, test_data)
+
+    def resume(self, train_data: DataLoader, test_data: DataLoader) -> None:
+        """
+        Continue the training run of the opened checkpoint where it stopped.
+
+        The data must be loaded with loadData from the path saved in the run, so the train/test split is the same.
+        The random state saved with the checkpoint is restored, so the run continues as if it had not been stopped.
+        A run of fitDistributed continues in the same number of processes, the data loaders are not used then.
+
+        Args:
+            train_data (DataLoader): DataLoader object containing training data.
+            test_data (DataLoader): DataLoader object containing testing/validation data.
 
         Returns:
             None
         """
 
-        self.cnn.train().to(self.device)
+        if not self.run:
+            raise ValueError("the opened brain is not a checkpoint of a training run")
+
+        if self.random_state is not None:
+            self.setRandomState(*self.random_state)
+            self.random_state = None
+
+        if self.run.get('processes', 1) > 1:
+            from dataParallel import runDistributed
+            runDistributed(self, self.run['processes'])
+        else:
+            self.runEpochs(train_data, test_data)
+
+    def runEpochs(self, train_data: DataLoader, test_data: DataLoader) -> None:
+        """
+        Run the epochs of the training run described by self.run.
+
+        The observer is told when the run ends, also when it fails: learnFailed gets the error, which is raised again,
+        and learnFinished is always called.
+
+        Args:
+            train_data (DataLoader): DataLoader object containing training data.
+            test_data (DataLoader): DataLoader object containing testing/validation data.
+
+        Returns:
+            None
+        """
+
+        profiler = None
+        try:
+            self.cnn.train().to(self.device)
+            self.quantized = None
+
+            checkpoint = self.run['checkpoint']
+            patience = self.run['patience']
+
+            scheduler = createScheduler(self.schedule, self.optimer, self.run['epochs'] * len(train_data),
+                                        (len(self.history) - self.run['start']) * len(train_data))
+
+            if self.profiling is not None and self.rank == 0:
+                profiler = createProfiler(self.profiling['file_name'], 'train', self.profiling['skip'],
+                                          self.profiling['warmup'], self.profiling['active'])
+                profiler.start()
+            profiled_steps = 0
+
+            end = self.run['start'] + self.run['epochs']
+            if self.run.get('until') is not None:
+                end = min(end, self.run['start'] + self.run['until'])
+
+            while len(self.history) < end:
+                train_loss = 0.0
+                number_samples = 0
+                start = time.perf_counter()
+
+                if isinstance(train_data.sampler, DistributedSampler):
+                    train_data.sampler.set_epoch(len(self.history))
+
+                timings = dict.fromkeys(TIMING_PHASES, 0.0)
+                waiting = time.perf_counter()
+
+                for inputs, labels in train_data:
+                    timings['data'] += time.perf_counter() - waiting
+                    self.replay.add(self.resizeInputs(inputs), labels)
+                    train_loss += self.trainStep(inputs, labels, timings)
+                    number_samples += len(labels)
+
+                    if scheduler is not None:
+                        scheduler.step()
+
+                    if profiler is not None:
+                        profiler.step()
+                        profiled_steps += 1
+                        if profiled_steps == self.profiling['skip'] + self.profiling['warmup'] + self.profiling['active']:
+                            profiler.stop()
+                            profiler = None
+
+                    waiting = time.perf_counter()
+
+                train_time = time.perf_counter() - start
+
+                totals = torch.tensor([train_loss, len(train_data), number_samples], dtype=torch.float64)
+                if self.parallel is not None:
+                    dist.all_reduce(totals)
+                train_loss, number_samples = (totals[0] / totals[1]).item(), int(totals[2])
+
+                test_loss, test_accuracy = self.evaluate(test_data)
+                self.cnn.train()
+
+                timing = {f'{phase}_time': timings[phase] for phase in TIMING_PHASES}
+                timing['samples_per_second'] = number_samples / train_time
+                timing['peak_rss_mb'] = peakMemory()
+
+                self.history.append([train_loss, test_loss])
+                self.accuracy_history.append(test_accuracy)
+                self.timing_history.append(timing)
+
+                improved = self.run['best_loss'] is None or test_loss < self.run['best_loss']
+                if improved:
+                    self.run['best_loss'] = test_loss
+                    self.run['best_epoch'] = len(self.history)
+
+                if checkpoint is not None and self.rank == 0:
+                    if improved:
+                        self.save(bestPath(checkpoint))
+                    self.save(checkpoint, True)
+
+                stats = {'train_loss': train_loss,
+                         'test_loss': test_loss,
+                         'test_accuracy': test_accuracy,
+                         'learning_rate': self.optimer.param_groups[0]['lr'],
+                         'time': time.perf_counter() - start,
+                         **timing}
+
+                if self.run.get('timing_log') is not None and self.rank == 0:
+                    with open(self.run['timing_log'], 'a') as file:
+                        file.write(json.dumps({'epoch': len(self.history), **stats}) + '\n')
+
+                self.observer.learnEpoch(len(self.history) - self.run['start'], stats)
+
+                if patience is not None and len(self.history) - self.run['best_epoch'] >= patience:
+                    break
+        except Exception as error:
+            self.observer.learnFailed(f"learning failed: {type(error).__name__}: {error}")
+            raise
+        finally:
+            if profiler is not None:
+                profiler.stop()
+
+            self.observer.learnFinished()
+
+    def trainStep(self, inputs: torch.Tensor, labels: torch.Tensor, timings: Optional[Dict[str, float]] = None) -> float:
+        """
+        Run one optimizer step on a batch, with the augmentation.
+
+        Args:
+            inputs (torch.Tensor): Batch of images.
+            labels (torch.Tensor): Targets of the images.
+            timings (Optional[Dict[str, float]]): If set, the time of every phase of the step (see TIMING_PHASES) is
+                added to it.
+
+        Returns:
+            float: Loss of the batch.
+        """
+
+        start = time.perf_counter()
+        inputs, labels = inputs.to(self.device), labels.to(self.device)
+        start = self.lap(timings, 'copy', start)
+        inputs = self.augmentation(inputs)
+        start = self.lap(timings, 'augmentation', start)
+
+        # The teacher sees the augmented images at its own input size.
+        soft_targets = None
+        if self.teacher is not None:
+            soft_targets = self.teacher.softTargets(inputs, self.distillation['temperature']).to(self.device)
+            start = self.lap(timings, 'forward', start)
+        inputs = self.resizeInputs(inputs)
+
+        model = self.parallel if self.parallel is not None else self.cnn
 
-        for epoch in range(epochs):
-            train_loss = 0.0
-            test_loss = 0.0
+        with self.lock:
+            self.cnn.train()
+            self.optimer.zero_grad()
+            start = self.lap(timings, 'optimizer', start)
 
-            for inputs, labels in train_data:
-                self.optimer.zero_grad()
+            with self.autocast():
+                outputs = model(inputs)
+                loss = self.criterion(outputs.float(), labels)
+                if soft_targets is not None:
+                    loss = self.distillationLoss(outputs.float(), loss, soft_targets)
+            start = self.lap(timings, 'forward', start)
 
-                inputs, labels = inputs.to(self.device), labels.to(self.device)
+            self.scaler.scale(loss).backward()
+            start = self.lap(timings, 'backward', start)
 
-                outputs = self.cnn(inputs)
-                loss = self.criterion(outputs, labels)
-                loss.backward()
-                self.optimer.step()
-                train_loss += loss.item()
+            self.scaler.step(self.optimer)
+            self.scaler.update()
+            self.lap(timings, 'optimizer', start)
 
-            train_loss = train_loss / len(train_data)
+        return loss.item()
 
-            for inputs, labels in train_data:
-                inputs, labels = inputs.to(self.device), labels.to(self.device)
+    def distillationLoss(self, outputs: torch.Tensor, hard_loss: torch.Tensor, soft_targets: torch.Tensor) -> torch.Tensor:
+        """
+        Mix the loss of the labels with the divergence from the soft targets of the teacher.
+
+        The divergence is multiplied by the squared temperature, so its gradients keep their scale whatever the
+        temperature (Hinton et al., "Distilling the Knowledge in a Neural Network").
+
+        Args:
+            outputs (torch.Tensor): Log-probabilities of the model.
+            hard_loss (torch.Tensor): Loss of the labels.
+            soft_targets (torch.Tensor): Log-probabilities of the teacher at the temperature, see softTargets.
 
-                outputs = self.cnn(inputs)
-                loss = self.criterion(outputs, labels)
-                test_loss += loss.item()
+        Returns:
+            torch.Tensor: alpha * soft loss + (1 - alpha) * hard loss.
+        """
 
-            test_loss = test_loss / len(test_data)
+        temperature, alpha = self.distillation['temperature'], self.distillation['alpha']
+        soft_loss = torch.nn.functional.kl_div(torch.log_softmax(outputs / temperature, 1), soft_targets,
+                                               reduction='batchmean', log_target=True) * temperature ** 2
 
-            self.history.append([train_loss, test_loss])
-            self.brain_manager.updatePlot(epoch + 1)
+        return alpha * soft_loss + (1 - alpha) * hard_loss
 
-    def loadData(self, path: str) -> None:
+    def lap(self, timings: Optional[Dict[str, float]], phase: str, start: float) -> float:
+        """
+        Add the time since start to a phase of the step timings. On CUDA, the queued kernels are waited for first, so
+        the time is the one of the phase and not of the launches.
+
+        Args:
+            timings (Optional[Dict[str, float]]): Timings of the epoch, if None nothing is measured.
+            phase (str): Timed phase.
+            start (float): Start of the phase, from time.perf_counter.
+
+        Returns:
+            float: End of the phase, the start of the next one.
+        """
+
+        if timings is None:
+            return start
+
+        if self.device == 'cuda':
+            torch.cuda.synchronize()
+
+        now = time.perf_counter()
+        timings[phase] += now - start
+        return now
+
+    def fineTune(self, image: Image, target: int, number_steps: int = 8, batch_size: int = 16, copies: int = 4) -> float:
+        """
+        Learn a drawing with a few optimizer steps, without forgetting the training data.
+
+        Every step trains on copies of the drawing, augmented differently, mixed with images drawn from the replay
+        buffer, at the learning rate of the schedule (not the annealed one of the end of a run). The drawing is then
+        added to the buffer. Must not run during a training run, fine-tunes of several threads run one at a time.
+
+        Args:
+            image (PIL.Image.Image): Grayscale drawing.
+            target (int): Index of its label.
+            number_steps (int): Number of optimizer steps.
+            batch_size (int): Number of images of a step.
+            copies (int): Number of copies of the drawing in a step.
+
+        Returns:
+            float: Loss of the last step.
+        """
+
+        if not 0 <= target < self.size_output:
+            raise ValueError(f"target {target} is not a label of the brain, expected 0 to {self.size_output - 1}")
+
+        drawing = self.transformImage(image).unsqueeze(0)
+        drawings = drawing.expand(copies, -1, -1, -1)
+        targets = torch.full((copies,), target, dtype=torch.int64)
+
+        with self.fine_tune_lock:
+            learning_rates = [group['lr'] for group in self.optimer.param_groups]
+            for group in self.optimer.param_groups:
+                group['lr'] = self.schedule['lr']
+
+            self.quantized = None
+            loss = 0.0
+
+            try:
+                for _ in range(number_steps):
+                    replay_images, replay_targets = self.replay.sample(batch_size - copies)
+                    loss = self.trainStep(torch.cat([drawings, replay_images]), torch.cat([targets, replay_targets]))
+            finally:
+                for group, learning_rate in zip(self.optimer.param_groups, learning_rates):
+                    group['lr'] = learning_rate
+
+            self.replay.add(drawing, targets[:1])
+
+        self.observer.learnFineTuned(target, loss)
+
+        return loss
+
+    def startFineTune(self, image: Image, target: int) -> None:
+        """
+        Start fineTune in the background, the observer is told when it is done.
+
+        Args:
+            image (PIL.Image.Image): Grayscale drawing.
+            target (int): Index of its label.
+
+        Returns:
+            None
+        """
+
+        fine_tune_thread = threading.Thread(target=self.fineTune, args=(image, target), daemon=True)
+        fine_tune_thread.start()
+
+    def findLearningRate(self, path: str, cache: bool = False, number_steps: int = 100, start_lr: float = 1e-7,
+                         end_lr: float = 1.0) -> Tuple[List[float], List[float], Optional[float]]:
+        """
+        Run the learning rate range test on the training data, the model is left unchanged.
+
+        Args:
+            path (str): Path to the training data.
+            cache (bool): If True, the decoded images are served from the cache.
+            number_steps (int): Number of mini-batches of the sweep.
+            start_lr (float): First learning rate.
+            end_lr (float): Last learning rate.
+
+        Returns:
+            Tuple[List[float], List[float], Optional[float]]: Learning rates, smoothed losses and suggested learning rate.
+        """
+
+        train_data, _ = self.loadData(path, cache)
+        self.cnn.to(self.device)
+        self.quantized = None
+
+        learning_rates, losses = findLearningRate(self.cnn, self.optimer, lambda batch: self.trainStep(*batch), train_data,
+                                                  start_lr, end_lr, number_steps)
+
+        for group in self.optimer.param_groups:
+            group['lr'] = self.schedule['lr']
+
+        return learning_rates, losses, suggestLearningRate(learning_rates, losses)
+
+    def startFindLearningRate(self, path: str, cache: bool = False) -> None:
+        """
+        Start the learning rate range test, the result is sent to observer.learnRateFound, empty if the test failed.
+
+        Args:
+            path (str): Path to the training data.
+            cache (bool): If True, the decoded images are served from the cache.
+
+        Returns:
+            None
+        """
+
+        def find() -> None:
+            result = [], [], None
+            try:
+                result = self.findLearningRate(path, cache)
+            finally:
+                self.observer.learnRateFound(*result)
+
+        find_thread = threading.Thread(target=find)
+        find_thread.start()
+
+    def evaluate(self, data: DataLoader, model: Optional[torch.nn.Module] = None) -> Tuple[float, float]:
+        """
+        Compute the loss and the accuracy of the model, without building the autograd graph.
+
+        In the worker processes of fitDistributed, the results of all the processes are combined.
+
+        Args:
+            data (DataLoader): DataLoader object containing the evaluated data.
+            model (Optional[torch.nn.Module]): Model evaluated on the CPU in fp32 instead of the CNN, e.g. the quantized
+                model.
+
+        Returns:
+            Tuple[float, float]: Mean loss per batch and accuracy.
+        """
+
+        device = self.device if model is None else 'cpu'
+        autocast = self.autocast(device, model is None)
+        if model is None:
+            model = self.cnn.eval().to(self.device)
+
+        total_loss = 0.0
+        correct = 0
+        number_samples = 0
+        distributed = self.parallel is not None and model is self.cnn
+
+        with torch.inference_mode(), autocast:
+            for inputs, labels in data:
+                inputs, labels = self.resizeInputs(inputs.to(device)), labels.to(device)
+
+                outputs = model(inputs).float()
+                total_loss += self.criterion(outputs, labels).item()
+                correct += (outputs.argmax(1) == labels).sum().item()
+                number_samples += len(labels)
+
+        totals = torch.tensor([total_loss, len(data), correct, number_samples], dtype=torch.float64)
+        if distributed:
+            dist.all_reduce(totals)
+
+        return (totals[0] / max(totals[1], 1)).item(), (totals[2] / max(totals[3], 1)).item()
+
+    def loadDataset(self, path: str, cache: bool = False) -> Dataset:
+        """
+        Load the images of a dataset folder, one subfolder per label.
+
+        Args:
+            path (str): Path to the dataset.
+            cache (bool): If True, the images are decoded once into a memory-mapped cache next to the dataset.
+
+        Returns:
+            Dataset: Dataset of (image tensor, target) pairs.
+        """
+
+        train_transforms = transforms.Compose([transforms.Grayscale(),
+                                               transforms.Resize((self.input_size, self.input_size)),
+                                               transforms.ToTensor()])
+
+        # The classes and files come from the index of the folder, only the labels the brain can learn are loaded.
+        self.train_data = IndexedImageFolder(path, transform=train_transforms, number_classes=self.size_output)
+
+        if cache:
+            return CachedImageFolder(self.train_data, self.input_size)
+
+        return self.train_data
+
+    def loadData(self, path: str, cache: bool = False, rank: int = 0, world_size: int = 1, num_workers: int = 4) -> List[DataLoader]:
         """
         Load and preprocess the training data.
 
         Args:
             path (str): Path to the training data.
+            cache (bool): If True, the images are decoded once into a memory-mapped cache next to the dataset.
+            rank (int): Rank of the process in fitDistributed, it gets its shard of the training and test data.
+            world_size (int): Number of processes of fitDistributed, 1 for the whole data.
+            num_workers (int): Number of processes loading the batches.
+
+        Returns:
+            [DataLoader, DataLoader]: DataLoader objects containing training and test data.
+        """
+
+        data = self.loadDataset(path, cache)
+        self.data_source = {'path': os.path.abspath(path), 'cache': cache}
+
+        self.labels = list(self.train_data.classes)
+        self.observer.learnLabels(self.train_data.classes)
+
+        number_train = int(len(data)*0.8)
+        train_data, test_data = random_split(data, [number_train, len(data) - number_train],
+                                             generator=torch.Generator().manual_seed(self.split_seed))
+
+        if world_size > 1:
+            train_sampler = DistributedSampler(train_data, world_size, rank, shuffle=True, seed=self.split_seed)
+            test_sampler = DistributedSampler(test_data, world_size, rank, shuffle=False)
+            return [torch.utils.data.DataLoader(train_data, batch_size=64, sampler=train_sampler, num_workers=num_workers),
+                    torch.utils.data.DataLoader(test_data, batch_size=64, sampler=test_sampler, num_workers=num_workers)]
+
+        return [torch.utils.data.DataLoader(train_data, batch_size=64, shuffle=True, num_workers=num_workers, pin_memory=True),
+                torch.utils.data.DataLoader(test_data, batch_size=64, num_workers=num_workers, pin_memory=True)]
+
+    def startLearn(self, path: str, number_each: int, cache: bool = False, checkpoint: Optional[str] = None,
+                   patience: Optional[int] = None, number_processes: int = 1, timing_log: Optional[str] = None) -> None:
+        """
+        Start the learning process.
+
+        Args:
+            path (str): Path to the training data.
+            number_each (int): Number of epochs.
+            cache (bool): If True, the decoded images are served from the cache.
+            checkpoint (Optional[str]): If set, path of the checkpoint saved after every epoch, see fit.
+            patience (Optional[int]): If set, number of epochs without improvement of the test loss before stopping.
+            number_processes (int): Number of data-parallel training processes, see fitDistributed.
+            timing_log (Optional[str]): If set, the statistics of every epoch are appended to this JSONL file.
+
+        Returns:
+            None
+        """
+
+        data_set, test_set = self.loadData(path, cache)
+        self.observer.learnStarted(number_each)
+
+        if number_processes > 1:
+            fit_thread = threading.Thread(target=self.fitDistributed, args=(number_each, number_processes, checkpoint, patience, timing_log))
+        else:
+            fit_thread = threading.Thread(target=self.fit, args=(data_set, test_set, number_each, checkpoint, patience, timing_log))
+        fit_thread.start()
+
+    def fitDistributed(self, epochs: int, number_processes: int, checkpoint: Optional[str] = None,
+                       patience: Optional[int] = None, timing_log: Optional[str] = None) -> None:
+        """
+        Train the model in data-parallel worker processes on the CPU, see the dataParallel module.
+
+        Every process trains on its shard of the training data with a batch of 64 images, so a step uses
+        64 * number_processes images. The data must be loaded with loadData first, the workers load the same split.
+        The epochs are reported to the observer from this process, and the trained model is loaded back at the end.
+
+        Args:
+            epochs (int): Number of training epochs.
+            number_processes (int): Number of worker processes.
+            checkpoint (Optional[str]): If set, path of the checkpoint saved after every epoch, see fit.
+            patience (Optional[int]): If set, number of epochs without improvement of the test loss before stopping.
+            timing_log (Optional[str]): If set, the statistics of every epoch are appended to this JSONL file.
+
+        Returns:
+            None
+        """
+
+        from dataParallel import runDistributed
+
+        self.run = {'start': len(self.history),
+                    'epochs': epochs,
+                    'patience': patience,
+                    'checkpoint': checkpoint,
+                    'timing_log': timing_log,
+                    'best_loss': None,
+                    'best_epoch': len(self.history),
+                    'processes': number_processes,
+                    **self.data_source}
+
+        runDistributed(self, number_processes)
+
+    def startResume(self) -> None:
+        """
+        Start the rest of the training run of the opened checkpoint.
+
+        Returns:
+            None
+        """
+
+        data_set, test_set = self.loadData(self.run['path'], self.run['cache'])
+        self.observer.learnStarted(self.run['epochs'])
+
+        fit_thread = threading.Thread(target=self.resume, args=(data_set, test_set))
+        fit_thread.start()
+
+    def extend(self, labels: List[str]) -> int:
+        """
+        Add labels to the brain, keeping what it has learned. The outputs it has no label for are used first, then fc3
+        is widened, the weights of the existing outputs are kept.
+
+        Args:
+            labels (List[str]): Labels, those the brain already has are skipped.
+
+        Returns:
+            int: Index of the first output without a learned label, the outputs of the new labels start there.
+        """
+
+        first_new = len(self.labels)
+        new_labels = [label for label in labels if label not in self.labels]
+
+        if first_new + len(new_labels) > self.size_output:
+            with self.lock:
+                self.cnn.widenOutput(first_new + len(new_labels))
+            self.size_output = first_new + len(new_labels)
+            self.optimer = torch.optim.Adam(self.cnn.parameters(), lr=self.schedule['lr'])
+
+        self.labels = self.labels + new_labels
+        self.quantized = None
+
+        return first_new
+
+    def loadExtensionData(self, path: str, first_new: int, old_samples: Optional[int] = None, cache: bool = False) -> List[DataLoader]:
+        """
+        Load the images of the new labels mixed with a sample of the old ones, to learn the labels added by extend.
+
+        The folders of the dataset named like a label of the brain keep its target. The old labels are sampled from
+        their folders, if the dataset has them, and from the replay buffer.
+
+        Args:
+            path (str): Path to the dataset, with a folder for every new label and optionally folders of old ones.
+            first_new (int): Index of the first new label, returned by extend.
+            old_samples (Optional[int]): Number of images of each old label taken from the dataset, if None the mean
+                number of images of the new labels.
+            cache (bool): If True, the images are decoded once into a memory-mapped cache next to the dataset.
 
         Returns:
             [DataLoader, DataLoader]: DataLoader objects containing training and test data.
         """
 
-        train_transforms = transforms.Compose([transforms.RandomRotation(30),
-                                               transforms.Grayscale(),
-                                               transforms.Resize((256, 256)),
+        train_transforms = transforms.Compose([transforms.Grayscale(),
+                                               transforms.Resize((self.input_size, self.input_size)),
                                                transforms.ToTensor()])
 
-        self.train_data = datasets.ImageFolder(path, transform=train_transforms)
+        image_folder = IndexedImageFolder(path, transform=train_transforms)
+        targets = [self.labels.index(label) for label in image_folder.classes]
+
+        by_target: Dict[int, List[int]] = {}
+        for position, (_, target) in enumerate(image_folder.samples):
+            by_target.setdefault(targets[target], []).append(position)
+
+        new_counts = [len(positions) for target, positions in by_target.items() if target >= first_new]
+        if not new_counts:
+            raise ValueError(f"{path} has no folder of a new label")
+        if old_samples is None:
+            old_samples = sum(new_counts) // len(new_counts)
+
+        generator = torch.Generator().manual_seed(self.split_seed)
+        kept = []
+        for target, positions in sorted(by_target.items()):
+            if target < first_new and len(positions) > old_samples:
+                positions = [positions[i] for i in torch.randperm(len(positions), generator=generator)[:old_samples].tolist()]
+            kept.extend(sorted(positions))
+
+        image_folder.samples = [(image_folder.samples[i][0], targets[image_folder.samples[i][1]]) for i in kept]
+        image_folder.targets = [target for _, target in image_folder.samples]
+        image_folder.classes = list(self.labels)
+        image_folder.class_to_idx = {label: target for target, label in enumerate(self.labels)}
 
-        if len(self.train_data.classes) > self.brain_manager.number_labels_on_board:
-            self.train_data.classes = self.train_data.classes[:self.brain_manager.number_labels_on_board]
-            self.train_data.samples = [sample for sample, target in zip(self.train_data.samples, self.train_data.targets) if target < self.brain_manager.number_labels_on_board]
-            self.train_data.targets = self.train_data.targets[:self.brain_manager.number_labels_on_board]
+        self.train_data = image_folder
+        data: Dataset = CachedImageFolder(image_folder, self.input_size) if cache else image_folder
+        if len(self.replay) > 0:
+            data = ConcatDataset([data, self.replay.dataset()])
 
-        self.train_data.class_to_idx = {cls: idx for idx, cls in enumerate(self.train_data.classes)}
-        self.brain_manager.addLabel(self.train_data.classes)
+        self.data_source = {'path': os.path.abspath(path), 'cache': cache}
 
-        train_data, test_data = random_split(self.train_data, [int(len(self.train_data)*0.8), int(len(self.train_data)*0.2)])
+        number_train = int(len(data)*0.8)
+        train_data, test_data = random_split(data, [number_train, len(data) - number_train], generator=generator)
 
         return [torch.utils.data.DataLoader(train_data, batch_size=64, shuffle=True, num_workers=4, pin_memory=True),
                 torch.utils.data.DataLoader(test_data, batch_size=64, num_workers=4, pin_memory=True)]
 
-    def startLearn(self, path: str, number_each: int) -> None:
+    def checkLayers(self, layers: Tuple[str, ...]) -> None:
         """
-        Start the learning process.
+        Check that the network of the brain has trainable layers with the given names, e.g. for fitExtension.
 
         Args:
-            path (str): Path to the training data.
-            number_each (int): Number of epochs.
+            layers (Tuple[str, ...]): Names of layers of the network.
 
         Returns:
             None
         """
 
-        data_set, test_set = self.loadData(path)
-        self.brain_manager.newWindowPlot(number_each)
+        trainable = [name for name, layer in self.cnn.named_children() if any(True for _ in layer.parameters())]
+        unknown = [name for name in layers if name not in trainable]
+        if unknown:
+            raise ValueError(f"{type(self.cnn).__name__} has no trainable layer {', '.join(unknown)}, "
+                             f"its layers are {', '.join(trainable)}")
 
-        fit_thread = threading.Thread(target=self.fit, args=(data_set, test_set, number_each))
+    def fitExtension(self, train_data: DataLoader, test_data: DataLoader, epochs: int, first_new: int,
+                     train_layers: Tuple[str, ...] = ('fc3',), timing_log: Optional[str] = None) -> None:
+        """
+        Learn the labels added by extend. Only the outputs of the new labels are trained in fc3, and the other layers
+        of train_layers, e.g. ('fc2', 'fc3'), are trained entirely; the rest of the brain is frozen. The run cannot be
+        checkpointed, it is short.
+
+        Args:
+            train_data (DataLoader): DataLoader object containing training data, see loadExtensionData.
+            test_data (DataLoader): DataLoader object containing testing/validation data.
+            epochs (int): Number of training epochs.
+            first_new (int): Index of the first new label, returned by extend.
+            train_layers (Tuple[str, ...]): Names of the trained layers of the CNN.
+            timing_log (Optional[str]): If set, the statistics and the timings of every epoch are appended to this
+                JSONL file.
+
+        Returns:
+            None
+        """
+
+        self.checkLayers(train_layers)
+
+        for name, parameter in self.cnn.named_parameters():
+            parameter.requires_grad_(name.split('.')[0] in train_layers or name.startswith('fc3.'))
+
+        def keepOldOutputs(gradient: torch.Tensor) -> torch.Tensor:
+            gradient = gradient.clone()
+            gradient[:first_new] = 0
+            return gradient
+
+        hooks = [self.cnn.fc3.weight.register_hook(keepOldOutputs), self.cnn.fc3.bias.register_hook(keepOldOutputs)]
+
+        # A new optimizer without moments, so the old outputs, whose gradients are zero, do not move at all.
+        self.optimer = torch.optim.Adam([parameter for parameter in self.cnn.parameters() if parameter.requires_grad], lr=self.schedule['lr'])
+
+        try:
+            self.fit(train_data, test_data, epochs, timing_log=timing_log)
+        finally:
+            for hook in hooks:
+                hook.remove()
+            for parameter in self.cnn.parameters():
+                parameter.requires_grad_(True)
+            self.optimer = torch.optim.Adam(self.cnn.parameters(), lr=self.schedule['lr'])
+
+    def startExtend(self, path: str, epochs: int, old_samples: Optional[int] = None, train_layers: Tuple[str, ...] = ('fc3',),
+                    cache: bool = False) -> None:
+        """
+        Add the labels of the folders of a dataset to the brain and learn them in the background, see extend,
+        loadExtensionData and fitExtension. The brain is widened before this method returns.
+
+        Args:
+            path (str): Path to the dataset, with a folder for every new label and optionally folders of old ones.
+            epochs (int): Number of training epochs.
+            old_samples (Optional[int]): Number of images of each old label taken from the dataset.
+            train_layers (Tuple[str, ...]): Names of the trained layers of the CNN.
+            cache (bool): If True, the decoded images are served from the cache.
+
+        Returns:
+            None
+        """
+
+        # An unknown layer is an error before the brain is changed and the learning is started.
+        self.checkLayers(train_layers)
+
+        first_new = self.extend(DatasetIndex(path).classes)
+        data_set, test_set = self.loadExtensionData(path, first_new, old_samples, cache)
+
+        self.observer.learnLabels(self.labels)
+        self.observer.learnStarted(epochs)
+
+        fit_thread = threading.Thread(target=self.fitExtension, args=(data_set, test_set, epochs, first_new, train_layers))
         fit_thread.start()
 
-        self.brain_manager.updateStatsLabel()
+    def loadDistillationData(self, teacher: "Learn", path: str, cache: bool = False) -> List[DataLoader]:
+        """
+        Load the data of the teacher for a distillation run, at its input size and with its train/test split.
+
+        The labels and the split seed of the teacher are copied, so the test data of the student is the test data of the
+        teacher and the student can be compared with it.
 
-    def save(self, file_name: Optional[str] = 'brain_model') -> None:
+        Args:
+            teacher (Learn): Opened brain of the teacher.
+            path (str): Path to the dataset the teacher learned.
+            cache (bool): If True, the decoded images are served from the cache.
+
+        Returns:
+            [DataLoader, DataLoader]: DataLoader objects containing training and test data.
         """
-        Save the trained model and related information.
+
+        if teacher.size_output != self.size_output:
+            raise ValueError(f"the teacher has {teacher.size_output} outputs, the student {self.size_output}")
+
+        train_data, test_data = teacher.loadData(path, cache)
+
+        self.labels = list(teacher.labels)
+        self.split_seed = teacher.split_seed
+        self.train_data = teacher.train_data
+        self.data_source = teacher.data_source
+
+        return [train_data, test_data]
+
+    def fitDistilled(self, teacher: "Learn", train_data: DataLoader, test_data: DataLoader, epochs: int,
+                     temperature: float = 4.0, alpha: float = 0.9, timing_log: Optional[str] = None) -> None:
+        """
+        Train the model to reproduce the predictions of a teacher brain (knowledge distillation).
+
+        The loss mixes the divergence from the teacher's log-probabilities softened by the temperature with the loss of
+        the labels, see distillationLoss. The images are loaded at the input size of the teacher (see
+        loadDistillationData) and resized to the input size of the model after the augmentation, so the model can be
+        smaller in both width and input size. The teacher is only used during the run, the model is saved as an
+        ordinary brain.
+
+        Args:
+            teacher (Learn): Opened brain of the teacher, with the same labels.
+            train_data (DataLoader): DataLoader object containing training data.
+            test_data (DataLoader): DataLoader object containing testing/validation data.
+            epochs (int): Number of training epochs.
+            temperature (float): Temperature of the soft targets.
+            alpha (float): Weight of the soft targets, 1 - alpha is the weight of the labels.
+            timing_log (Optional[str]): If set, the statistics of every epoch are appended to this JSONL file.
+
+        Returns:
+            None
+        """
+
+        self.teacher = teacher
+        self.distillation = {'temperature': temperature, 'alpha': alpha}
+
+        try:
+            self.fit(train_data, test_data, epochs, timing_log=timing_log)
+        finally:
+            self.teacher = None
+
+    def quantize(self, path: str, number_samples: int = 640, cache: bool = False) -> None:
+        """
+        Quantize the model to int8 for CPU inference, calibrating it on a random sample of a dataset folder.
+
+        Args:
+            path (str): Path to the dataset used for calibration, usually the training data.
+            number_samples (int): Number of calibration images.
+            cache (bool): If True, the decoded images are served from the cache.
+
+        Returns:
+            None
+        """
+
+        data = self.loadDataset(path, cache)
+        indices = random.sample(range(len(data)), min(number_samples, len(data)))
+        loader = DataLoader(Subset(data, indices), batch_size=64, num_workers=4)
+
+        with self.lock:
+            self.quantized = quantizeModel(self.cnn, (inputs for inputs, _ in loader))
+
+    def save(self, file_name: Optional[str] = 'brain_model', checkpoint: bool = False, replay: bool = False) -> None:
+        """
+        Save the trained model and related information in the weights-only brain format.
 
         Args:
             file_name (Optional[str]): Name of the file to save.
+            checkpoint (bool): If True, the optimizer state, the random state and the state of the training run are
+                saved too, so the run can be resumed from the file.
+            replay (bool): If True, the replay buffer of the fine-tuning is saved too, checkpoints always have it.
 
         Returns:
             None
         """
 
-        torch.save({
-            'model_state_dict': self.cnn.state_dict(),
-            'labels': self.train_data.classes if self.train_data is not None else [],
-            'model_architecture': self.cnn,
-            'learn_history': self.history,
-            'size_output': self.brain_manager.number_labels_on_board
-        }, f'{file_name}')
+        if self.mapped_file is not None and os.path.abspath(file_name) == self.mapped_file:
+            self.detachFromFile()
+
+        header = {'architecture': {'name': type(self.cnn).__name__,
+                                   'size_output': self.size_output,
+                                   'input_size': self.input_size,
+                                   'hyperparameters': self.cnn.hyperparameters()},
+                  'labels': self.labels,
+                  'learn_history': self.history,
+                  'learn_accuracy': self.accuracy_history,
+                  'learn_timing': self.timing_history,
+                  'size_output': self.size_output,
+                  'precision': self.precision,
+                  'split_seed': self.split_seed,
+                  'schedule': self.schedule}
+        tensors = {f'model.{name}': tensor for name, tensor in self.cnn.state_dict().items()}
+
+        if checkpoint:
+            header['run'] = self.run
+            header['optimizer'], optimizer_tensors = self.optimizerState()
+            header['random'], random_tensors = self.randomState()
+            tensors.update(optimizer_tensors)
+            tensors.update(random_tensors)
+
+        if checkpoint or replay:
+            header['replay'], replay_tensors = self.replay.state()
+            tensors.update(replay_tensors)
+
+        saveBrainFile(f'{file_name}', header, tensors)
+
+        if self.quantized is not None:
+            torch.jit.save(self.quantized, quantizedPath(file_name))
+        elif os.path.isfile(quantizedPath(file_name)):
+            os.remove(quantizedPath(file_name))
 
     def open(self, file_name: str) -> None:
         """
-        Open a saved model and related information.
+        Open a saved model and related information, in the weights-only or in the legacy format.
+
+        The weights of the weights-only format are memory-mapped, they are read from the disk when first used.
 
         Args:
             file_name (str): Name of the file to open.
@@ -181,10 +1255,145 @@ class Learn:
             None
         """
 
-        checkpoint = torch.load(file_name)
+        header, tensors = openAnyBrainFile(file_name)
+        state_dict = {name[len('model.'):]: tensor for name, tensor in tensors.items() if name.startswith('model.')}
+
+        with torch.device('meta'):
+            architecture = header['architecture']
+            cnn = createModel(architecture['name'], architecture['size_output'], architecture.get('input_size', 256),
+                              **architecture.get('hyperparameters', {}))
+        cnn.load_state_dict(state_dict, assign=True)
+
+        self.cnn = cnn.to(self.device)
+        self.optimer = torch.optim.Adam(self.cnn.parameters(), lr=self.schedule['lr'])
+        self.labels = header['labels']
+        self.history = header['learn_history']
+        self.accuracy_history = header.get('learn_accuracy', [])
+        self.timing_history = header.get('learn_timing', [])
+        self.size_output = header['size_output']
+        self.input_size = cnn.input_size
+        self.setPrecision(header.get('precision', 'fp32'))
+        self.split_seed = header.get('split_seed', self.split_seed)
+        self.setSchedule(**header.get('schedule', {'name': 'constant', 'lr': 0.0001, 'warmup': 0.3}))
+        self.mapped_file = os.path.abspath(file_name) if isBrainFile(file_name) else None
+
+        self.replay = ReplayBuffer(REPLAY_CAPACITY, self.input_size)
+        if 'replay' in header:
+            self.replay.setState(header['replay'], tensors)
+
+        self.run = {}
+        self.random_state = None
+        if 'run' in header:
+            self.run = {**header['run'], 'checkpoint': file_name}
+            self.setOptimizerState(header['optimizer'], tensors)
+            self.random_state = (header['random'], {name: tensor.clone() for name, tensor in tensors.items() if name.startswith('random.')})
+
+        self.quantized = None
+        if os.path.isfile(quantizedPath(file_name)):
+            self.quantized = torch.jit.load(quantizedPath(file_name), map_location='cpu')
+
+    def optimizerState(self) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+        """
+        Split the state of the optimizer and of the loss scaler into JSON information and named tensors.
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, torch.Tensor]]: Information for the header and tensors prefixed with 'optimizer.'.
+        """
+
+        state_dict = self.optimer.state_dict()
+        values: Dict[str, Dict[str, Any]] = {}
+        tensors = {}
+
+        for index, state in state_dict['state'].items():
+            values[str(index)] = {}
+            for key, value in state.items():
+                if isinstance(value, torch.Tensor):
+                    tensors[f'optimizer.{index}.{key}'] = value
+                else:
+                    values[str(index)][key] = value
+
+        return {'param_groups': state_dict['param_groups'], 'state': values, 'scaler': self.scaler.state_dict()}, tensors
+
+    def setOptimizerState(self, information: Dict[str, Any], tensors: Dict[str, torch.Tensor]) -> None:
+        """
+        Restore the state of the optimizer and of the loss scaler saved by optimizerState.
+
+        Args:
+            information (Dict[str, Any]): Information from the header.
+            tensors (Dict[str, torch.Tensor]): Named tensors of the file.
+
+        Returns:
+            None
+        """
+
+        state = {int(index): dict(values) for index, values in information['state'].items()}
+        for name, tensor in tensors.items():
+            if name.startswith('optimizer.'):
+                _, index, key = name.split('.', 2)
+                state.setdefault(int(index), {})[key] = tensor
+
+        self.optimer.load_state_dict({'state': state, 'param_groups': information['param_groups']})
+
+        if information['scaler'] and self.scaler.is_enabled():
+            self.scaler.load_state_dict(information['scaler'])
+
+    def randomState(self) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+        """
+        Get the state of the random generators used by learning: Python, torch (shuffling, dropout), CUDA and the
+        augmentation.
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, torch.Tensor]]: Information for the header and tensors prefixed with 'random.'.
+        """
+
+        version, state, gauss = random.getstate()
+        tensors = {'random.torch': torch.get_rng_state(),
+                   'random.augmentation': self.augmentation.generator.get_state()}
+
+        if torch.cuda.is_available():
+            for index, cuda_state in enumerate(torch.cuda.get_rng_state_all()):
+                tensors[f'random.cuda.{index}'] = cuda_state
+
+        return {'python': [version, list(state), gauss]}, tensors
+
+    def setRandomState(self, information: Dict[str, Any], tensors: Dict[str, torch.Tensor]) -> None:
+        """
+        Restore the state of the random generators saved by randomState.
+
+        Args:
+            information (Dict[str, Any]): Information from the header.
+            tensors (Dict[str, torch.Tensor]): Named tensors of the file.
+
+        Returns:
+            None
+        """
+
+        version, state, gauss = information['python']
+        random.setstate((version, tuple(state), gauss))
+
+        torch.set_rng_state(tensors['random.torch'])
+        self.augmentation.generator.set_state(tensors['random.augmentation'])
+
+        if torch.cuda.is_available():
+            cuda_states = [tensors[f'random.cuda.{index}'] for index in range(torch.cuda.device_count()) if f'random.cuda.{index}' in tensors]
+            if len(cuda_states) == torch.cuda.device_count():
+                torch.cuda.set_rng_state_all(cuda_states)
+
+    def detachFromFile(self) -> None:
+        """
+        Copy the memory-mapped weights into memory, so the opened file can be replaced.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            for tensor in list(self.cnn.parameters()) + list(self.cnn.buffers()):
+                tensor.data = tensor.data.clone()
+
+            for state in self.optimer.state.values():
+                for key, value in state.items():
+                    if isinstance(value, torch.Tensor):
+                        state[key] = value.clone()
 
-        self.cnn = checkpoint['model_architecture']
-        self.cnn.load_state_dict(checkpoint['model_state_dict'])
-        self.brain_manager.labels_list = checkpoint['labels']
-        self.history = checkpoint['learn_history']
-        self.brain_manager.number_labels_on_board = checkpoint['size_output']
\ No newline at end of file
+        self.mapped_file = None
@@ -1,8 +1,9 @@
-import glob
-import os
 import tkinter as tk
 from tkinter import filedialog
-from typing import Any
+from typing import Any, Optional
+
+from datasetIndex import DatasetIndex
+from schedule import SCHEDULES
 
 
 class LearnFrame(tk.Frame):
@@ -49,8 +50,57 @@ class LearnFrame(tk.Frame):
         self.entry_each.pack(side="left", padx=10)
         self.entry_each.insert(0, 10)
 
+        self.cache_value = tk.BooleanVar(value=False)
+        self.check_cache = tk.Checkbutton(frame_2, text="Cache decoded images", variable=self.cache_value, background="#cfcccc", font=("Helvetica", 13))
+        self.check_cache.pack(side="left", padx=10)
+
+        frame_4 = tk.Frame(parent, bg="#cfcccc")
+        frame_4.pack(side='top')
+
+        self.label_patience = tk.Label(frame_4, text="Stop after epochs without progress:", background="#cfcccc", font=("Helvetica", 13))
+        self.label_patience.pack(side="left", padx=10)
+
+        self.entry_patience = tk.Entry(frame_4, width=5, font=("Helvetica", 13), validate='all',
+                                       validatecommand=(self.vcmd, '%P'))
+        self.entry_patience.pack(side="left", padx=10)
+
+        self.checkpoint_value = tk.BooleanVar(value=False)
+        self.check_checkpoint = tk.Checkbutton(frame_4, text="Save checkpoints", variable=self.checkpoint_value, background="#cfcccc", font=("Helvetica", 13))
+        self.check_checkpoint.pack(side="left", padx=10)
+
+        frame_5 = tk.Frame(parent, bg="#cfcccc")
+        frame_5.pack(side='top', pady=20)
+
+        self.label_rate = tk.Label(frame_5, text="Learning rate:", background="#cfcccc", font=("Helvetica", 13))
+        self.label_rate.pack(side="left", padx=10)
+
+        self.entry_rate = tk.Entry(frame_5, width=8, font=("Helvetica", 13), validate='all',
+                                   validatecommand=(self.register(self.validateRate), '%P'))
+        self.entry_rate.pack(side="left", padx=10)
+        self.entry_rate.insert(0, f"{self.brain_manager.learn.schedule['lr']:g}")
+
+        self.schedule_value = tk.StringVar(value=self.brain_manager.learn.schedule['name'])
+        self.menu_schedule = tk.OptionMenu(frame_5, self.schedule_value, *SCHEDULES)
+        self.menu_schedule.configure(font=("Helvetica", 12), relief=tk.FLAT, highlightthickness=0)
+        self.menu_schedule.pack(side="left", padx=10)
+
+        self.button_find_rate = tk.Button(frame_5, text="Find", width=6, height=1, font=("Helvetica", 13), relief=tk.FLAT, borderwidth=5, background="#4ac5e0", highlightthickness=1, bd=0, command=self.findLearningRate)
+        self.button_find_rate.pack(side="left", padx=10)
+        self.button_find_rate.config(state="disabled")
+
+        frame_6 = tk.Frame(parent, bg="#cfcccc")
+        frame_6.pack(side='top')
+
+        self.label_processes = tk.Label(frame_6, text="Training processes:", background="#cfcccc", font=("Helvetica", 13))
+        self.label_processes.pack(side="left", padx=10)
+
+        self.entry_processes = tk.Entry(frame_6, width=5, font=("Helvetica", 13), validate='all',
+                                        validatecommand=(self.vcmd, '%P'))
+        self.entry_processes.pack(side="left", padx=10)
+        self.entry_processes.insert(0, 1)
+
         frame_3 = tk.Frame(parent, bg="#cfcccc")
-        frame_3.pack(side='bottom', pady=60)
+        frame_3.pack(side='bottom', pady=30)
 
         self.button_start_learning = tk.Button(frame_3, width=25, height=2, font=("Helvetica", 15), relief=tk.FLAT, borderwidth=5, background="#4ac5e0", highlightthickness=1, bd=0, text="Start learning", command=self.runLearning)
         self.button_start_learning.pack(side="bottom", padx=10)
@@ -68,6 +118,16 @@ class LearnFrame(tk.Frame):
         self.button_browse.destroy()
         self.label_each.destroy()
         self.entry_each.destroy()
+        self.check_cache.destroy()
+        self.label_patience.destroy()
+        self.entry_patience.destroy()
+        self.check_checkpoint.destroy()
+        self.label_rate.destroy()
+        self.entry_rate.destroy()
+        self.menu_schedule.destroy()
+        self.button_find_rate.destroy()
+        self.label_processes.destroy()
+        self.entry_processes.destroy()
         self.button_start_learning.destroy()
         super().destroy()
 
@@ -89,8 +149,10 @@ class LearnFrame(tk.Frame):
 
             if self.validateData(folder_path):
                 self.button_start_learning.config(state="normal")
+                self.button_find_rate.config(state="normal")
             else:
                 self.button_start_learning.config(state="disabled")
+                self.button_find_rate.config(state="disabled")
 
     def runLearning(self) -> None:
         """
@@ -101,10 +163,68 @@ class LearnFrame(tk.Frame):
         """
 
         if self.entry_each.get() != "" and int(self.entry_each.get()) > 0:
+            patience = int(self.entry_patience.get()) if self.entry_patience.get() != "" and int(self.entry_patience.get()) > 0 else None
+            number_processes = max(int(self.entry_processes.get()), 1) if self.entry_processes.get() != "" else 1
+
+            checkpoint = None
+            if self.checkpoint_value.get():
+                checkpoint = filedialog.asksaveasfilename(
+                    title="Save the checkpoints of the run as",
+                    defaultextension=".pth",
+                    filetypes=[("Brain", "*.pth")]
+                )
+
+                if checkpoint == "":
+                    return
+
             self.brain_manager.clearPaint()
-            self.brain_manager.runLearning(self.entry_path.get(), int(self.entry_each.get()))
+            self.brain_manager.runLearning(self.entry_path.get(), int(self.entry_each.get()), self.cache_value.get(), checkpoint, patience,
+                                           self.schedule_value.get(), self.learningRate(), number_processes)
             self.brain_manager.closeWindowLearn()
 
+    def findLearningRate(self) -> None:
+        """
+        Start the learning rate range test on the chosen dataset.
+
+        Returns:
+            None
+        """
+
+        self.button_find_rate.config(state="disabled")
+        self.brain_manager.findLearningRate(self.entry_path.get(), self.cache_value.get())
+
+    def learningRateFound(self, suggestion: Optional[float]) -> None:
+        """
+        Fill in the learning rate suggested by the range test.
+
+        Args:
+            suggestion (Optional[float]): Suggested learning rate, None if the test could not suggest one.
+
+        Returns:
+            None
+        """
+
+        self.button_find_rate.config(state="normal")
+
+        if suggestion is not None:
+            self.entry_rate.delete(0, tk.END)
+            self.entry_rate.insert(0, f"{suggestion:.1e}")
+
+    def learningRate(self) -> Optional[float]:
+        """
+        Get the entered learning rate.
+
+        Returns:
+            Optional[float]: Learning rate, None if the entry is not a positive number.
+        """
+
+        try:
+            learning_rate = float(self.entry_rate.get())
+        except ValueError:
+            return None
+
+        return learning_rate if learning_rate > 0 else None
+
     def validateNumber(self, P: str) -> bool:
         """
         Validates if the entered value is a positive integer.
@@ -121,6 +241,19 @@ class LearnFrame(tk.Frame):
         else:
             return False
 
+    def validateRate(self, P: str) -> bool:
+        """
+        Validates if the entered value can be part of a learning rate, e.g. '0.001' or '1e-3'.
+
+        Args:
+            P (str): The value entered the entry widget.
+
+        Returns:
+            bool: True if the value contains only digits, '.', 'e' and '-', False otherwise.
+        """
+
+        return all(character in "0123456789.e-" for character in P)
+
     def validateData(self, path: str) -> bool:
         """
         Validates if the provided path contains a valid dataset.
@@ -132,15 +265,7 @@ class LearnFrame(tk.Frame):
             bool: True if the dataset is valid, False otherwise.
         """
 
-        files = glob.glob(os.path.join(path, "*"))
-
-        if not files:
+        try:
+            return DatasetIndex(path).isValid()
+        except OSError:
             return False
-
-        for element in os.listdir(path):
-            element_path = os.path.join(path, element)
-
-            if os.path.isfile(element_path):
-                return False
-
-        return True
\ No newline at end of file
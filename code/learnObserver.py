@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional
+
+
+class LearnObserver:
+    """
+    Interface for receiving the events of the Learn class, every method does nothing by default.
+
+    The BrainManager implements it to drive the windows, the command line tool to print the progress.
+    """
+
+    def learnLabels(self, labels: List[str]) -> None:
+        """
+        Called when the labels of the training data are known.
+
+        Args:
+            labels (List[str]): Labels of the training data.
+
+        Returns:
+            None
+        """
+
+    def learnStarted(self, number_epoch: int) -> None:
+        """
+        Called before the first epoch.
+
+        Args:
+            number_epoch (int): Number of epochs to run.
+
+        Returns:
+            None
+        """
+
+    def learnEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Called after every epoch, from the training thread.
+
+        Args:
+            epoch (int): Number of the finished epoch, starting from 1.
+            stats (Dict[str, float]): Statistics of the epoch ('train_loss', 'test_loss', 'test_accuracy',
+                'learning_rate', 'time', and the timings of learn.TIMING_KEYS: seconds spent in each phase of the
+                steps, 'samples_per_second' and 'peak_rss_mb').
+
+        Returns:
+            None
+        """
+
+    def learnFinished(self) -> None:
+        """
+        Called after the last epoch, from the training thread.
+
+        Returns:
+            None
+        """
+
+    def learnFailed(self, error: str) -> None:
+        """
+        Called when a training run stopped on an error, from the training thread, before learnFinished.
+
+        Args:
+            error (str): Description of the error.
+
+        Returns:
+            None
+        """
+
+    def learnRateFound(self, learning_rates: List[float], losses: List[float], suggestion: Optional[float]) -> None:
+        """
+        Called when the learning rate range test is finished, from its thread.
+
+        Args:
+            learning_rates (List[float]): Learning rates of the test.
+            losses (List[float]): Smoothed training losses.
+            suggestion (Optional[float]): Learning rate where the loss falls the fastest.
+
+        Returns:
+            None
+        """
+
+    def learnFineTuned(self, target: int, loss: float) -> None:
+        """
+        Called when a drawing was learned by Learn.fineTune, from its thread.
+
+        Args:
+            target (int): Index of the label of the drawing.
+            loss (float): Loss of the last step.
+
+        Returns:
+            None
+        """
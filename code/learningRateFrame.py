@@ -0,0 +1,57 @@
+import tkinter as tk
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from typing import List, Optional
+
+
+class LearningRateFrame(tk.Frame):
+    """
+    Class representing the frame displaying the result of the learning rate range test.
+    """
+
+    def __init__(self, parent: tk.Frame, learning_rates: List[float], losses: List[float], suggestion: Optional[float]) -> None:
+        """
+        Initialize the LearningRateFrame.
+
+        Args:
+            parent (tk.Frame): The parent tkinter frame.
+            learning_rates (List[float]): Learning rates of the test.
+            losses (List[float]): Smoothed training losses.
+            suggestion (Optional[float]): Suggested learning rate, None if the test could not suggest one.
+        """
+
+        super().__init__()
+
+        frame = tk.Frame(parent, bg="#cfcccc")
+        frame.pack()
+
+        fig = Figure(figsize=(5, 4), dpi=100, facecolor='#cfcccc')
+
+        self.plot = fig.add_subplot(111)
+        self.plot.set(xlabel='Learning rate', ylabel='Loss', title='Learning rate range test')
+        self.plot.semilogx(learning_rates, losses)
+
+        if suggestion is not None:
+            self.plot.axvline(suggestion, color='#4293c2', linestyle='--')
+            text = f"Suggested learning rate: {suggestion:.1e}"
+        else:
+            text = "No suggestion, the loss did not diverge during the test"
+
+        self.canvas = FigureCanvasTkAgg(fig, master=frame)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().pack(side="top")
+
+        self.value_label = tk.Label(frame, text=text, font=("Helvetica", 14), background="#cfcccc")
+        self.value_label.pack(side="top", pady=10)
+
+    def __del__(self) -> None:
+        """
+        Destructor to clean up frame elements.
+
+        Returns:
+            None
+        """
+
+        self.canvas.get_tk_widget().destroy()
+        self.value_label.destroy()
+        super().destroy()
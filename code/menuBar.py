@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import Menu, filedialog, DISABLED
+from tkinter import Menu, filedialog, simpledialog, DISABLED
 
 
 class MenuBar:
@@ -30,6 +30,12 @@ class MenuBar:
 
         self.edit_menu = Menu(self.menu_bar, tearoff=0)
         self.edit_menu.add_command(label="Learn brain", state=DISABLED, command=self.parent.newWindowLearn)
+        self.edit_menu.add_command(label="Resume learning", command=self.resumeLearning)
+        self.edit_menu.add_command(label="Extend brain", state=DISABLED, command=self.extendBrain)
+        self.edit_menu.add_separator()
+        self.profiling_value = tk.BooleanVar(value=False)
+        self.edit_menu.add_checkbutton(label="Profile training and predictions", variable=self.profiling_value,
+                                       command=lambda: self.parent.setProfiling(self.profiling_value.get()))
         self.menu_bar.add_cascade(label="Learn", menu=self.edit_menu)
 
         self.view_menu = Menu(self.menu_bar, tearoff=0)
@@ -58,6 +64,44 @@ class MenuBar:
             except:
                 pass
 
+    def resumeLearning(self) -> None:
+        """
+        Open a dialog to choose a checkpoint of a training run and resume the run.
+
+        Returns:
+            None
+        """
+
+        file_name = filedialog.askopenfilename(
+            title="Choose a checkpoint of a training run",
+            filetypes=[("Brain", "*.pth")]
+        )
+
+        if file_name != "":
+            try:
+                self.parent.resumeLearning(file_name)
+            except:
+                pass
+
+    def extendBrain(self) -> None:
+        """
+        Open dialogs to choose a dataset folder with new labels and the number of epochs, then learn the new labels.
+
+        Returns:
+            None
+        """
+
+        folder_path = filedialog.askdirectory(title="Choose a dataset with a folder for every new label")
+
+        if folder_path:
+            number_epoch = simpledialog.askinteger("Extend brain", "Number of epochs:", initialvalue=5, minvalue=1, parent=self.parent)
+
+            if number_epoch is not None:
+                try:
+                    self.parent.extendBrain(folder_path, number_epoch)
+                except:
+                    pass
+
     def saveParametersCNN(self, state: bool) -> None:
         """
         Save the current Brain parameters to a file.
@@ -1,8 +1,7 @@
-import io
 import tkinter as tk
 from typing import Optional, Any
 
-from PIL import Image, EpsImagePlugin
+from rasterizer import StrokeRasterizer
 
 
 class PaintFrame(tk.Frame):
@@ -33,6 +32,8 @@ class PaintFrame(tk.Frame):
         self.last_x: Optional[int] = None
         self.last_y: Optional[int] = None
 
+        self.rasterizer = StrokeRasterizer(500, 500, 3)
+
         self.setDisplayPaint(False)
 
     def __del__(self) -> None:
@@ -59,6 +60,7 @@ class PaintFrame(tk.Frame):
         """
 
         self.last_x, self.last_y = event.x, event.y
+        self.rasterizer.beginStroke(event.x, event.y)
 
     def drawLine(self, event: tk.Event) -> None:
         """
@@ -73,8 +75,11 @@ class PaintFrame(tk.Frame):
 
         if self.last_x is not None and self.last_y is not None:
             self.white_board.create_line(self.last_x, self.last_y, event.x, event.y, fill='black', width=3, smooth=tk.TRUE, capstyle=tk.ROUND, joinstyle=tk.ROUND)
+            self.rasterizer.addPoint(event.x, event.y)
             self.last_x, self.last_y = event.x, event.y
 
+            self.brain_manager.requestPrediction()
+
     def clearCanvas(self) -> None:
         """
         Clear the canvas.
@@ -85,6 +90,8 @@ class PaintFrame(tk.Frame):
 
         try:
             self.white_board.delete("all")
+            self.rasterizer.clear()
+            self.brain_manager.cancelPrediction()
             self.brain_manager.updateDataInStatsFrame([0] * self.brain_manager.number_labels_on_board)
         except:
             pass
@@ -111,7 +118,7 @@ class PaintFrame(tk.Frame):
 
     def updateStatistic(self, event: tk.Event) -> None:
         """
-        Update the statistics based on the drawn image.
+        Request the prediction of the finished stroke, the statistics are updated when it is done.
 
         Args:
             event (tk.Event): The tkinter event object.
@@ -120,9 +127,4 @@ class PaintFrame(tk.Frame):
             None
         """
 
-        #EpsImagePlugin.gs_windows_binary = r'C:\Program Files\gs\gs10.01.0\bin\gswin64c'
-        image = self.white_board.postscript(colormode='gray')
-        image = Image.open(io.BytesIO(bytes(image, 'utf-8'))).convert('L')
-
-        predict = self.brain_manager.predict(image)
-        self.brain_manager.updateDataInStatsFrame(predict)
\ No newline at end of file
+        self.brain_manager.requestPrediction()
\ No newline at end of file
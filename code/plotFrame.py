@@ -1,16 +1,24 @@
+import time
 import tkinter as tk
 from tkinter import ttk
+from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from typing import Optional, Any
+from typing import Optional, Any, Dict
+
+from learn import TIMING_PHASES
 
 
 class PlotFrame(tk.Frame):
     """
     Class representing the frame for displaying a plot in the application.
+
+    While learning, the lines are updated in place and blitted over a cached background, the whole figure is only
+    drawn again when the axes have to grow (their limits double, so it happens a few times per run). The optional
+    second panel shows the time spent in each phase of the training steps.
     """
 
-    def __init__(self, parent: tk.Frame, brain_manager: Any, number_epoch: Optional[int]) -> None:
+    def __init__(self, parent: tk.Frame, brain_manager: Any, number_epoch: Optional[int], redraw_interval: float = 0.25) -> None:
         """
         Initialize the PlotFrame.
 
@@ -18,6 +26,7 @@ class PlotFrame(tk.Frame):
             parent (tk.Frame): The parent tkinter frame.
             brain_manager (BrainManager): The brain manager instance.
             number_epoch (Optional[int]): Number of epochs to study, if None, the chart does not display a progress bar.
+            redraw_interval (float): Minimal time in seconds between two redraws while learning.
         """
 
         super().__init__()
@@ -25,23 +34,67 @@ class PlotFrame(tk.Frame):
         self.brain_manager = brain_manager
         self.parent = parent
         self.number_each = number_epoch
+        self.redraw_interval = redraw_interval
+        self.last_redraw: float = 0.0
+        self.pending: bool = False
+        self.epoch: int = 0
+        self.background: Any = None
+        self.max_points: int = 400
 
         frame = tk.Frame(parent, bg="#cfcccc")
         frame.pack()
 
-        fig = Figure(figsize=(5, 5), dpi=100, facecolor='#cfcccc')
+        self.figure = Figure(figsize=(5, 5), dpi=100, facecolor='#cfcccc')
 
-        self.plot = fig.add_subplot(111)
+        self.plot = self.figure.add_subplot(111)
         self.plot.set(xlabel='Epoch', ylabel='Loss', title='Progress')
 
-        self.canvas = FigureCanvasTkAgg(fig, master=frame)
-        self.canvas.draw()
+        grid = self.figure.add_gridspec(2, 1, hspace=0.6)
+        self.positions = {False: self.plot.get_position(), True: grid[0].get_position(self.figure)}
+
+        self.timing_plot = self.figure.add_axes(grid[1].get_position(self.figure))
+        self.timing_plot.set(xlabel='Epoch', ylabel='Seconds', title='Time of the steps')
+        self.timing_plot.set_visible(False)
+
+        # Copies of the histories, the learning thread keeps appending to the ones of the brain.
+        history = [list(losses) for losses in self.brain_manager.getHistory()]
+        timing_history = [dict(timing) for timing in self.brain_manager.getTimingHistory()]
+
+        self.epochs = list(range(1, len(history) + 1))
+        self.train_losses = [losses[0] for losses in history]
+        self.test_losses = [losses[1] for losses in history]
+        self.train_line, = self.plot.plot(self.epochs, self.train_losses, animated=True)
+        self.test_line, = self.plot.plot(self.epochs, self.test_losses, animated=True)
+        self.plot.legend(["Training Loss", "Testing Loss"], loc="upper right")
+
+        # Older brains have no timings for their first epochs.
+        self.timing_epochs = list(range(len(history) - len(timing_history) + 1, len(history) + 1))
+        self.timings = {phase: [timing[f'{phase}_time'] for timing in timing_history] for phase in TIMING_PHASES}
+        self.timing_lines = {phase: self.timing_plot.plot(self.timing_epochs, self.timings[phase], animated=True, label=phase)[0]
+                             for phase in TIMING_PHASES}
+        self.timing_plot.legend(loc="upper left", fontsize=7, ncol=3)
+
+        width = max(5, 2 * len(history) if self.number_each is not None else len(history))
+        self.plot.set_xlim(0, width)
+        self.plot.set_ylim(0, max([3.0] + [1.1 * loss for loss in self.train_losses + self.test_losses]))
+        self.timing_plot.set_xlim(0, width)
+        self.timing_plot.set_ylim(0, max([1.0] + [1.1 * value for values in self.timings.values() for value in values]))
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=frame)
+        self.canvas.mpl_connect('draw_event', self.onDraw)
 
         self.canvas.get_tk_widget().pack(side="top")
 
         toolbar = NavigationToolbar2Tk(self.canvas, parent)
         toolbar.update()
 
+        self.timing_value = tk.BooleanVar(value=False)
+        self.check_timing = tk.Checkbutton(toolbar, text="Timing", variable=self.timing_value, command=self.showTiming)
+        self.check_timing.pack(side="right")
+
+        self.timing_label = tk.Label(toolbar, text=self.timingText())
+        self.timing_label.pack(side="right")
+
         if self.number_each is not None:
             style = ttk.Style()
             style.theme_use('default')
@@ -53,14 +106,7 @@ class PlotFrame(tk.Frame):
             self.value_label = tk.Label(frame, text=f"0 / {self.number_each}", font=("Helvetica", 16), background="#cfcccc")
             self.value_label.pack(side="left", anchor="w")
 
-            self.plot.plot(range(1, 2), [[0, 0]])
-            self.plot.legend(["Training Loss", "Testing Loss"], loc="upper right")
-            self.plot.set_ylim(0, 3)
-            self.plot.set_xlim(0, 5)
-
-        else:
-            self.plot.plot(range(1, self.brain_manager.sizeHistory() + 1), self.brain_manager.getHistory())
-            self.plot.legend(["Training Loss", "Testing Loss"], loc="upper right")
+        self.canvas.draw()
 
     def __del__(self) -> None:
         """
@@ -71,29 +117,156 @@ class PlotFrame(tk.Frame):
         """
 
         self.canvas.get_tk_widget().destroy()
+        self.check_timing.destroy()
+        self.timing_label.destroy()
         self.progress_bar.destroy()
         self.value_label.destroy()
         super().destroy()
 
-    def update(self, now_epoch: int) -> None:
+    def showTiming(self) -> None:
         """
-        Update the plot and progress bar.
+        Show or hide the panel with the time of the steps, as chosen with the check button.
+
+        Returns:
+            None
+        """
+
+        visible = self.timing_value.get()
+        self.plot.set_position(self.positions[visible])
+        self.timing_plot.set_visible(visible)
+        self.canvas.draw()
+
+    def timingText(self) -> str:
+        """
+        Describe the throughput and the memory of the last timed epoch.
+
+        Returns:
+            str: Text of the timing label, empty if no epoch was timed.
+        """
+
+        timing_history = self.brain_manager.getTimingHistory()
+        if not timing_history:
+            return ""
+
+        timing = timing_history[-1]
+        peak = f", peak RSS {timing['peak_rss_mb']:.0f} MB" if timing['peak_rss_mb'] is not None else ""
+        return f"{timing['samples_per_second']:.0f} samples/s{peak}"
+
+    def onDraw(self, event: Any) -> None:
+        """
+        Keep the background of a full draw of the figure (e.g. after a zoom) and draw the lines over it.
 
         Args:
-            now_epoch (int): The current epoch.
+            event (Any): The draw event of matplotlib.
 
         Returns:
             None
         """
 
-        self.plot.clear()
-        self.plot.set(xlabel='Epoch', ylabel='Loss', title='Progress')
-        self.plot.plot(range(1, self.brain_manager.sizeHistory() + 1), self.brain_manager.getHistory())
-        self.plot.legend(["Training Loss", "Testing Loss"], loc="upper right")
-        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.drawLines()
+
+    def drawLines(self) -> None:
+        """
+        Draw the lines of the visible panels.
+
+        Returns:
+            None
+        """
+
+        self.plot.draw_artist(self.train_line)
+        self.plot.draw_artist(self.test_line)
+
+        if self.timing_plot.get_visible():
+            for line in self.timing_lines.values():
+                self.timing_plot.draw_artist(line)
+
+    def addEpoch(self, epoch: int, stats: Dict[str, float]) -> None:
+        """
+        Add the losses and the timings of a finished epoch, they are drawn by the next refresh.
+
+        Args:
+            epoch (int): Number of the finished epoch in the run.
+            stats (Dict[str, float]): Statistics of the epoch.
+
+        Returns:
+            None
+        """
+
+        self.epochs.append(len(self.epochs) + 1)
+        self.train_losses.append(stats['train_loss'])
+        self.test_losses.append(stats['test_loss'])
+
+        self.timing_epochs.append(len(self.epochs))
+        for phase in TIMING_PHASES:
+            self.timings[phase].append(stats[f'{phase}_time'])
+
+        self.epoch = epoch
+        self.pending = True
+
+    def grow(self, axes: Axes, width: int, highest: float) -> bool:
+        """
+        Double the x limit of the axes if the lines do not fit, and raise the y limit.
+
+        Args:
+            axes (Axes): Panel of the figure.
+            width (int): Number of epochs shown.
+            highest (float): Highest new value.
+
+        Returns:
+            bool: True if a limit was changed, the figure must be drawn again.
+        """
+
+        grown = False
+
+        if width > axes.get_xlim()[1]:
+            axes.set_xlim(0, 2 * width)
+            grown = True
+
+        if highest > axes.get_ylim()[1]:
+            axes.set_ylim(0, 1.1 * highest)
+            grown = True
+
+        return grown
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Draw the added epochs and update the progress bar, at most once per redraw interval.
+
+        Args:
+            force (bool): If True, draw now even if the last redraw is recent, e.g. after the last epoch.
+
+        Returns:
+            None
+        """
+
+        now = time.perf_counter()
+        if not self.pending or (not force and now - self.last_redraw < self.redraw_interval):
+            return
+
+        self.pending = False
+        self.last_redraw = now
+
+        # Lines longer than the axes are wide are thinned, so drawing them does not get slower as the run grows.
+        stride = max(1, len(self.epochs) // self.max_points)
+        self.train_line.set_data(self.epochs[::stride], self.train_losses[::stride])
+        self.test_line.set_data(self.epochs[::stride], self.test_losses[::stride])
+        for phase, line in self.timing_lines.items():
+            line.set_data(self.timing_epochs[::stride], self.timings[phase][::stride])
+
+        grown = self.grow(self.plot, len(self.epochs), max(self.train_losses[-1], self.test_losses[-1]))
+        grown = self.grow(self.timing_plot, len(self.epochs), max(values[-1] for values in self.timings.values())) or grown
+
+        if grown or self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.drawLines()
+            self.canvas.blit(self.figure.bbox)
 
-        self.progress_bar["value"] = 100 * now_epoch / self.number_each
-        self.value_label["text"] = f"{now_epoch} / {self.number_each}"
+        self.timing_label["text"] = self.timingText()
+        self.progress_bar["value"] = 100 * self.epoch / self.number_each
+        self.value_label["text"] = f"{self.epoch} / {self.number_each}"
 
-        if now_epoch == self.number_each:
-            self.value_label.config(foreground="#4293c2")
\ No newline at end of file
+        if self.epoch == self.number_each:
+            self.value_label.config(foreground="#4293c2")
@@ -0,0 +1,146 @@
+import threading
+import time
+import traceback
+from typing import Any, Callable, List, Optional
+
+
+class PredictWorker(threading.Thread):
+    """
+    Background thread running the predictions of the drawing, so the Tk thread never waits for the model nor for the
+    rendering of the drawing.
+
+    Only the latest submitted drawing is kept, older ones are dropped, and predictions are started at most once per
+    debounce interval. The result is picked up from the Tk thread with takeResult(), the error of a failed prediction
+    with takeError().
+    """
+
+    def __init__(self, predict: Callable[[Any], List[float]], debounce: float = 0.05) -> None:
+        """
+        Initialize the PredictWorker.
+
+        Args:
+            predict (Callable[[Any], List[float]]): Function rendering and predicting a submitted drawing.
+            debounce (float): Minimal time in seconds between two predictions.
+
+        Returns:
+            None
+        """
+
+        super().__init__(daemon=True)
+
+        self.predict = predict
+        self.debounce = debounce
+
+        self.condition = threading.Condition()
+        self.pending: Optional[Any] = None
+        self.pending_generation: int = 0
+        self.generation: int = 0
+        self.result: Optional[List[float]] = None
+        self.error: Optional[str] = None
+        self.running: bool = True
+        self.last_start: float = 0.0
+
+    def submit(self, drawing: Any) -> None:
+        """
+        Queue a drawing for prediction, replacing the drawing waiting in the queue.
+
+        Args:
+            drawing (Any): Drawing passed to the predict function, e.g. the rasterizer of the canvas.
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            self.pending = drawing
+            self.pending_generation = self.generation
+            self.condition.notify()
+
+    def clear(self) -> None:
+        """
+        Drop the waiting image and the results of the predictions that are still running.
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            self.pending = None
+            self.result = None
+            self.generation += 1
+
+    def takeResult(self) -> Optional[List[float]]:
+        """
+        Take the latest prediction.
+
+        Returns:
+            Optional[List[float]]: List of prediction probabilities, None if there is no new result.
+        """
+
+        with self.condition:
+            result, self.result = self.result, None
+            return result
+
+    def takeError(self) -> Optional[str]:
+        """
+        Take the error of the latest failed prediction.
+
+        Returns:
+            Optional[str]: Description of the error, None if no prediction failed since the last call.
+        """
+
+        with self.condition:
+            error, self.error = self.error, None
+            return error
+
+    def stop(self) -> None:
+        """
+        Stop the thread.
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def run(self) -> None:
+        """
+        Predict the submitted drawings until the thread is stopped.
+
+        Returns:
+            None
+        """
+
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+
+                if not self.running:
+                    return
+
+            delay = self.last_start + self.debounce - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self.condition:
+                drawing, generation = self.pending, self.pending_generation
+                self.pending = None
+
+            if drawing is None:
+                continue
+
+            self.last_start = time.monotonic()
+            try:
+                result = self.predict(drawing)
+            except Exception as error:
+                traceback.print_exc()
+                with self.condition:
+                    self.error = f"{type(error).__name__}: {error}"
+                continue
+
+            with self.condition:
+                if generation == self.generation:
+                    self.result = result
@@ -0,0 +1,76 @@
+import os
+from typing import Tuple
+
+import torch
+from torch.profiler import ProfilerActivity
+
+
+def profilePaths(file_name: str, name: str) -> Tuple[str, str]:
+    """
+    Get the paths of the profile of a brain, saved next to it.
+
+    Args:
+        file_name (str): Path of the brain, e.g. 'model.pth'.
+        name (str): Profiled work, 'train' or 'predict'.
+
+    Returns:
+        Tuple[str, str]: Paths of the Chrome trace and of the op table, e.g. 'model.train.trace.json' and
+            'model.train.ops.txt'.
+    """
+
+    root = os.path.splitext(file_name)[0]
+    return f"{root}.{name}.trace.json", f"{root}.{name}.ops.txt"
+
+
+def createProfiler(file_name: str, name: str, skip: int, warmup: int, active: int) -> torch.profiler.profile:
+    """
+    Create a profiler of a window of steps, with the shapes of the inputs and the memory of the ops.
+
+    The first skip steps run without the profiler, the next warmup steps are profiled but dropped (the first calls of
+    an op are slower), and the next active steps are recorded. Their profile is saved by saveProfile. Call step() on
+    the profiler after every step.
+
+    Args:
+        file_name (str): Path of the brain, the profile is saved next to it.
+        name (str): Profiled work, 'train' or 'predict'.
+        skip (int): Number of steps before the profiler starts.
+        warmup (int): Number of profiled steps that are not recorded.
+        active (int): Number of recorded steps.
+
+    Returns:
+        torch.profiler.profile: Profiler, to start with start() or as a context manager.
+    """
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+
+    return torch.profiler.profile(activities=activities,
+                                  schedule=torch.profiler.schedule(wait=skip, warmup=warmup, active=active, repeat=1),
+                                  on_trace_ready=lambda profiler: saveProfile(profiler, file_name, name),
+                                  record_shapes=True,
+                                  profile_memory=True)
+
+
+def saveProfile(profiler: torch.profiler.profile, file_name: str, name: str, row_limit: int = 40) -> None:
+    """
+    Save the Chrome trace (open it in chrome://tracing or Perfetto) and the table of the slowest ops.
+
+    Args:
+        profiler (torch.profiler.profile): Profiler with recorded steps.
+        file_name (str): Path of the brain, the profile is saved next to it.
+        name (str): Profiled work, 'train' or 'predict'.
+        row_limit (int): Number of ops in the table.
+
+    Returns:
+        None
+    """
+
+    trace_path, table_path = profilePaths(file_name, name)
+    profiler.export_chrome_trace(trace_path)
+
+    sort_by = "self_cuda_time_total" if torch.cuda.is_available() else "self_cpu_time_total"
+    averages = profiler.key_averages(group_by_input_shape=True)
+
+    with open(table_path, 'w') as file:
+        file.write(averages.table(sort_by=sort_by, row_limit=row_limit, max_name_column_width=40, max_shapes_column_width=60))
@@ -0,0 +1,50 @@
+import queue
+from typing import Any, Callable, List, Tuple
+
+
+class ProgressChannel:
+    """
+    Queue of the progress events of the learning threads, they are handled later in the Tk thread.
+
+    Tk and matplotlib may only be used from the Tk thread, so the training thread publishes the callbacks with their
+    arguments and the Tk loop drains and runs them periodically (see BrainManager.pollProgress).
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the ProgressChannel.
+
+        Returns:
+            None
+        """
+
+        self.events: "queue.SimpleQueue[Tuple[Callable[..., Any], Tuple[Any, ...]]]" = queue.SimpleQueue()
+
+    def publish(self, callback: Callable[..., Any], *args: Any) -> None:
+        """
+        Queue a callback to run in the Tk thread, can be called from any thread.
+
+        Args:
+            callback (Callable[..., Any]): Function to run.
+            *args (Any): Arguments of the function.
+
+        Returns:
+            None
+        """
+
+        self.events.put((callback, args))
+
+    def drain(self) -> List[Tuple[Callable[..., Any], Tuple[Any, ...]]]:
+        """
+        Take all the queued callbacks, in the order they were published.
+
+        Returns:
+            List[Tuple[Callable[..., Any], Tuple[Any, ...]]]: Callbacks with their arguments.
+        """
+
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,95 @@
+import copy
+import os
+import warnings
+from typing import Iterable
+
+import torch
+from torch.ao.quantization import QConfigMapping, get_default_qconfig, default_dynamic_qconfig
+from torch.ao.quantization.backend_config import BackendConfig, get_native_backend_config
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+
+def quantizedPath(file_name: str) -> str:
+    """
+    Get the path of the quantized model saved next to a brain.
+
+    Args:
+        file_name (str): Path of the brain, e.g. 'model.pth'.
+
+    Returns:
+        str: Path of the quantized model, e.g. 'model.int8.pt'.
+    """
+
+    return f"{os.path.splitext(file_name)[0]}.int8.pt"
+
+
+def backendConfig() -> BackendConfig:
+    """
+    Build the native backend config without the Linear + ReLU fusion, so the linear layers can stay dynamically
+    quantized while the convolutions and their ReLUs are statically quantized.
+
+    Returns:
+        BackendConfig: Backend config for prepare_fx and convert_fx.
+    """
+
+    configs = []
+    for config in get_native_backend_config().configs:
+        if isinstance(config.pattern, tuple) and any(op in (torch.nn.Linear, torch.nn.functional.linear) for op in config.pattern):
+            continue
+        configs.append(config)
+
+    return BackendConfig("native_without_linear_fusion").set_backend_pattern_configs(configs)
+
+
+def quantizeModel(model: torch.nn.Module, calibration: Iterable[torch.Tensor]) -> torch.jit.ScriptModule:
+    """
+    Quantize a model for int8 inference on the CPU.
+
+    Convolutions, their ReLUs and the max pooling are quantized statically, with activation ranges observed on the
+    calibration batches. Linear layers are quantized dynamically.
+
+    Args:
+        model (torch.nn.Module): Model in fp32, it is not modified.
+        calibration (Iterable[torch.Tensor]): Batches of input images used to observe the activations.
+
+    Returns:
+        torch.jit.ScriptModule: Traced quantized model, it can be saved with torch.jit.save.
+    """
+
+    model = copy.deepcopy(model).cpu().eval()
+    static_qconfig = get_default_qconfig(torch.backends.quantized.engine)
+
+    qconfig_mapping = (QConfigMapping()
+                       .set_object_type(torch.nn.Conv2d, static_qconfig)
+                       .set_object_type(torch.nn.MaxPool2d, static_qconfig)
+                       .set_object_type(torch.nn.ReLU, static_qconfig)
+                       .set_object_type(torch.nn.functional.relu, static_qconfig)
+                       .set_object_type(torch.nn.Linear, default_dynamic_qconfig))
+
+    # Only the ReLUs of the convolutions are quantized statically, the ones after the linear layers stay in fp32.
+    number_relu = sum(1 for node in torch.fx.symbolic_trace(model).graph.nodes if node.target in (torch.nn.functional.relu, torch.relu))
+    number_conv = sum(1 for module in model.modules() if isinstance(module, torch.nn.Conv2d))
+    for i in range(number_conv, number_relu):
+        qconfig_mapping.set_module_name_object_type_order("", torch.nn.functional.relu, i, None)
+
+    backend_config = backendConfig()
+    example = None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        prepared = None
+        with torch.no_grad():
+            for images in calibration:
+                images = images.cpu()
+                if prepared is None:
+                    example = images
+                    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(images,), backend_config=backend_config)
+                prepared(images)
+
+        if prepared is None:
+            raise ValueError("no calibration data")
+
+        quantized = convert_fx(prepared, backend_config=backend_config)
+        with torch.no_grad():
+            return torch.jit.freeze(torch.jit.trace(quantized, example))
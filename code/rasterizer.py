@@ -0,0 +1,156 @@
+import threading
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+
+class StrokeRasterizer:
+    """
+    Keeps the strokes drawn on the canvas and rasterizes them straight into a grayscale image.
+    """
+
+    def __init__(self, width: int, height: int, line_width: float, supersample: int = 4) -> None:
+        """
+        Initialize the StrokeRasterizer.
+
+        Args:
+            width (int): Width of the source canvas in pixels.
+            height (int): Height of the source canvas in pixels.
+            line_width (float): Width of the line drawn on the source canvas.
+            supersample (int): Factor used to render the strokes before downsampling, gives anti-aliased edges.
+
+        Returns:
+            None
+        """
+
+        self.width = width
+        self.height = height
+        self.line_width = line_width
+        self.supersample = supersample
+
+        self.strokes: List[List[Tuple[int, int]]] = []
+
+        self._segments: List[Tuple[int, int, int, int]] = []
+        self._buffer: Optional[Image.Image] = None
+        self._buffer_size: Optional[Tuple[int, int]] = None
+        self._drawn: int = 0
+
+        # Guards the strokes against follow() in another thread; generation counts the calls to clear().
+        self.lock = threading.Lock()
+        self.generation: int = 0
+        self._followed: Optional[int] = None
+
+    def beginStroke(self, x: int, y: int) -> None:
+        """
+        Start a new stroke at the given canvas position.
+
+        Args:
+            x (int): X coordinate on the canvas.
+            y (int): Y coordinate on the canvas.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.strokes.append([(x, y)])
+
+    def addPoint(self, x: int, y: int) -> None:
+        """
+        Extend the current stroke to the given canvas position.
+
+        Args:
+            x (int): X coordinate on the canvas.
+            y (int): Y coordinate on the canvas.
+
+        Returns:
+            None
+        """
+
+        if not self.strokes:
+            self.beginStroke(x, y)
+            return
+
+        with self.lock:
+            last_x, last_y = self.strokes[-1][-1]
+            self.strokes[-1].append((x, y))
+            self._segments.append((last_x, last_y, x, y))
+
+    def clear(self) -> None:
+        """
+        Remove all strokes.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.strokes.clear()
+            self._segments.clear()
+            self.generation += 1
+
+        self._buffer = None
+        self._buffer_size = None
+        self._drawn = 0
+
+    def follow(self, source: 'StrokeRasterizer') -> None:
+        """
+        Copy the segments added to another rasterizer since the previous call, e.g. to render in the prediction worker
+        the strokes drawn in the Tk thread. Everything is copied again only after the source was cleared.
+
+        Args:
+            source (StrokeRasterizer): Rasterizer of the canvas.
+
+        Returns:
+            None
+        """
+
+        with source.lock:
+            generation = source.generation
+            start = len(self._segments) if generation == self._followed else 0
+            segments = source._segments[start:]
+
+        if generation != self._followed:
+            self.clear()
+            self._followed = generation
+
+        self._segments.extend(segments)
+
+    def render(self, width: int, height: Optional[int] = None) -> Image.Image:
+        """
+        Rasterize the strokes into a grayscale image (black lines on white background).
+
+        Only segments added since the previous call with the same size are drawn, the rest is kept in the buffer.
+
+        Args:
+            width (int): Width of the output image.
+            height (Optional[int]): Height of the output image, if None the image is square.
+
+        Returns:
+            PIL.Image.Image: Grayscale image in 'L' mode.
+        """
+
+        height = width if height is None else height
+
+        if self._buffer_size != (width, height):
+            self._buffer = Image.new('L', (width * self.supersample, height * self.supersample), 255)
+            self._buffer_size = (width, height)
+            self._drawn = 0
+
+        scale_x = width * self.supersample / self.width
+        scale_y = height * self.supersample / self.height
+        line_width = max(1, round(self.line_width * scale_x))
+        radius = line_width / 2
+
+        draw = ImageDraw.Draw(self._buffer)
+        for x0, y0, x1, y1 in self._segments[self._drawn:]:
+            x0, y0, x1, y1 = x0 * scale_x, y0 * scale_y, x1 * scale_x, y1 * scale_y
+            draw.line((x0, y0, x1, y1), fill=0, width=line_width)
+            draw.ellipse((x0 - radius, y0 - radius, x0 + radius, y0 + radius), fill=0)
+            draw.ellipse((x1 - radius, y1 - radius, x1 + radius, y1 + radius), fill=0)
+        self._drawn = len(self._segments)
+
+        if self.supersample == 1:
+            return self._buffer.copy()
+
+        return self._buffer.reduce(self.supersample)
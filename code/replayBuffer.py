@@ -0,0 +1,190 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from torch.utils.data import Dataset
+
+
+class ReplayBuffer:
+    """
+    Bounded reservoir sample of the training images, mixed into the fine-tuning steps so a brain that learns a new
+    drawing does not forget the rest of the dataset.
+
+    Every image offered with add has the same chance of being kept, however many were offered (reservoir sampling,
+    algorithm R). The images are stored as uint8, a buffer of 256 images of 256 x 256 takes 16 MB.
+    """
+
+    def __init__(self, capacity: int, input_size: int, seed: Optional[int] = None) -> None:
+        """
+        Initialize the ReplayBuffer.
+
+        Args:
+            capacity (int): Maximal number of images kept.
+            input_size (int): Width and height of the images.
+            seed (Optional[int]): Seed of the sampling, random if None.
+
+        Returns:
+            None
+        """
+
+        self.capacity = capacity
+        self.input_size = input_size
+        self.images = torch.empty(0, input_size, input_size, dtype=torch.uint8)
+        self.targets = torch.empty(0, dtype=torch.int64)
+
+        # Number of images offered to the buffer since it was created.
+        self.seen: int = 0
+
+        self.generator = torch.Generator()
+        if seed is None:
+            self.generator.seed()
+        else:
+            self.generator.manual_seed(seed)
+
+    def __len__(self) -> int:
+        """
+        Get the number of kept images.
+
+        Returns:
+            int: Number of images.
+        """
+
+        return len(self.targets)
+
+    def add(self, images: torch.Tensor, targets: torch.Tensor) -> None:
+        """
+        Offer a batch of training images to the buffer.
+
+        Args:
+            images (torch.Tensor): Images of shape (N, 1, input_size, input_size) with values in [0, 1].
+            targets (torch.Tensor): Targets of the images.
+
+        Returns:
+            None
+        """
+
+        images = images.detach().reshape(-1, self.input_size, self.input_size).mul(255).round_().to('cpu', torch.uint8)
+        targets = targets.detach().to('cpu', torch.int64)
+
+        free = min(self.capacity - len(self), len(targets))
+        if free > 0:
+            self.images = torch.cat([self.images, images[:free]])
+            self.targets = torch.cat([self.targets, targets[:free]])
+
+        # The image number seen + i replaces a random kept image with probability capacity / (seen + i + 1).
+        count = len(targets) - free
+        if count > 0:
+            numbers = torch.arange(self.seen + free + 1, self.seen + len(targets) + 1, dtype=torch.float64)
+            slots = (torch.rand(count, generator=self.generator, dtype=torch.float64) * numbers).long()
+
+            # One by one, so a later image wins when two draw the same slot.
+            for position in torch.nonzero(slots < self.capacity).flatten().tolist():
+                self.images[slots[position]] = images[free + position]
+                self.targets[slots[position]] = targets[free + position]
+
+        self.seen += len(targets)
+
+    def sample(self, number: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Draw random kept images, with replacement.
+
+        Args:
+            number (int): Number of images.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: Images of shape (number, 1, input_size, input_size) with values in
+                [0, 1] and their targets, empty if the buffer is.
+        """
+
+        if len(self) == 0 or number <= 0:
+            return torch.empty(0, 1, self.input_size, self.input_size), torch.empty(0, dtype=torch.int64)
+
+        indices = torch.randint(len(self), (number,), generator=self.generator)
+        return self.images[indices].unsqueeze(1).float().div_(255), self.targets[indices]
+
+    def dataset(self) -> "ReplayDataset":
+        """
+        Get a copy of the kept images as a dataset, e.g. to mix them with a dataset folder.
+
+        Returns:
+            ReplayDataset: Dataset of (image tensor, target) pairs.
+        """
+
+        return ReplayDataset(self.images.clone(), self.targets.tolist())
+
+    def state(self) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+        """
+        Split the buffer into JSON information and named tensors, to save it with a checkpoint.
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, torch.Tensor]]: Information for the header and tensors prefixed with 'replay.'.
+        """
+
+        return ({'capacity': self.capacity, 'seen': self.seen},
+                {'replay.images': self.images, 'replay.targets': self.targets, 'replay.generator': self.generator.get_state()})
+
+    def setState(self, information: Dict[str, Any], tensors: Dict[str, torch.Tensor]) -> None:
+        """
+        Restore the buffer saved by state. The images are copied, so they do not depend on the memory map of the file.
+
+        Args:
+            information (Dict[str, Any]): Information from the header.
+            tensors (Dict[str, torch.Tensor]): Named tensors of the file.
+
+        Returns:
+            None
+        """
+
+        images = tensors['replay.images']
+        if images.shape[1:] != (self.input_size, self.input_size):
+            return
+
+        self.capacity = information['capacity']
+        self.seen = information['seen']
+        self.images = images.clone()
+        self.targets = tensors['replay.targets'].clone()
+        self.generator.set_state(tensors['replay.generator'].clone())
+
+
+class ReplayDataset(Dataset):
+    """
+    Images of a replay buffer served like the samples of an ImageFolder.
+    """
+
+    def __init__(self, images: torch.Tensor, targets: List[int]) -> None:
+        """
+        Initialize the ReplayDataset.
+
+        Args:
+            images (torch.Tensor): Images of shape (N, input_size, input_size) as uint8.
+            targets (List[int]): Targets of the images.
+
+        Returns:
+            None
+        """
+
+        self.images = images
+        self.targets = targets
+
+    def __len__(self) -> int:
+        """
+        Get the number of images.
+
+        Returns:
+            int: Number of images.
+        """
+
+        return len(self.targets)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, int]:
+        """
+        Get an image.
+
+        Args:
+            index (int): Index of the image.
+
+        Returns:
+            Tuple[torch.Tensor, int]: Image tensor of shape (1, input_size, input_size) with values in [0, 1] and its
+                target.
+        """
+
+        return self.images[index].unsqueeze(0).float().div(255), self.targets[index]
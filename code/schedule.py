@@ -0,0 +1,154 @@
+import copy
+import itertools
+import math
+import warnings
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import torch
+
+# Learning rate schedules, applied after every optimizer step.
+SCHEDULES = ['constant', 'one-cycle', 'cosine']
+
+
+def createScheduler(schedule: Dict[str, Any], optimizer: torch.optim.Optimizer, total_steps: int,
+                    done_steps: int = 0) -> Optional[torch.optim.lr_scheduler.LRScheduler]:
+    """
+    Create the learning rate scheduler of a training run.
+
+    'one-cycle' warms up from lr / 25 to lr during the first warmup fraction of the steps, then anneals to almost 0.
+    'cosine' warms up linearly from 0 to lr, then follows a half cosine down to 0. 'constant' keeps lr.
+
+    Args:
+        schedule (Dict[str, Any]): Schedule of the brain, with the 'name', 'lr' and 'warmup' keys.
+        optimizer (torch.optim.Optimizer): Optimizer of the model.
+        total_steps (int): Number of optimizer steps of the whole run.
+        done_steps (int): Number of steps already done, when a run is resumed.
+
+    Returns:
+        Optional[torch.optim.lr_scheduler.LRScheduler]: Scheduler to step after every optimizer step, None for 'constant'.
+    """
+
+    for group in optimizer.param_groups:
+        group['lr'] = schedule['lr']
+        group.pop('initial_lr', None)
+
+    if schedule['name'] == 'constant' or total_steps <= 0:
+        return None
+
+    if schedule['name'] == 'one-cycle':
+        scheduler = torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=schedule['lr'], total_steps=total_steps,
+                                                        pct_start=max(schedule['warmup'], 1 / total_steps))
+    elif schedule['name'] == 'cosine':
+        warmup_steps = int(schedule['warmup'] * total_steps)
+        scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, cosineWithWarmup(warmup_steps, total_steps))
+    else:
+        raise ValueError(f"unknown schedule {schedule['name']}, expected one of {', '.join(SCHEDULES)}")
+
+    # The schedules depend only on the step number, so stepping replays the learning rate of a resumed run.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for _ in range(min(done_steps, total_steps - 1)):
+            scheduler.step()
+
+    return scheduler
+
+
+def cosineWithWarmup(warmup_steps: int, total_steps: int) -> Callable[[int], float]:
+    """
+    Build the learning rate factor of the cosine schedule with a linear warmup.
+
+    Args:
+        warmup_steps (int): Number of steps of the warmup.
+        total_steps (int): Number of optimizer steps of the whole run.
+
+    Returns:
+        Callable[[int], float]: Factor of the learning rate for a step number.
+    """
+
+    def factor(step: int) -> float:
+        if step < warmup_steps:
+            return (step + 1) / warmup_steps
+        progress = (step - warmup_steps) / max(total_steps - warmup_steps, 1)
+        return 0.5 * (1 + math.cos(math.pi * min(progress, 1.0)))
+
+    return factor
+
+
+def findLearningRate(model: torch.nn.Module, optimizer: torch.optim.Optimizer, step: Callable[[Any], float],
+                     batches: Iterable[Any], start_lr: float = 1e-7, end_lr: float = 1.0, number_steps: int = 100,
+                     smoothing: float = 0.98) -> Tuple[List[float], List[float]]:
+    """
+    Run the learning rate range test: train on mini-batches while the learning rate grows exponentially, and record
+    the smoothed loss. The model and the optimizer are restored afterwards.
+
+    The sweep stops early when the loss diverges (four times the lowest loss).
+
+    Args:
+        model (torch.nn.Module): Trained model.
+        optimizer (torch.optim.Optimizer): Optimizer of the model.
+        step (Callable[[Any], float]): Runs one training step on a batch and returns its loss.
+        batches (Iterable[Any]): Training batches, repeated if there are fewer than number_steps.
+        start_lr (float): First learning rate.
+        end_lr (float): Last learning rate.
+        number_steps (int): Number of mini-batches of the sweep.
+        smoothing (float): Factor of the exponential moving average of the loss.
+
+    Returns:
+        Tuple[List[float], List[float]]: Learning rates and smoothed losses.
+    """
+
+    model_state = copy.deepcopy(model.state_dict())
+    optimizer_state = copy.deepcopy(optimizer.state_dict())
+
+    learning_rates: List[float] = []
+    losses: List[float] = []
+    average = 0.0
+    best = math.inf
+
+    try:
+        for index, batch in enumerate(itertools.islice(itertools.cycle(batches), number_steps)):
+            learning_rate = start_lr * (end_lr / start_lr) ** (index / max(number_steps - 1, 1))
+            for group in optimizer.param_groups:
+                group['lr'] = learning_rate
+
+            loss = step(batch)
+
+            average = smoothing * average + (1 - smoothing) * loss
+            smoothed = average / (1 - smoothing ** (index + 1))
+
+            if not math.isfinite(smoothed) or smoothed > 4 * best:
+                break
+
+            best = min(best, smoothed)
+            learning_rates.append(learning_rate)
+            losses.append(smoothed)
+    finally:
+        model.load_state_dict(model_state)
+        optimizer.load_state_dict(optimizer_state)
+
+    return learning_rates, losses
+
+
+def suggestLearningRate(learning_rates: List[float], losses: List[float]) -> Optional[float]:
+    """
+    Suggest the learning rate of a range test: one tenth of the learning rate where the loss rises 5 % above its
+    minimum, i.e. where learning starts to diverge.
+
+    Args:
+        learning_rates (List[float]): Learning rates of the range test.
+        losses (List[float]): Smoothed losses of the range test.
+
+    Returns:
+        Optional[float]: Suggested learning rate, None if the loss did not diverge during the test, e.g. when a new
+            brain is still on its initial plateau.
+    """
+
+    if not losses:
+        return None
+
+    lowest = min(range(len(losses)), key=losses.__getitem__)
+    for learning_rate, loss in zip(learning_rates[lowest:], losses[lowest:]):
+        if loss > 1.05 * losses[lowest]:
+            return learning_rate / 10
+
+    return None
@@ -0,0 +1,335 @@
+import csv
+import os
+from typing import Any, Iterator, List, Optional, Tuple
+
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+from torchvision.datasets.folder import IMG_EXTENSIONS
+
+from learn import Learn
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows of a Parquet part file, the parts of a finished scoring are read as one dataset.
+ROWS_PER_PART = 65536
+
+
+def listImages(sources: List[str]) -> List[str]:
+    """
+    List the images to score, in a stable order so an interrupted scoring can be resumed.
+
+    Args:
+        sources (List[str]): Directories, searched recursively, image files, or text files with one image path per
+            line.
+
+    Returns:
+        List[str]: Paths of the images.
+    """
+
+    paths = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            for root, directories, files in os.walk(source):
+                directories.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMG_EXTENSIONS))
+        elif source.lower().endswith(IMG_EXTENSIONS):
+            paths.append(source)
+        else:
+            with open(source) as file:
+                paths.extend(line.strip() for line in file if line.strip())
+
+    return paths
+
+
+class ImageFiles(Dataset):
+    """
+    Dataset of image files for scoring, without labels.
+    """
+
+    def __init__(self, paths: List[str], input_size: int) -> None:
+        """
+        Initialize the ImageFiles.
+
+        Args:
+            paths (List[str]): Paths of the images.
+            input_size (int): Width and height the images are resized to.
+        """
+
+        self.paths = paths
+        self.transform = transforms.Compose([transforms.Grayscale(),
+                                             transforms.Resize((input_size, input_size)),
+                                             transforms.ToTensor()])
+        self.input_size = input_size
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, bool]:
+        """
+        Load an image.
+
+        Args:
+            index (int): Index of the image.
+
+        Returns:
+            Tuple[torch.Tensor, bool]: Image tensor and True, or a blank tensor and False if the file cannot be read.
+        """
+
+        try:
+            with Image.open(self.paths[index]) as image:
+                return self.transform(image), True
+        except (OSError, ValueError):
+            return torch.zeros(1, self.input_size, self.input_size), False
+
+
+class ScoreWriter:
+    """
+    Writes the scores to a CSV file or to a directory of Parquet part files, batch by batch.
+
+    Rows are flushed as soon as they are written (CSV) or a part is full (Parquet), so an interrupted scoring keeps
+    what was written and can be resumed from it.
+    """
+
+    def __init__(self, out: str, columns: List[str]) -> None:
+        """
+        Initialize the ScoreWriter.
+
+        Args:
+            out (str): Path of the CSV file, or of the Parquet directory if it ends with '.parquet'.
+            columns (List[str]): Names of the columns.
+        """
+
+        self.out = out
+        self.columns = columns
+        self.parquet = out.endswith('.parquet')
+        self.rows: List[List[Any]] = []
+
+        if self.parquet and pyarrow is None:
+            raise ImportError("writing Parquet needs pyarrow (pip install pyarrow), or use a .csv output")
+
+        self.file = None
+        self.part = 0
+
+    def existingRows(self) -> Tuple[int, Optional[str]]:
+        """
+        Count the rows written by a previous scoring, a row or a part file left incomplete by an interruption is
+        removed.
+
+        Returns:
+            Tuple[int, Optional[str]]: Number of rows and path of the image of the last row, None if there is none.
+        """
+
+        if self.parquet:
+            if not os.path.isdir(self.out):
+                return 0, None
+
+            parts = sorted(name for name in os.listdir(self.out) if name.startswith('part-') and name.endswith('.parquet'))
+            if not parts:
+                return 0, None
+
+            number_rows = sum(pyarrow.parquet.ParquetFile(os.path.join(self.out, name)).metadata.num_rows for name in parts)
+            last = pyarrow.parquet.read_table(os.path.join(self.out, parts[-1]), columns=['path']).column('path')
+            self.part = len(parts)
+            return number_rows, last[len(last) - 1].as_py()
+
+        if not os.path.isfile(self.out) or os.path.getsize(self.out) == 0:
+            return 0, None
+
+        # The end of the last complete row is found by reading backwards from the end of the file, in blocks.
+        with open(self.out, 'rb+') as file:
+            end = file.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(0, end - 2 ** 16)
+                file.seek(start)
+                newline = file.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            file.truncate(end)
+
+        with open(self.out, newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return 0, None
+            if header != self.columns:
+                raise ValueError(f"{self.out} has other columns, it was not written by this scoring")
+
+            number_rows = 0
+            last_row = None
+            for last_row in reader:
+                number_rows += 1
+
+        return number_rows, last_row[0] if last_row is not None else None
+
+    def open(self, resumed: bool) -> None:
+        """
+        Open the output for writing.
+
+        Args:
+            resumed (bool): If True, the rows are appended to the ones of a previous scoring.
+
+        Returns:
+            None
+        """
+
+        if self.parquet:
+            os.makedirs(self.out, exist_ok=True)
+            return
+
+        self.file = open(self.out, 'a' if resumed else 'w', newline='')
+        self.writer = csv.writer(self.file)
+        if not resumed:
+            self.writer.writerow(self.columns)
+
+    def write(self, rows: List[List[Any]]) -> None:
+        """
+        Write scored rows.
+
+        Args:
+            rows (List[List[Any]]): Rows in the order of the columns.
+
+        Returns:
+            None
+        """
+
+        if not self.parquet:
+            self.writer.writerows(rows)
+            self.file.flush()
+            return
+
+        self.rows.extend(rows)
+        while len(self.rows) >= ROWS_PER_PART:
+            self.writePart(self.rows[:ROWS_PER_PART])
+            self.rows = self.rows[ROWS_PER_PART:]
+
+    def writePart(self, rows: List[List[Any]]) -> None:
+        """
+        Write a Parquet part file, under a temporary name first so only complete parts are read on resume.
+
+        Args:
+            rows (List[List[Any]]): Rows of the part.
+
+        Returns:
+            None
+        """
+
+        table = pyarrow.table({name: [row[index] for row in rows] for index, name in enumerate(self.columns)})
+        file_name = os.path.join(self.out, f"part-{self.part:05d}.parquet")
+
+        pyarrow.parquet.write_table(table, f"{file_name}.tmp")
+        os.replace(f"{file_name}.tmp", file_name)
+        self.part += 1
+
+    def close(self) -> None:
+        """
+        Write the remaining rows and close the output.
+
+        Returns:
+            None
+        """
+
+        if self.parquet:
+            if self.rows:
+                self.writePart(self.rows)
+                self.rows = []
+        elif self.file is not None:
+            self.file.close()
+
+
+def scoreRows(learn: Learn, loader: DataLoader, paths: List[str], start: int, top_k: int) -> Iterator[List[List[Any]]]:
+    """
+    Score the batches of a loader.
+
+    Args:
+        learn (Learn): Opened brain.
+        loader (DataLoader): Loader of the images from index start of paths, not shuffled.
+        paths (List[str]): Paths of all the images.
+        start (int): Index of the first image of the loader.
+        top_k (int): Number of most probable labels of each row.
+
+    Returns:
+        Iterator[List[List[Any]]]: Rows of each batch: path, then label and probability of the top_k labels. The label
+            of an unreadable image is empty.
+    """
+
+    index = start
+    labels = learn.labels
+
+    for images, valid in loader:
+        probabilities = learn.predictBatch(images)
+        values, indices = probabilities.topk(min(top_k, probabilities.shape[1]), dim=1)
+
+        rows = []
+        for row_values, row_indices, row_valid in zip(values.tolist(), indices.tolist(), valid.tolist()):
+            row: List[Any] = [paths[index]]
+            for value, label_index in zip(row_values, row_indices):
+                if row_valid:
+                    row += [labels[label_index] if label_index < len(labels) else str(label_index), value]
+                else:
+                    row += ["", None]
+            rows.append(row)
+            index += 1
+
+        yield rows
+
+
+def scoreImages(learn: Learn, paths: List[str], out: str, top_k: int = 3, batch_size: int = 256, num_workers: int = 4,
+                report: Optional[Any] = None) -> int:
+    """
+    Score images with a brain and write the results incrementally, resuming a scoring that was interrupted.
+
+    The images are streamed through a DataLoader with several workers, nothing but the rows of the current batch is
+    kept in memory. When out already holds rows, they must be the first images of paths and only the next ones are
+    scored.
+
+    Args:
+        learn (Learn): Opened brain.
+        paths (List[str]): Paths of the images, see listImages.
+        out (str): Path of the CSV file, or of the Parquet directory if it ends with '.parquet'.
+        top_k (int): Number of most probable labels of each row, at most the number of outputs of the brain.
+        batch_size (int): Number of images of a batch.
+        num_workers (int): Number of processes loading the images.
+        report (Optional[Any]): Called with the numbers of scored and of all the images after every batch.
+
+    Returns:
+        int: Number of images scored by this call.
+    """
+
+    # A brain has no more ranks than outputs, every row has the columns of the header.
+    top_k = min(top_k, learn.size_output)
+
+    columns = ['path']
+    for rank in range(1, top_k + 1):
+        columns += [f'label_{rank}', f'probability_{rank}']
+
+    writer = ScoreWriter(out, columns)
+    start, last_path = writer.existingRows()
+
+    if start > len(paths) or (start > 0 and paths[start - 1] != last_path):
+        raise ValueError(f"{out} was written for other images, choose another output to score them")
+
+    dataset = torch.utils.data.Subset(ImageFiles(paths, learn.input_size), range(start, len(paths)))
+    loader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers, pin_memory=learn.device == 'cuda')
+
+    writer.open(start > 0)
+    scored = 0
+
+    try:
+        for rows in scoreRows(learn, loader, paths, start, top_k):
+            writer.write(rows)
+            scored += len(rows)
+            if report is not None:
+                report(start + scored, len(paths))
+    finally:
+        writer.close()
+
+    return scored
@@ -0,0 +1,382 @@
+import http.client
+import io
+import json
+import math
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import torch
+from PIL import Image
+
+from learn import Learn
+
+# Largest accepted request body in bytes, a 4096 x 4096 grayscale image is 16 MB.
+MAX_BODY_SIZE = 16 * 2 ** 20
+
+# Number of recent batch sizes kept by a MicroBatcher for the statistics, older ones are dropped.
+BATCH_HISTORY = 4096
+
+
+class MicroBatcher:
+    """
+    Collects the images of concurrent requests into batches and runs them through the model together.
+
+    A batch is started when it reaches max_batch_size images or when its first image has waited max_latency seconds.
+    """
+
+    def __init__(self, learn: Learn, max_batch_size: int = 32, max_latency: float = 0.005) -> None:
+        """
+        Initialize the MicroBatcher and start its thread.
+
+        Args:
+            learn (Learn): Learn object with the loaded brain.
+            max_batch_size (int): Maximal number of images in a batch.
+            max_latency (float): Maximal time in seconds an image waits for other images.
+
+        Returns:
+            None
+        """
+
+        self.learn = learn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.queue: queue.Queue = queue.Queue()
+        # Sizes of the most recent batches, bounded so a long-running server does not grow.
+        self.batch_sizes: Deque[int] = deque(maxlen=BATCH_HISTORY)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, image: torch.Tensor) -> Future:
+        """
+        Queue an image for prediction.
+
+        Args:
+            image (torch.Tensor): Image tensor of shape (1, input_size, input_size).
+
+        Returns:
+            Future: Future with the list of prediction probabilities.
+        """
+
+        future: Future = Future()
+        self.queue.put((image, future))
+        return future
+
+    def run(self) -> None:
+        """
+        Form and run the batches, runs in the batcher thread.
+
+        Returns:
+            None
+        """
+
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_latency
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self.batch_sizes.append(len(batch))
+
+            try:
+                probabilities = self.learn.predictBatch(torch.stack([image for image, _ in batch])).tolist()
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            for (_, future), result in zip(batch, probabilities):
+                future.set_result(result)
+
+
+class BrainRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of the inference server.
+
+    POST /predict takes a PNG (or any image PIL can open) or raw 8-bit grayscale pixels with the
+    'application/octet-stream' content type and the optional 'width' and 'height' query parameters.
+    GET /labels returns the labels of the brain.
+    """
+
+    server_version = "Brain"
+
+    def do_GET(self) -> None:
+        """
+        Handle a GET request.
+
+        Returns:
+            None
+        """
+
+        if urlparse(self.path).path == "/labels":
+            self.sendJson(200, {"labels": self.server.learn.labels})
+        else:
+            self.sendJson(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        """
+        Handle a POST request.
+
+        Returns:
+            None
+        """
+
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            self.sendJson(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+
+        # The body is not read, the connection is closed so its bytes are not taken for the next request.
+        if length < 0:
+            self.close_connection = True
+            self.sendJson(400, {"error": "invalid Content-Length"})
+            return
+        if length > MAX_BODY_SIZE:
+            self.close_connection = True
+            self.sendJson(413, {"error": f"the body is larger than {MAX_BODY_SIZE} bytes"})
+            return
+
+        body = self.rfile.read(length)
+
+        try:
+            image = decodeImage(body, self.headers.get("Content-Type", ""), parse_qs(url.query))
+        except Exception as error:
+            self.sendJson(400, {"error": str(error)})
+            return
+
+        learn = self.server.learn
+        try:
+            probabilities = self.server.batcher.submit(learn.transformImage(image)).result()
+        except Exception as error:
+            self.sendJson(500, {"error": str(error)})
+            return
+
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        self.sendJson(200, {"labels": learn.labels,
+                            "probabilities": probabilities,
+                            "label": learn.labels[best] if best < len(learn.labels) else best})
+
+    def sendJson(self, status: int, data: dict) -> None:
+        """
+        Send a JSON reply.
+
+        Args:
+            status (int): HTTP status code.
+            data (dict): Content of the reply.
+
+        Returns:
+            None
+        """
+
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        """
+        Get the client address, Unix sockets have no host.
+
+        Returns:
+            str: Client address.
+        """
+
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        """
+        Do not log every request.
+
+        Returns:
+            None
+        """
+
+
+class BrainHTTPServer(ThreadingHTTPServer):
+    """
+    Threading HTTP server listening on TCP, with a listen backlog large enough for many concurrent clients.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threading HTTP server listening on a Unix socket.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP client connection to a Unix socket.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the UnixHTTPConnection.
+
+        Args:
+            path (str): Path to the Unix socket.
+
+        Returns:
+            None
+        """
+
+        super().__init__("localhost")
+        self.unix_path = path
+
+    def connect(self) -> None:
+        """
+        Connect to the Unix socket.
+
+        Returns:
+            None
+        """
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+
+def decodeImage(body: bytes, content_type: str, query: dict) -> Image.Image:
+    """
+    Decode the payload of a prediction request.
+
+    Args:
+        body (bytes): Payload of the request.
+        content_type (str): Content type of the request.
+        query (dict): Parsed query parameters.
+
+    Returns:
+        PIL.Image.Image: Grayscale image.
+    """
+
+    if content_type.startswith("application/octet-stream"):
+        if "width" in query and "height" in query:
+            width, height = int(query["width"][0]), int(query["height"][0])
+        else:
+            width = height = math.isqrt(len(body))
+
+        if width <= 0 or height <= 0:
+            raise ValueError(f"the image must have a positive width and height, got {width}x{height}")
+
+        if width * height != len(body):
+            raise ValueError(f"expected {width * height} bytes of grayscale pixels, got {len(body)}")
+
+        return Image.fromarray(np.frombuffer(body, dtype=np.uint8).reshape(height, width), 'L')
+
+    return Image.open(io.BytesIO(body)).convert('L')
+
+
+def createServer(brain: str, host: str = "127.0.0.1", port: int = 8000, unix_socket: Optional[str] = None,
+                 max_batch_size: int = 32, max_latency: float = 0.005) -> socketserver.BaseServer:
+    """
+    Load a saved brain and create the inference server.
+
+    Args:
+        brain (str): Path of the saved brain.
+        host (str): Address to listen on.
+        port (int): Port to listen on, 0 picks a free port.
+        unix_socket (Optional[str]): If set, the server listens on this Unix socket instead of TCP.
+        max_batch_size (int): Maximal number of images in a batch.
+        max_latency (float): Maximal time in seconds an image waits for other images.
+
+    Returns:
+        socketserver.BaseServer: Server ready for serve_forever().
+    """
+
+    learn = Learn()
+    learn.open(brain)
+
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixHTTPServer(unix_socket, BrainRequestHandler)
+    else:
+        server = BrainHTTPServer((host, port), BrainRequestHandler)
+
+    server.learn = learn
+    server.batcher = MicroBatcher(learn, max_batch_size, max_latency)
+
+    return server
+
+
+def serverAddress(server: socketserver.BaseServer) -> str:
+    """
+    Describe the address of a server.
+
+    Args:
+        server (socketserver.BaseServer): Running server.
+
+    Returns:
+        str: URL or Unix socket path.
+    """
+
+    if isinstance(server.server_address, tuple):
+        host, port = server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    return f"unix:{server.server_address}"
+
+
+def connect(address: str) -> http.client.HTTPConnection:
+    """
+    Open a connection to the inference server.
+
+    Args:
+        address (str): URL ('http://host:port') or Unix socket ('unix:/path/to/socket').
+
+    Returns:
+        http.client.HTTPConnection: Connection to the server.
+    """
+
+    if address.startswith("unix:"):
+        return UnixHTTPConnection(address[len("unix:"):])
+
+    url = urlparse(address)
+    return http.client.HTTPConnection(url.hostname, url.port)
+
+
+def requestPrediction(connection: http.client.HTTPConnection, png: bytes) -> Tuple[int, dict]:
+    """
+    Send one prediction request.
+
+    Args:
+        connection (http.client.HTTPConnection): Connection to the server.
+        png (bytes): Encoded image.
+
+    Returns:
+        Tuple[int, dict]: HTTP status and decoded reply.
+    """
+
+    connection.request("POST", "/predict", body=png, headers={"Content-Type": "image/png"})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
@@ -1,20 +1,22 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter.ttk import Progressbar
-from typing import List
+from typing import Callable, List, Optional
 
 
 class StatsFrame(tk.Frame):
     """
     Class representing the statistics frame of the application.
     """
-    def __init__(self, parent: tk.Frame, number_labels_on_board: int) -> None:
+    def __init__(self, parent: tk.Frame, number_labels_on_board: int, mark: Optional[Callable[[int], None]] = None) -> None:
         """
         Initialize the StatsFrame.
 
         Args:
             parent (tk.Frame): The parent tkinter frame.
             number_labels_on_board (int): The number of statistics elements.
+            mark (Optional[Callable[[int], None]]): Called with the index of a label when it is clicked, to learn the
+                drawing as that label.
         """
 
         super().__init__()
@@ -34,6 +36,9 @@ class StatsFrame(tk.Frame):
 
         for i, (label, progress_bar, value_label) in enumerate(self.triple_list):
             label.grid(row=i, column=0, pady=5, padx=20)
+            if mark is not None:
+                label.configure(cursor="hand2")
+                label.bind("<Button-1>", lambda event, index=i: mark(index))
             progress_bar.grid(row=i, column=1, padx=10)
             value_label.grid(row=i, column=2, padx=10)
 
@@ -0,0 +1,429 @@
+import csv
+import itertools
+import math
+import os
+import random
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing as multiprocessing
+from torch.utils.data import DataLoader, Dataset, Subset
+
+from datasetCache import CachedImageFolder, DecodeDataset
+from datasetIndex import IndexedImageFolder
+from learn import Learn
+
+# Hyperparameters a sweep can vary, with the value of a trial that does not set them.
+DEFAULT_PARAMETERS: Dict[str, Any] = {'lr': 0.0001,
+                                      'schedule': 'constant',
+                                      'warmup': 0.3,
+                                      'batch_size': 64,
+                                      'rotation': 30.0,
+                                      'architecture': 'CNN'}
+
+# Dataset, splits and input size of the worker processes of a sweep, set by initWorker.
+worker_data: Dict[str, Any] = {}
+
+
+def resultsPath(file_name: str) -> str:
+    """
+    Get the path of the results table of a sweep whose best brain is saved to file_name.
+
+    Args:
+        file_name (str): Path of the best brain.
+
+    Returns:
+        str: Path of the CSV file next to it, e.g. 'model.sweep.csv' for 'model.pth'.
+    """
+
+    root, _ = os.path.splitext(file_name)
+    return f"{root}.sweep.csv"
+
+
+class SharedImageFolder(Dataset):
+    """
+    Decoded images of a dataset folder in shared memory, served like the samples of an ImageFolder.
+
+    The images are decoded once in the process that starts the sweep, the worker processes receive handles to the same
+    memory instead of copies.
+    """
+
+    def __init__(self, images: torch.Tensor, targets: torch.Tensor, classes: List[str]) -> None:
+        """
+        Initialize the SharedImageFolder, moving the tensors to shared memory.
+
+        Args:
+            images (torch.Tensor): Images of shape (N, input_size, input_size) as uint8.
+            targets (torch.Tensor): Targets of the images.
+            classes (List[str]): Names of the classes.
+
+        Returns:
+            None
+        """
+
+        self.images = images.share_memory_()
+        self.targets = targets.share_memory_()
+        self.classes = classes
+
+    def __len__(self) -> int:
+        """
+        Get the number of images.
+
+        Returns:
+            int: Number of images.
+        """
+
+        return len(self.targets)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, int]:
+        """
+        Get an image.
+
+        Args:
+            index (int): Index of the image.
+
+        Returns:
+            Tuple[torch.Tensor, int]: Image tensor of shape (1, input_size, input_size) with values in [0, 1] and its
+                target.
+        """
+
+        return self.images[index].unsqueeze(0).float().div(255), int(self.targets[index])
+
+
+def loadSharedImages(path: str, input_size: int, size_output: Optional[int] = None, cache: bool = False,
+                     num_workers: int = 4) -> SharedImageFolder:
+    """
+    Decode the images of a dataset folder into shared memory.
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        input_size (int): Width and height of the decoded images.
+        size_output (Optional[int]): If set, only the first classes are loaded.
+        cache (bool): If True, the images are copied from the cache next to the dataset, decoding only the ones
+            missing from it.
+        num_workers (int): Number of processes decoding the images.
+
+    Returns:
+        SharedImageFolder: Decoded images and their targets.
+    """
+
+    image_folder = IndexedImageFolder(path, number_classes=size_output)
+    images = torch.empty(len(image_folder), input_size, input_size, dtype=torch.uint8)
+
+    if cache:
+        cached = CachedImageFolder(image_folder, input_size, num_workers=num_workers)
+        images.copy_(torch.from_numpy(np.load(cached.cache_path, mmap_mode='r')[cached.rows]))
+    else:
+        loader = DataLoader(DecodeDataset([path for path, _ in image_folder.samples], input_size), batch_size=64, num_workers=num_workers)
+        row = 0
+        for batch in loader:
+            images[row:row + len(batch)] = batch
+            row += len(batch)
+
+    return SharedImageFolder(images, torch.tensor(image_folder.targets, dtype=torch.int64), list(image_folder.classes))
+
+
+def splitIndices(number: int, folds: int, seed: int) -> List[Tuple[List[int], List[int]]]:
+    """
+    Split the indices of a dataset into training and test indices.
+
+    Args:
+        number (int): Number of samples.
+        folds (int): Number of folds of the cross-validation, each fold is the test data of one split. With 1 fold,
+            the 80/20 split of Learn.loadData with the same seed.
+        seed (int): Seed of the permutation.
+
+    Returns:
+        List[Tuple[List[int], List[int]]]: Training and test indices of every split.
+    """
+
+    permutation = torch.randperm(number, generator=torch.Generator().manual_seed(seed)).tolist()
+
+    if folds <= 1:
+        number_train = int(number*0.8)
+        return [(permutation[:number_train], permutation[number_train:])]
+
+    bounds = [number * fold // folds for fold in range(folds + 1)]
+    return [(permutation[:bounds[fold]] + permutation[bounds[fold + 1]:], permutation[bounds[fold]:bounds[fold + 1]])
+            for fold in range(folds)]
+
+
+def gridTrials(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    List every combination of the values of a search space.
+
+    Args:
+        space (Dict[str, List[Any]]): Values of every varied hyperparameter, see DEFAULT_PARAMETERS.
+
+    Returns:
+        List[Dict[str, Any]]: Hyperparameters of the trials.
+    """
+
+    checkSpace(space)
+    for name, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"a grid search needs a list of values for {name}, ranges can only be sampled by a random search")
+
+    names = list(space)
+    return [{**DEFAULT_PARAMETERS, **dict(zip(names, values))} for values in itertools.product(*(space[name] for name in names))]
+
+
+def randomTrials(space: Dict[str, Any], number: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Sample trials from a search space.
+
+    Args:
+        space (Dict[str, Any]): For every varied hyperparameter, a list of values drawn uniformly, or a range
+            {'min': a, 'max': b, 'log': bool} drawn uniformly (log-uniformly if 'log' is true). A range of two
+            integers draws integers.
+        number (int): Number of trials.
+        seed (int): Seed of the sampling.
+
+    Returns:
+        List[Dict[str, Any]]: Hyperparameters of the trials.
+    """
+
+    checkSpace(space)
+    generator = random.Random(seed)
+    trials = []
+
+    for _ in range(number):
+        parameters = dict(DEFAULT_PARAMETERS)
+        for name, values in space.items():
+            if isinstance(values, list):
+                parameters[name] = generator.choice(values)
+                continue
+
+            low, high = values['min'], values['max']
+            if values.get('log', False):
+                value = math.exp(generator.uniform(math.log(low), math.log(high)))
+            else:
+                value = generator.uniform(low, high)
+            parameters[name] = round(value) if isinstance(low, int) and isinstance(high, int) else value
+        trials.append(parameters)
+
+    return trials
+
+
+def checkSpace(space: Dict[str, Any]) -> None:
+    """
+    Check that a search space only varies known hyperparameters.
+
+    Args:
+        space (Dict[str, Any]): Search space, see randomTrials.
+
+    Returns:
+        None
+    """
+
+    unknown = [name for name in space if name not in DEFAULT_PARAMETERS]
+    if unknown:
+        raise ValueError(f"unknown hyperparameters {', '.join(unknown)}, a sweep can vary {', '.join(DEFAULT_PARAMETERS)}")
+
+
+def halvingRungs(min_epochs: int, max_epochs: int, eta: int) -> List[int]:
+    """
+    Get the epochs after which the trials are compared and the worst ones are stopped.
+
+    Args:
+        min_epochs (int): Epochs of the first rung.
+        max_epochs (int): Epochs of the trials that are never stopped.
+        eta (int): Factor between the epochs of two rungs, only 1/eta of the trials go on to the next one.
+
+    Returns:
+        List[int]: Increasing numbers of epochs, the last one is max_epochs.
+    """
+
+    rungs = []
+    epochs = max(1, min_epochs)
+    while epochs < max_epochs and eta > 1:
+        rungs.append(epochs)
+        epochs *= eta
+
+    return rungs + [max_epochs]
+
+
+def initWorker(dataset: SharedImageFolder, splits: List[Tuple[List[int], List[int]]], source: Dict[str, Any], threads: int) -> None:
+    """
+    Keep the shared dataset in a worker process of the sweep.
+
+    Args:
+        dataset (SharedImageFolder): Decoded images, in shared memory.
+        splits (List[Tuple[List[int], List[int]]]): Training and test indices of every fold.
+        source (Dict[str, Any]): Path and cache option of the dataset, saved with the brains.
+        threads (int): Number of threads of the process.
+
+    Returns:
+        None
+    """
+
+    torch.set_num_threads(threads)
+    worker_data.update(dataset=dataset, splits=splits, source=source)
+
+
+def runTrial(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Train one fold of a trial up to the epochs of a rung, in a worker process of the sweep.
+
+    The state of the trial is kept in a checkpoint between the rungs, so a trial that goes on continues its run
+    with the same optimizer and learning rate schedule.
+
+    Args:
+        task (Dict[str, Any]): Trial number, fold, hyperparameters, maximal epochs, epochs of the rung, seed and path of
+            the checkpoint.
+
+    Returns:
+        Dict[str, Any]: Trial number, fold, epochs done, last test loss and accuracy and the training time.
+    """
+
+    dataset = worker_data['dataset']
+    train_indices, test_indices = worker_data['splits'][task['fold']]
+    parameters = task['parameters']
+
+    train_data = DataLoader(Subset(dataset, train_indices), batch_size=parameters['batch_size'], shuffle=True)
+    test_data = DataLoader(Subset(dataset, test_indices), batch_size=64)
+
+    start = time.perf_counter()
+
+    if os.path.isfile(task['state']):
+        learn = Learn()
+        learn.open(task['state'])
+        learn.augmentation.degrees = parameters['rotation']
+        learn.run['checkpoint'] = None
+        learn.run['until'] = task['until']
+        learn.resume(train_data, test_data)
+    else:
+        torch.manual_seed(task['seed'])
+        learn = Learn(len(dataset.classes), input_size=dataset.images.shape[-1], architecture=parameters['architecture'])
+        learn.setSchedule(parameters['schedule'], parameters['lr'], parameters['warmup'])
+        learn.augmentation.degrees = parameters['rotation']
+        learn.augmentation.generator.manual_seed(task['seed'])
+        learn.labels = list(dataset.classes)
+        learn.split_seed = task['split_seed']
+        learn.data_source = worker_data['source']
+        learn.fit(train_data, test_data, task['epochs'], until=task['until'])
+
+    learn.save(task['state'], True)
+
+    return {'trial': task['trial'],
+            'fold': task['fold'],
+            'epochs': len(learn.history) - learn.run['start'],
+            'test_loss': learn.history[-1][1],
+            'test_accuracy': learn.accuracy_history[-1],
+            'time': time.perf_counter() - start}
+
+
+def runSweep(path: str, trials: List[Dict[str, Any]], epochs: int, out: str, folds: int = 1, min_epochs: int = 1, eta: int = 3,
+             processes: int = 2, input_size: int = 256, size_output: Optional[int] = None, cache: bool = False, seed: int = 0,
+             report: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Train the trials of a hyperparameter sweep in a pool of processes, stop the worst ones by successive halving and
+    save the best brain.
+
+    The images are decoded once into shared memory for all the processes. Every trial is trained on each fold (the
+    80/20 split of Learn.loadData with 1 fold) up to the epochs of the first rung, then only the 1/eta trials with the
+    lowest mean test loss go on to the next rung, up to epochs. The trained fold of the best trial with the lowest
+    test loss is saved to out, and the ranked results to resultsPath(out).
+
+    Args:
+        path (str): Path to the dataset, one subfolder per label.
+        trials (List[Dict[str, Any]]): Hyperparameters of the trials, see gridTrials and randomTrials.
+        epochs (int): Epochs of the trials that are never stopped, the learning rate schedules span them.
+        out (str): Path of the best brain.
+        folds (int): Number of folds of the cross-validation.
+        min_epochs (int): Epochs of the first rung.
+        eta (int): Factor between the epochs of two rungs, 1 trains every trial for all the epochs.
+        processes (int): Number of worker processes, each trains one fold of a trial at a time.
+        input_size (int): Width and height of the images.
+        size_output (Optional[int]): Number of labels, if None the number of subfolders is used.
+        cache (bool): If True, the images are copied from the cache next to the dataset.
+        seed (int): Seed of the split and of the trials, trial i is seeded with seed + i.
+        report (Optional[Callable[[Dict[str, Any]], None]]): Called with the result of every trained fold.
+
+    Returns:
+        List[Dict[str, Any]]: Results of the trials, best first: rank, trial, hyperparameters, epochs reached, mean and
+            standard deviation over the folds of the test loss, mean test accuracy and training time.
+    """
+
+    dataset = loadSharedImages(path, input_size, size_output, cache)
+    splits = splitIndices(len(dataset), folds, seed)
+    source = {'path': os.path.abspath(path), 'cache': cache}
+    threads = max(1, (os.cpu_count() or 1) // processes)
+
+    results = [{'trial': trial, **parameters, 'epochs': 0, 'test_loss': math.inf, 'test_loss_std': 0.0, 'test_accuracy': 0.0,
+                'time': 0.0, 'fold_losses': []} for trial, parameters in enumerate(trials)]
+    alive = list(range(len(trials)))
+
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as directory:
+        with context.Pool(processes, initializer=initWorker, initargs=(dataset, splits, source, threads)) as pool:
+            rungs = halvingRungs(min_epochs, epochs, eta)
+
+            for rung in rungs:
+                tasks = [{'trial': trial,
+                          'fold': fold,
+                          'parameters': trials[trial],
+                          'epochs': epochs,
+                          'until': rung,
+                          'seed': seed + trial,
+                          'split_seed': seed,
+                          'state': os.path.join(directory, f'trial{trial}.fold{fold}.pth')} for trial in alive for fold in range(len(splits))]
+
+                fold_results: Dict[int, List[Dict[str, Any]]] = {trial: [] for trial in alive}
+                for result in pool.imap_unordered(runTrial, tasks):
+                    fold_results[result['trial']].append(result)
+                    if report is not None:
+                        report(result)
+
+                for trial, trained in fold_results.items():
+                    trained.sort(key=lambda result: result['fold'])
+                    losses = torch.tensor([result['test_loss'] for result in trained], dtype=torch.float64).nan_to_num(math.inf)
+                    results[trial].update(epochs=min(result['epochs'] for result in trained),
+                                          test_loss=losses.mean().item(),
+                                          test_loss_std=losses.std().item() if len(losses) > 1 else 0.0,
+                                          test_accuracy=sum(result['test_accuracy'] for result in trained) / len(trained),
+                                          time=results[trial]['time'] + sum(result['time'] for result in trained),
+                                          fold_losses=losses.tolist())
+
+                if rung != rungs[-1]:
+                    alive = sorted(alive, key=lambda trial: results[trial]['test_loss'])[:max(1, len(alive) // eta)]
+
+        best = min(alive, key=lambda trial: results[trial]['test_loss'])
+        best_fold = min(range(len(splits)), key=lambda fold: results[best]['fold_losses'][fold])
+
+        learn = Learn()
+        learn.open(os.path.join(directory, f'trial{best}.fold{best_fold}.pth'))
+        learn.detachFromFile()
+        learn.save(out)
+
+    ranking = sorted(results, key=lambda result: (-result['epochs'], result['test_loss']))
+    for rank, result in enumerate(ranking, 1):
+        result['rank'] = rank
+        del result['fold_losses']
+
+    writeResults(ranking, resultsPath(out))
+    return ranking
+
+
+def writeResults(results: List[Dict[str, Any]], file_name: str) -> None:
+    """
+    Write the ranked results of a sweep to a CSV file.
+
+    Args:
+        results (List[Dict[str, Any]]): Results of runSweep.
+        file_name (str): Path of the CSV file.
+
+    Returns:
+        None
+    """
+
+    columns = ['rank', 'trial', *DEFAULT_PARAMETERS, 'epochs', 'test_loss', 'test_loss_std', 'test_accuracy', 'time']
+
+    with open(file_name, 'w', newline='') as file:
+        writer = csv.DictWriter(file, columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
@@ -0,0 +1,58 @@
+import csv
+
+import pytest
+from PIL import Image
+
+from learn import Learn
+from scoring import ScoreWriter, scoreImages
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"image{index}.png"
+        Image.new('L', (32, 32), color=index * 100).save(path)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def learn():
+    learn = Learn(3, input_size=64, architecture='TinyCNN')
+    learn.device = 'cpu'
+    learn.cnn.to('cpu')
+    learn.labels = ['a', 'b', 'c']
+    return learn
+
+
+def test_top_k_larger_than_outputs_writes_complete_csv_rows(learn, images, tmp_path):
+    out = str(tmp_path / "scores.csv")
+
+    scored = scoreImages(learn, images, out, top_k=5, batch_size=2, num_workers=0)
+
+    with open(out, newline='') as file:
+        rows = list(csv.reader(file))
+
+    assert scored == len(images)
+    assert rows[0] == ['path', 'label_1', 'probability_1', 'label_2', 'probability_2', 'label_3', 'probability_3']
+    assert [len(row) for row in rows[1:]] == [len(rows[0])] * len(images)
+
+
+def test_top_k_larger_than_outputs_writes_parquet(learn, images, tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    out = str(tmp_path / "scores.parquet")
+
+    scoreImages(learn, images, out, top_k=5, batch_size=2, num_workers=0)
+
+    table = pyarrow_parquet.read_table(out)
+    assert table.num_rows == len(images)
+    assert table.column_names[-1] == 'probability_3'
+
+
+def test_existing_rows_drops_the_incomplete_last_row(tmp_path):
+    out = tmp_path / "scores.csv"
+    out.write_bytes(b"path,label_1,probability_1\r\na.png,a,0.5\r\nb.png,b,0.25\r\nc.png,c" + b"0" * 70000)
+
+    assert ScoreWriter(str(out), ['path', 'label_1', 'probability_1']).existingRows() == (2, 'b.png')
+    assert out.read_bytes().endswith(b"b.png,b,0.25\r\n")